@@ -0,0 +1,459 @@
+"""Benchmark offline do Multiverso Bot.
+
+Roda os handlers reais dos slash commands, a votação, a finalização e o
+rollout de apelidos contra um servidor falso em memória, sem conectar ao
+Discord. As chamadas à "API" passam pelos mesmos limitadores e métricas do
+bot (como se viessem do aiohttp) e as edições de apelido respeitam um rate
+limit simulado por rota, com respostas 429 e Forbidden.
+
+Uso:
+    python bench_multiverso.py --membros 10000 --limite 50 --janela 0.1
+    python bench_multiverso.py --membros 100000 --backend sqlite --pouca-memoria
+
+Os arquivos de dados são criados em uma pasta temporária, apagada no fim.
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import discord
+
+# ============================================
+# API FALSA
+# ============================================
+
+class RotaSimulada:
+    """Bucket de rate limit de uma rota: `limite` requisições a cada `janela` segundos"""
+
+    def __init__(self, limite, janela):
+        self.limite = limite
+        self.janela = janela
+        self.restantes = limite
+        self.reinicia_em = 0.0
+
+    def consumir(self):
+        """Status e cabeçalhos da resposta, como o Discord mandaria"""
+        agora = asyncio.get_running_loop().time()
+        if agora >= self.reinicia_em:
+            self.restantes = self.limite
+            self.reinicia_em = agora + self.janela
+
+        espera = max(0.0, self.reinicia_em - agora)
+        if self.restantes <= 0:
+            return 429, {'Retry-After': f"{espera:.3f}", 'X-RateLimit-Reset-After': f"{espera:.3f}"}
+
+        self.restantes -= 1
+        return 200, {
+            'X-RateLimit-Limit': str(self.limite),
+            'X-RateLimit-Remaining': str(self.restantes),
+            'X-RateLimit-Reset-After': f"{espera:.3f}"
+        }
+
+class ApiFalsa:
+    """Conta as chamadas por rota e alimenta o hook de requisições do bot"""
+
+    def __init__(self, bot_modulo, limite, janela, latencia):
+        self.mb = bot_modulo
+        self.limite = limite
+        self.janela = janela
+        self.latencia = latencia
+        self.rotas = {}
+        self.chamadas = {}
+        self.respostas_429 = 0
+
+    async def chamar(self, metodo, caminho, limitada=False):
+        """Uma requisição REST; rotas limitadas esperam e repetem após 429, como o discord.py"""
+        chave = self.mb.chave_rota(metodo, caminho)
+        while True:
+            if self.latencia:
+                await asyncio.sleep(self.latencia)
+            status, headers = 200, {}
+            if limitada:
+                if chave not in self.rotas:
+                    self.rotas[chave] = RotaSimulada(self.limite, self.janela)
+                status, headers = self.rotas[chave].consumir()
+
+            self.chamadas[chave] = self.chamadas.get(chave, 0) + 1
+            params = types.SimpleNamespace(
+                method=metodo,
+                url=types.SimpleNamespace(path=f"/api/v10{caminho}"),
+                response=types.SimpleNamespace(status=status, headers=headers)
+            )
+            await self.mb.ao_terminar_requisicao(None, None, params)
+
+            if status != 429:
+                return
+            self.respostas_429 += 1
+            await asyncio.sleep(float(headers['Retry-After']))
+
+    @property
+    def total(self):
+        return sum(self.chamadas.values())
+
+# ============================================
+# SERVIDOR FALSO
+# ============================================
+
+@functools.total_ordering
+class CargoFalso:
+    def __init__(self, posicao):
+        self.position = posicao
+
+    def __eq__(self, outro):
+        return self.position == outro.position
+
+    def __lt__(self, outro):
+        return self.position < outro.position
+
+    def __hash__(self):
+        return hash(self.position)
+
+class MembroFalso:
+    def __init__(self, guild, member_id, cargo, bot=False, proibido=False):
+        self.guild = guild
+        self.id = member_id
+        self.name = f"membro{member_id}"
+        self.display_name = self.name
+        self.mention = f"<@{member_id}>"
+        self.nick = None
+        self.bot = bot
+        self.top_role = cargo
+        self.proibido = proibido
+        self.guild_permissions = discord.Permissions(manage_nicknames=True)
+
+    async def edit(self, nick=None):
+        await self.guild.api.chamar('PATCH', f"/guilds/{self.guild.id}/members/{self.id}", limitada=True)
+        if self.proibido:
+            raise discord.Forbidden(
+                types.SimpleNamespace(status=403, reason='Forbidden'),
+                {'code': 50013, 'message': 'Missing Permissions'}
+            )
+        self.nick = nick
+
+class EnqueteFalsa:
+    def __init__(self, opcoes):
+        self.answers = [types.SimpleNamespace(id=i, vote_count=0) for i in range(1, opcoes + 1)]
+        self.finalizada = False
+
+    def is_finalised(self):
+        return self.finalizada
+
+class MensagemFalsa:
+    def __init__(self, canal, message_id, poll=None):
+        self.channel = canal
+        self.id = message_id
+        self.poll = poll
+
+    async def edit(self, **kwargs):
+        await self.channel.guild.api.chamar('PATCH', f"/channels/{self.channel.id}/messages/{self.id}")
+        return self
+
+    async def end_poll(self):
+        await self.channel.guild.api.chamar('POST', f"/channels/{self.channel.id}/polls/{self.id}/expire")
+        self.poll.finalizada = True
+        return self
+
+class CanalFalso:
+    def __init__(self, guild, channel_id):
+        self.guild = guild
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+        self.mensagens = {}
+
+    async def send(self, content=None, *, embed=None, poll=None, view=None):
+        await self.guild.api.chamar('POST', f"/channels/{self.id}/messages")
+        mensagem = MensagemFalsa(self, self.guild.proximo_id(), EnqueteFalsa(len(poll.answers)) if poll else None)
+        self.mensagens[mensagem.id] = mensagem
+        return mensagem
+
+    def get_partial_message(self, message_id):
+        return self.mensagens[message_id]
+
+    async def fetch_message(self, message_id):
+        await self.guild.api.chamar('GET', f"/channels/{self.id}/messages/{message_id}")
+        return self.mensagens[message_id]
+
+class ServidorFalso:
+    """Servidor com hierarquia de cargos: o bot fica acima da maioria, mas não de todos"""
+
+    def __init__(self, api, membros, acima, proibidos, semente):
+        aleatorio = random.Random(semente)
+        self.api = api
+        self.id = 900000000000000000
+        self.name = "Servidor de Benchmark"
+        self._ids = iter(range(self.id + 1, self.id + 10 ** 9))
+
+        cargo_comum = CargoFalso(1)
+        cargo_bot = CargoFalso(10)
+        cargo_alto = CargoFalso(20)
+
+        self.me = MembroFalso(self, self.proximo_id(), cargo_bot, bot=True)
+        self.members = [self.me]
+        for _ in range(membros - 1):
+            sorteio = aleatorio.random()
+            self.members.append(MembroFalso(
+                self,
+                self.proximo_id(),
+                cargo_alto if sorteio < acima else cargo_comum,
+                bot=aleatorio.random() < 0.01,
+                proibido=acima <= sorteio < acima + proibidos
+            ))
+        self.owner_id = self.members[1].id if membros > 1 else self.me.id
+        self.member_count = len(self.members)
+        self.canal = CanalFalso(self, self.proximo_id())
+
+    def proximo_id(self):
+        return next(self._ids)
+
+    async def fetch_members(self, limit=None, after=None):
+        """Páginas de 1000 como a API: páginas crescentes, cada uma em ordem decrescente"""
+        inicio = after.id if after is not None else 0
+        restantes = [member for member in self.members if member.id > inicio]
+        for i in range(0, len(restantes), 1000):
+            await self.api.chamar('GET', f"/guilds/{self.id}/members")
+            for member in reversed(restantes[i:i + 1000]):
+                yield member
+
+    async def fetch_member(self, member_id):
+        await self.api.chamar('GET', f"/guilds/{self.id}/members/{member_id}")
+        return next(member for member in self.members if member.id == member_id)
+
+class RespostaFalsa:
+    def __init__(self, interacao):
+        self.interacao = interacao
+        self._feita = False
+
+    def is_done(self):
+        return self._feita
+
+    async def send_message(self, content=None, *, embed=None, view=None, ephemeral=False, **kwargs):
+        await self.interacao.guild.api.chamar('POST', f"/interactions/{self.interacao.id}/callback")
+        self._feita = True
+
+    async def defer(self, ephemeral=False, **kwargs):
+        await self.send_message()
+
+    async def edit_message(self, **kwargs):
+        await self.send_message()
+
+class FollowupFalso:
+    def __init__(self, interacao):
+        self.interacao = interacao
+
+    async def send(self, content=None, *, embed=None, poll=None, view=None, ephemeral=False, **kwargs):
+        canal = self.interacao.channel
+        await canal.guild.api.chamar('POST', "/webhooks/1/token")
+        mensagem = MensagemFalsa(canal, canal.guild.proximo_id(), EnqueteFalsa(len(poll.answers)) if poll else None)
+        canal.mensagens[mensagem.id] = mensagem
+        return mensagem
+
+class InteracaoFalsa:
+    def __init__(self, guild, usuario):
+        self.id = guild.proximo_id()
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = guild.canal
+        self.channel_id = guild.canal.id
+        self.user = usuario
+        self.extras = {}
+        self.command = None
+        self.response = RespostaFalsa(self)
+        self.followup = FollowupFalso(self)
+
+    async def edit_original_response(self, **kwargs):
+        await self.guild.api.chamar('PATCH', "/webhooks/1/token/messages/@original")
+
+# ============================================
+# CENÁRIOS
+# ============================================
+
+class Medicao:
+    """Tempo de parede, chamadas à API, 429s e pico de memória de uma etapa"""
+
+    def __init__(self, api, nome):
+        self.api = api
+        self.nome = nome
+
+    def __enter__(self):
+        self.chamadas = self.api.total
+        self.respostas_429 = self.api.respostas_429
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.duracao = time.perf_counter() - self.inicio
+        self.pico = tracemalloc.get_traced_memory()[1]
+        self.chamadas = self.api.total - self.chamadas
+        self.respostas_429 = self.api.respostas_429 - self.respostas_429
+
+async def comando(mb, nome, interacao, *args, **kwargs):
+    """Roda o handler real de um slash command medindo como a árvore de comandos mede"""
+    command = mb.bot.tree.get_command(nome)
+    interacao.command = command
+    await mb.bot.tree.interaction_check(interacao)
+    await command.callback(interacao, *args, **kwargs)
+    await mb.on_app_command_completion(interacao, command)
+
+async def aguardar_tarefas(mb, guild):
+    """/finalizar só enfileira o encerramento: espera a fila do servidor esvaziar"""
+    while guild.id in mb.guilds_finalizando:
+        await asyncio.sleep(0.01)
+
+def enquetes_ativas(data):
+    if data.get('chaveamento'):
+        return [int(message_id) for message_id in data['chaveamento']['grupos']]
+    if data.get('poll_message_id'):
+        return [data['poll_message_id']]
+    return []
+
+async def votar(mb, guild, eleitores, aleatorio):
+    """Simula os votos pelo gateway em todas as enquetes abertas e espelha no Discord falso"""
+    data = mb.load_data(guild.id)
+    for message_id in enquetes_ativas(data):
+        enquete = guild.canal.mensagens[message_id].poll
+        for _ in range(eleitores):
+            resposta = aleatorio.choice(enquete.answers)
+            resposta.vote_count += 1
+            await mb.on_raw_poll_vote_add(types.SimpleNamespace(
+                guild_id=guild.id, message_id=message_id, answer_id=resposta.id, user_id=0
+            ))
+
+async def executar(argumentos):
+    import multiverso_bot as mb
+
+    aleatorio = random.Random(argumentos.semente)
+    api = ApiFalsa(mb, argumentos.limite, argumentos.janela, argumentos.latencia)
+
+    with Medicao(api, "montar servidor") as montagem:
+        guild = ServidorFalso(api, argumentos.membros, argumentos.acima, argumentos.proibidos, argumentos.semente)
+    admin = guild.members[1]
+    mb.bot.get_channel = lambda channel_id: guild.canal if channel_id == guild.canal.id else None
+    mb.bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+
+    mb.estado.carregar()
+    mb.estado.iniciar()
+    etapas = [montagem]
+
+    with Medicao(api, f"/adicionar x{argumentos.participantes}") as etapa:
+        for member in guild.members[2:2 + argumentos.participantes]:
+            await comando(mb, 'adicionar', InteracaoFalsa(guild, admin), member, f"Apelido {member.id % 10000}")
+    etapas.append(etapa)
+
+    with Medicao(api, "/lista x100") as etapa:
+        for _ in range(100):
+            await comando(mb, 'lista', InteracaoFalsa(guild, admin))
+    etapas.append(etapa)
+
+    with Medicao(api, "/multiverso") as etapa:
+        await comando(mb, 'multiverso', InteracaoFalsa(guild, admin))
+    etapas.append(etapa)
+
+    rodadas = 0
+    while enquetes_ativas(mb.load_data(guild.id)):
+        rodadas += 1
+        with Medicao(api, f"votos (rodada {rodadas}, {argumentos.eleitores} por enquete)") as etapa:
+            await votar(mb, guild, argumentos.eleitores, aleatorio)
+            await comando(mb, 'parcial', InteracaoFalsa(guild, admin))
+        etapas.append(etapa)
+
+        with Medicao(api, f"/finalizar (rodada {rodadas})") as etapa:
+            await comando(mb, 'finalizar', InteracaoFalsa(guild, admin))
+            await aguardar_tarefas(mb, guild)
+        etapas.append(etapa)
+
+    with Medicao(api, "/historico + /estatisticas + /status") as etapa:
+        await comando(mb, 'historico', InteracaoFalsa(guild, admin))
+        await comando(mb, 'estatisticas', InteracaoFalsa(guild, admin))
+        await comando(mb, 'status', InteracaoFalsa(guild, admin))
+    etapas.append(etapa)
+
+    with Medicao(api, "gravar snapshot completo") as etapa:
+        await mb.estado.gravar(compactar=True)
+    etapas.append(etapa)
+
+    with Medicao(api, "recarregar dados do disco") as etapa:
+        await asyncio.get_running_loop().run_in_executor(mb.executor_disco, mb.estado.backend.ler)
+    etapas.append(etapa)
+
+    await mb.estado.parar()
+    for tarefa in list(mb.tarefas_em_segundo_plano):
+        tarefa.cancel()
+
+    alterados = sum(1 for member in guild.members if member.nick is not None)
+    return etapas, api, alterados, guild
+
+def relatorio(argumentos, etapas, api, alterados, guild):
+    linhas = [
+        "🌌 Benchmark do Multiverso Bot",
+        f"Membros: {argumentos.membros} | Backend: {argumentos.backend} | "
+        f"Pouca memória: {'sim' if argumentos.pouca_memoria else 'não'}",
+        f"Rate limit simulado: {argumentos.limite} edições a cada {argumentos.janela}s por rota | "
+        f"Latência: {argumentos.latencia * 1000:.0f}ms",
+        "",
+        f"{'Etapa':<44} {'Tempo (s)':>10} {'API':>8} {'429':>6} {'Pico (MB)':>10}"
+    ]
+    for etapa in etapas:
+        linhas.append(
+            f"{etapa.nome:<44} {etapa.duracao:>10.3f} {etapa.chamadas:>8} "
+            f"{etapa.respostas_429:>6} {etapa.pico / 1024 / 1024:>10.1f}"
+        )
+    linhas += [
+        "",
+        f"Apelidos alterados: {alterados} de {guild.member_count}",
+        f"Chamadas à API: {api.total} | Respostas 429: {api.respostas_429}",
+        "",
+        "Chamadas por rota:"
+    ]
+    for rota, quantidade in sorted(api.chamadas.items(), key=lambda item: -item[1]):
+        linhas.append(f"  {rota}: {quantidade}")
+    return "\n".join(linhas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do Multiverso Bot")
+    parser.add_argument('--membros', type=int, default=1000, help="Membros no servidor falso (ex: 1000 a 100000)")
+    parser.add_argument('--participantes', type=int, default=8, help="Participantes cadastrados (mais de 10 = chaveamento)")
+    parser.add_argument('--eleitores', type=int, default=200, help="Votos por enquete")
+    parser.add_argument('--limite', type=int, default=50, help="Edições de apelido permitidas por janela")
+    parser.add_argument('--janela', type=float, default=0.1, help="Duração da janela do rate limit, em segundos")
+    parser.add_argument('--latencia', type=float, default=0.002, help="Latência de cada chamada à API, em segundos")
+    parser.add_argument('--acima', type=float, default=0.02, help="Fração de membros com cargo acima do bot")
+    parser.add_argument('--proibidos', type=float, default=0.01, help="Fração de membros cuja edição retorna Forbidden")
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--pouca-memoria', action='store_true', help="Busca os membros na API em vez do cache")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help="Também grava o relatório neste arquivo")
+    argumentos = parser.parse_args()
+
+    saida = os.path.abspath(argumentos.saida) if argumentos.saida else None
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # O bot lê a configuração do ambiente ao ser importado
+    os.environ['MULTIVERSO_BACKEND'] = argumentos.backend
+    os.environ['MULTIVERSO_ATRASO_GRAVACAO'] = '0'
+    if argumentos.pouca_memoria:
+        os.environ['MULTIVERSO_POUCA_MEMORIA'] = '1'
+
+    with tempfile.TemporaryDirectory(prefix='multiverso_bench_') as pasta:
+        os.chdir(pasta)
+        tracemalloc.start()
+        etapas, api, alterados, guild = asyncio.run(executar(argumentos))
+        tracemalloc.stop()
+
+    texto = relatorio(argumentos, etapas, api, alterados, guild)
+    print(texto)
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as f:
+            f.write(texto + "\n")
+
+if __name__ == '__main__':
+    main()
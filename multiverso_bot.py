@@ -1,89 +1,2618 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 import json
 import os
-from datetime import datetime, timedelta, time
+import gzip
+import zlib
+import sqlite3
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import asyncio
+import time
+import bisect
+import re
+import heapq
+import hashlib
+import itertools
+import collections
+import random
+import copy
+import logging
+import logging.handlers
+import queue
+import threading
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+# Arquivo de log em JSON lines (vazio desativa) e nível mínimo registrado
+ARQUIVO_LOG = os.getenv('MULTIVERSO_LOG', 'multiverso.log')
+NIVEL_LOG = os.getenv('MULTIVERSO_NIVEL_LOG', 'INFO').upper()
+
+# Rotação do arquivo de log: tamanho máximo de cada arquivo e cópias antigas mantidas
+TAMANHO_LOG = 5 * 1024 * 1024
+COPIAS_LOG = 5
+
+# Erros repetidos (ex: a mesma falha para milhares de membros em um rollout):
+# no máximo MAX_REPETICOES por chave a cada JANELA_REPETICOES segundos
+MAX_REPETICOES = 5
+JANELA_REPETICOES = 60
+
+# Atributos de todo LogRecord; o que sobrar veio de `extra=` e vira campo do JSON
+CAMPOS_PADRAO_LOG = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'chave_repeticao'}
+
+class FormatoJson(logging.Formatter):
+    """Uma linha JSON por registro: horário, nível, origem, mensagem e os campos de `extra=`"""
+    
+    def format(self, record):
+        linha = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for campo, valor in vars(record).items():
+            if campo not in CAMPOS_PADRAO_LOG:
+                linha[campo] = valor
+        if record.exc_text:
+            linha['excecao'] = record.exc_text
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+class SupressorRepeticoes(logging.Filter):
+    """Deixa passar poucos registros iguais por janela; os demais só são contados.
+    
+    Vale para registros com `extra={'chave_repeticao': ...}`. O primeiro registro
+    que passa depois de uma janela com supressões leva o campo `suprimidos`.
+    Roda em quem registra (loop ou executor de disco), por isso a trava.
+    """
+    
+    def __init__(self, maximo=MAX_REPETICOES, janela=JANELA_REPETICOES):
+        super().__init__()
+        self.maximo = maximo
+        self.janela = janela
+        self.chaves = {}
+        self._trava = threading.Lock()
+    
+    def filter(self, record):
+        chave = getattr(record, 'chave_repeticao', None)
+        if chave is None:
+            return True
+        
+        with self._trava:
+            agora = time.monotonic()
+            inicio, vistos, suprimidos = self.chaves.get(chave, (agora, 0, 0))
+            if agora - inicio >= self.janela:
+                inicio, vistos = agora, 0
+            
+            if vistos >= self.maximo:
+                self.chaves[chave] = (inicio, vistos, suprimidos + 1)
+                return False
+            
+            self.chaves[chave] = (inicio, vistos + 1, 0)
+            if len(self.chaves) > 1000:
+                # Chaves de janelas antigas não precisam mais ser lembradas
+                self.chaves = {c: v for c, v in self.chaves.items() if agora - v[0] < self.janela}
+        
+        if suprimidos:
+            record.suprimidos = suprimidos
+            record.msg = f"{record.msg} (+{suprimidos} repetições suprimidas)"
+        return True
+
+class FilaLogs(logging.handlers.QueueHandler):
+    """Enfileira o registro com a mensagem resolvida e o traceback já em texto"""
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+# Registros são só enfileirados por quem loga; uma thread própria formata e grava
+log = logging.getLogger('multiverso')
+ouvinte_logs = None
+
+def configurar_logs():
+    """Liga a fila de logs: console legível e, se configurado, arquivo JSON lines com rotação.
+    
+    Os registros do discord.py passam pela mesma fila.
+    """
+    global ouvinte_logs
+    if ouvinte_logs is not None:
+        return
+    
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(message)s'))
+    destinos = [console]
+    if ARQUIVO_LOG:
+        arquivo = logging.handlers.RotatingFileHandler(
+            ARQUIVO_LOG, maxBytes=TAMANHO_LOG, backupCount=COPIAS_LOG, encoding='utf-8'
+        )
+        arquivo.setFormatter(FormatoJson())
+        destinos.append(arquivo)
+    
+    fila = queue.SimpleQueue()
+    entrada = FilaLogs(fila)
+    entrada.addFilter(SupressorRepeticoes())
+    
+    raiz = logging.getLogger()
+    raiz.addHandler(entrada)
+    raiz.setLevel(logging.WARNING)
+    log.setLevel(NIVEL_LOG)
+    logging.getLogger('discord').setLevel(logging.INFO)
+    
+    ouvinte_logs = logging.handlers.QueueListener(fila, *destinos, respect_handler_level=True)
+    ouvinte_logs.start()
+
+def parar_logs():
+    """Grava o que ainda estiver na fila de logs"""
+    global ouvinte_logs
+    if ouvinte_logs is not None:
+        ouvinte_logs.stop()
+        ouvinte_logs = None
+
 # Configurações do bot
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-bot = commands.Bot(command_prefix='/', intents=intents)
+# Modo de pouca memória: os membros não ficam em cache; o rollout (e a simulação)
+# busca os membros na API em páginas, só quando precisa
+POUCA_MEMORIA = os.getenv('MULTIVERSO_POUCA_MEMORIA', '').lower() in ('1', 'true', 'sim')
+
+# Quantas alterações de apelido podem estar em andamento ao mesmo tempo
+TRABALHADORES_ROLLOUT = int(os.getenv('MULTIVERSO_TRABALHADORES_ROLLOUT', '4'))
+
+# Segundos entre os checkpoints do progresso de um rollout no diário
+INTERVALO_CHECKPOINT = float(os.getenv('MULTIVERSO_INTERVALO_CHECKPOINT', '5'))
+
+# Segundos entre as atualizações da mensagem de status de um rollout em andamento
+# (uma edição por intervalo, no máximo, para não disputar o rate limit com o rollout)
+INTERVALO_PROGRESSO = float(os.getenv('MULTIVERSO_INTERVALO_PROGRESSO', '15'))
+
+# Pasta das fotografias de apelidos (apelido anterior de cada membro, gravado antes do rollout)
+PASTA_SNAPSHOTS = os.getenv('MULTIVERSO_SNAPSHOTS', 'apelidos')
+
+# Quantas fotografias de apelidos manter por servidor (o limite do /restaurar rollout:)
+SNAPSHOTS_MANTIDOS = 100
+
+# Quantos membros a editar acumular antes de gravar a fotografia e liberar as edições
+LOTE_SNAPSHOT = 200
+
+# Quantas eleições ficam no estado em memória; as mais antigas vão para o arquivo anual
+HISTORICO_QUENTE = int(os.getenv('MULTIVERSO_HISTORICO_QUENTE', '24'))
+
+# Pasta do arquivo do histórico antigo (um .jsonl.gz por servidor e ano)
+PASTA_HISTORICO = os.getenv('MULTIVERSO_HISTORICO', 'historico')
+
+# (Opcional) Exporta as métricas no formato de texto do Prometheus: em um arquivo
+# reescrito periodicamente e/ou em http://127.0.0.1:<porta>/metrics
+ARQUIVO_METRICAS = os.getenv('MULTIVERSO_METRICAS_ARQUIVO')
+PORTA_METRICAS = os.getenv('MULTIVERSO_METRICAS_PORTA')
+INTERVALO_METRICAS = 15
+
+class Histograma:
+    """Distribuição de durações em baldes fixos (segundos), como no Prometheus"""
+    
+    LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    
+    def __init__(self):
+        self.baldes = [0] * (len(self.LIMITES) + 1)
+        self.soma = 0.0
+        self.contagem = 0
+        self.maximo = 0.0
+    
+    def observar(self, valor):
+        self.baldes[bisect.bisect_left(self.LIMITES, valor)] += 1
+        self.soma += valor
+        self.contagem += 1
+        self.maximo = max(self.maximo, valor)
+    
+    def quantil(self, q):
+        """Limite superior do balde onde cai o quantil `q` (o máximo, no último balde)"""
+        alvo = q * self.contagem
+        acumulado = 0
+        for limite, quantidade in zip(self.LIMITES, self.baldes):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+class Metricas:
+    """Contadores e histogramas do bot, por métrica e rótulo (ex: nome do comando)"""
+    
+    # Nome do rótulo de cada métrica na exportação
+    ROTULOS = {
+        'comando_segundos': 'comando',
+        'comando_erros': 'comando',
+        'estado_segundos': 'operacao',
+        'rest_requisicoes': 'rota',
+        'rest_429': 'rota',
+        'tarefa_segundos': 'tipo'
+    }
+    
+    LIMITES_TEXTO = [str(limite) for limite in Histograma.LIMITES] + ['+Inf']
+    
+    def __init__(self):
+        self.histogramas = {}
+        self.contadores = {}
+    
+    def observar(self, metrica, rotulo, segundos):
+        chave = (metrica, rotulo)
+        if chave not in self.histogramas:
+            self.histogramas[chave] = Histograma()
+        self.histogramas[chave].observar(segundos)
+    
+    def contar(self, metrica, rotulo, quantidade=1):
+        chave = (metrica, rotulo)
+        self.contadores[chave] = self.contadores.get(chave, 0) + quantidade
+    
+    def por_rotulo(self, metrica, tabela):
+        """Itens (rótulo, valor) de uma métrica em um dos dicionários"""
+        return [(rotulo, valor) for (nome, rotulo), valor in tabela.items() if nome == metrica]
+    
+    def texto_prometheus(self, medidores=()):
+        """Métricas no formato de texto do Prometheus; `medidores` são (nome, rótulos, valor) instantâneos"""
+        linhas = []
+        for metrica in sorted({nome for nome, _ in self.histogramas}):
+            nome = f"multiverso_{metrica}"
+            linhas.append(f"# TYPE {nome} histogram")
+            for rotulo, histograma in sorted(self.por_rotulo(metrica, self.histogramas)):
+                base = f'{self.ROTULOS[metrica]}="{escapar_rotulo(rotulo)}"'
+                acumulado = 0
+                for limite, quantidade in zip(self.LIMITES_TEXTO, histograma.baldes):
+                    acumulado += quantidade
+                    linhas.append(f'{nome}_bucket{{{base},le="{limite}"}} {acumulado}')
+                linhas.append(f'{nome}_sum{{{base}}} {histograma.soma}')
+                linhas.append(f'{nome}_count{{{base}}} {histograma.contagem}')
+        for metrica in sorted({nome for nome, _ in self.contadores}):
+            nome = f"multiverso_{metrica}_total"
+            linhas.append(f"# TYPE {nome} counter")
+            for rotulo, valor in sorted(self.por_rotulo(metrica, self.contadores)):
+                linhas.append(f'{nome}{{{self.ROTULOS[metrica]}="{escapar_rotulo(rotulo)}"}} {valor}')
+        anterior = None
+        for metrica, rotulos, valor in sorted(medidores, key=lambda medidor: medidor[0]):
+            if metrica != anterior:
+                linhas.append(f"# TYPE multiverso_{metrica} gauge")
+                anterior = metrica
+            texto = ','.join(f'{chave}="{escapar_rotulo(v)}"' for chave, v in rotulos.items())
+            linhas.append(f"multiverso_{metrica}{{{texto}}} {valor}")
+        return '\n'.join(linhas) + '\n'
+
+def escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+metricas = Metricas()
+
+class LimitadorRota:
+    """Controla o ritmo de uma rota da API a partir dos cabeçalhos de rate limit do Discord.
+    
+    Em vez de um sleep fixo, os trabalhadores só esperam quando o bucket da rota
+    está realmente esgotado (X-RateLimit-Remaining = 0) ou depois de um 429.
+    Quem reserva a vez com `aguardar_vez()` a devolve com `liberar()` quando a
+    requisição termina; até lá ela conta como "em voo" e ainda vai gastar cota.
+    """
+    
+    # Pausa compartilhada por todas as rotas quando o Discord sinaliza limite global
+    pausa_global_ate = 0.0
+    
+    def __init__(self):
+        self.limite = None
+        self.restantes = None
+        self.reinicia_em = 0.0
+        self.pausa_ate = 0.0
+        self.em_voo = 0
+    
+    def observar(self, status, headers):
+        """Atualiza o estado do bucket com os cabeçalhos de uma resposta"""
+        agora = asyncio.get_running_loop().time()
+        
+        if headers.get('X-RateLimit-Limit') is not None:
+            self.limite = int(headers['X-RateLimit-Limit'])
+        if headers.get('X-RateLimit-Remaining') is not None:
+            # O Discord ainda não viu as outras requisições em voo (esta ainda conta em em_voo)
+            outras_em_voo = max(0, self.em_voo - 1)
+            self.restantes = max(0, int(headers['X-RateLimit-Remaining']) - outras_em_voo)
+        if headers.get('X-RateLimit-Reset-After') is not None:
+            self.reinicia_em = agora + float(headers['X-RateLimit-Reset-After'])
+        
+        if status == 429:
+            espera = float(headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After') or 1)
+            if headers.get('X-RateLimit-Global'):
+                LimitadorRota.pausa_global_ate = max(LimitadorRota.pausa_global_ate, agora + espera)
+            else:
+                self.pausa_ate = max(self.pausa_ate, agora + espera)
+    
+    async def aguardar_vez(self):
+        """Espera até que haja espaço no bucket e reserva uma requisição"""
+        loop = asyncio.get_running_loop()
+        while True:
+            agora = loop.time()
+            pausa = max(self.pausa_ate, LimitadorRota.pausa_global_ate)
+            if agora < pausa:
+                await asyncio.sleep(pausa - agora)
+                continue
+            
+            if self.restantes is not None and self.restantes <= 0:
+                if agora < self.reinicia_em:
+                    await asyncio.sleep(self.reinicia_em - agora)
+                    continue
+                # O bucket reiniciou: assume a cota cheia até a próxima resposta
+                self.restantes = self.limite
+            
+            if self.restantes is not None:
+                self.restantes -= 1
+            self.em_voo += 1
+            return
+    
+    def liberar(self):
+        """A requisição reservada terminou (com ou sem resposta)"""
+        self.em_voo = max(0, self.em_voo - 1)
+
+# Limitadores por rota, ex: "PATCH /guilds/123/members/{id}"
+limitadores = {}
+
+def chave_rota(metodo, caminho):
+    """Normaliza uma URL da API na chave do bucket: mantém só o ID principal (guild/canal)"""
+    caminho = re.sub(r'^/api/v\d+', '', caminho)
+    partes = caminho.strip('/').split('/')
+    for i, parte in enumerate(partes):
+        if parte.isdigit() and not (i > 0 and partes[i - 1] in ('guilds', 'channels', 'webhooks')):
+            partes[i] = '{id}'
+    return f"{metodo} /{'/'.join(partes)}"
+
+def limitador_para(chave):
+    if chave not in limitadores:
+        limitadores[chave] = LimitadorRota()
+    return limitadores[chave]
+
+async def ao_terminar_requisicao(session, contexto, params):
+    """Hook do aiohttp: alimenta os limitadores com os cabeçalhos de cada resposta REST"""
+    chave = chave_rota(params.method, params.url.path)
+    limitador_para(chave).observar(params.response.status, params.response.headers)
+    metricas.contar('rest_requisicoes', chave)
+    if params.response.status == 429:
+        metricas.contar('rest_429', chave)
+
+rastreio_http = aiohttp.TraceConfig()
+rastreio_http.on_request_end.append(ao_terminar_requisicao)
+
+class ArvoreComandos(app_commands.CommandTree):
+    """Árvore de slash commands que mede quanto tempo cada handler leva"""
+    
+    async def interaction_check(self, interaction):
+        interaction.extras['inicio'] = time.perf_counter()
+        return True
+    
+    async def on_error(self, interaction, error):
+        if 'inicio' in interaction.extras and interaction.command is not None:
+            metricas.contar('comando_erros', interaction.command.qualified_name)
+        await super().on_error(interaction, error)
+
+class MultiversoBot(commands.Bot):
+    """Bot do Multiverso que salva o progresso dos rollouts e os dados ao desligar"""
+
+    async def close(self):
+        await pausar_rollouts()
+        await estado.parar()
+        await super().close()
+
+if POUCA_MEMORIA:
+    cache_membros = discord.MemberCacheFlags.none()
+else:
+    cache_membros = discord.MemberCacheFlags.from_intents(intents)
+
+bot = MultiversoBot(
+    command_prefix='/',
+    intents=intents,
+    http_trace=rastreio_http,
+    member_cache_flags=cache_membros,
+    chunk_guilds_at_startup=not POUCA_MEMORIA,
+    tree_cls=ArvoreComandos
+)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    inicio = interaction.extras.get('inicio')
+    if inicio is not None:
+        metricas.observar('comando_segundos', command.qualified_name, time.perf_counter() - inicio)
+
+# Hash dos slash commands no último sync, para só sincronizar quando eles mudarem
+SYNC_FILE = 'multiverso_comandos.json'
+
+# (Desenvolvimento) Servidor onde sincronizar os comandos em vez de globalmente;
+# no servidor as alterações aparecem na hora
+GUILD_DEV = os.getenv('MULTIVERSO_GUILD_DEV')
+
+def hash_comandos(guild=None):
+    """Hash estável das definições dos slash commands (o mesmo conteúdo que o sync envia)"""
+    definicoes = []
+    for comando in bot.tree.get_commands(guild=guild):
+        try:
+            definicoes.append(comando.to_dict(bot.tree))
+        except TypeError:
+            # Versões do discord.py em que to_dict() não recebe a árvore
+            definicoes.append(comando.to_dict())
+    definicoes.sort(key=lambda definicao: (definicao.get('type', 1), definicao['name']))
+    conteudo = json.dumps([bot.application_id, definicoes], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+def ler_hashes_sync():
+    try:
+        with open(SYNC_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def gravar_hashes_sync(hashes):
+    temporario = SYNC_FILE + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, indent=4)
+    os.replace(temporario, SYNC_FILE)
+
+async def sincronizar_comandos(forcar=False):
+    """Sincroniza os slash commands se as definições mudaram desde o último sync.
+    
+    Retorna os comandos sincronizados, ou None quando nada mudou e o sync
+    foi pulado. Com MULTIVERSO_GUILD_DEV, sincroniza só naquele servidor.
+    """
+    guild = discord.Object(id=int(GUILD_DEV)) if GUILD_DEV else None
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    chave = f"guild:{guild.id}" if guild is not None else 'global'
+    
+    loop = asyncio.get_running_loop()
+    hashes = await loop.run_in_executor(executor_disco, ler_hashes_sync)
+    atual = hash_comandos(guild)
+    if not forcar and hashes.get(chave) == atual:
+        return None
+    
+    synced = await bot.tree.sync(guild=guild)
+    hashes[chave] = atual
+    await loop.run_in_executor(executor_disco, gravar_hashes_sync, hashes)
+    return synced
+
+# Sincroniza os slash commands quando o bot inicia (só se mudaram)
+@bot.event
+async def setup_hook():
+    """Carrega os dados e sincroniza os slash commands com o Discord"""
+    estado.carregar()
+    estado.iniciar()
+    iniciar_exportacao_metricas()
+    
+    try:
+        synced = await sincronizar_comandos()
+        if synced is None:
+            log.info("✅ Slash commands sem alterações desde o último sync")
+        else:
+            log.info(f"✅ {len(synced)} slash commands sincronizados!")
+    except Exception as e:
+        log.error(f"❌ Erro ao sincronizar: {e}")
+
+# Arquivo para salvar dados
+DATA_FILE = 'multiverso_data.json'
+
+# Segundos que o escritor aguarda antes de gravar, agrupando várias alterações
+ATRASO_GRAVACAO = float(os.getenv('MULTIVERSO_ATRASO_GRAVACAO', '2'))
+
+# Quantas cópias de segurança (última versão boa) manter ao lado do arquivo
+BACKUPS_MANTIDOS = 3
+
+# Diário de eventos (uma linha JSON por alteração) aplicado sobre o último snapshot
+JOURNAL_FILE = 'multiverso_eventos.jsonl'
+
+# Trechos já compactados do diário são movidos para cá (trilha de auditoria)
+AUDIT_FILE = 'multiverso_auditoria.jsonl'
+
+# Quantos eventos acumular no diário antes de compactar em um novo snapshot
+LIMITE_COMPACTACAO = int(os.getenv('MULTIVERSO_LIMITE_COMPACTACAO', '500'))
+
+# Onde guardar os dados: 'json' (padrão, arquivo + diário) ou 'sqlite'
+BACKEND_DADOS = os.getenv('MULTIVERSO_BACKEND', 'json').lower()
+
+# Banco usado quando MULTIVERSO_BACKEND=sqlite
+DB_FILE = os.getenv('MULTIVERSO_DB', 'multiverso.db')
+
+# Chave dos dados antigos (de antes do suporte a vários servidores) até descobrirmos a qual guild pertencem
+GUILD_LEGADO = 'legado'
+
+# Thread única para todo acesso ao disco: não trava o event loop e mantém a ordem das gravações
+executor_disco = ThreadPoolExecutor(max_workers=1, thread_name_prefix='multiverso-disco')
+
+# Estrutura de dados
+def config_padrao():
+    """Configuração padrão da votação automática de um servidor"""
+    return {
+        'canal_votacao_id': None,
+        'dia': 1,
+        'hora': 3,
+        'duracao_horas': 24,
+        'candidatos_por_votacao': 0,
+        'sorteio': 'espera'
+    }
+
+def dados_padrao():
+    """Retorna a estrutura vazia de dados do Multiverso de um servidor"""
+    return {
+        'participantes': {},
+        'ja_escolhidos': set(),
+        'atual_escolhido': None,
+        'historico': [],
+        'poll_message_id': None,
+        'poll_channel_id': None,
+        'poll_votos': {},
+        'ofertas': {},
+        'config': config_padrao()
+    }
+
+def ajustar_tipos(raiz):
+    """Converte o que o JSON guarda como lista para o tipo usado em memória"""
+    for data in raiz['guilds'].values():
+        data['ja_escolhidos'] = set(data.get('ja_escolhidos', ()))
+
+def serializar(valor):
+    """`default` do json.dumps para os dados em memória: conjuntos viram listas"""
+    if isinstance(valor, set):
+        return sorted(valor)
+    raise TypeError(f"{type(valor).__name__} não é serializável em JSON")
+
+def marcar_ofertas(data, candidatos, seq):
+    """Anota em `ofertas` a última enquete (número de sequência) em que cada candidato apareceu"""
+    ofertas = data.setdefault('ofertas', {})
+    for user_id, _ in candidatos:
+        ofertas[user_id] = seq
+
+def nova_rodada(evento):
+    """Estado de uma rodada do chaveamento a partir do evento 'rodada_iniciada'"""
+    return {
+        'rodada': evento['rodada'],
+        'total_rodadas': evento['total_rodadas'],
+        'duracao_horas': evento['duracao_horas'],
+        'vagas': evento['vagas'],
+        'automatico': evento['automatico'],
+        'channel_id': evento['channel_id'],
+        'inicio': evento['inicio'],
+        'fim_programado': evento['fim_programado'],
+        'grupos': {
+            str(message_id): {'candidatos': candidatos, 'votos': {}}
+            for message_id, candidatos in evento['grupos']
+        },
+        'classificados': []
+    }
+
+def calcular_estatisticas(historico):
+    """Agregados do histórico calculados do zero (dados antigos, sem `estatisticas`)"""
+    estatisticas = {
+        'eleicoes': 0,
+        'automaticas': 0,
+        'votos_total': 0,
+        'com_votos': 0,
+        'vitorias': {},
+        'sequencia': None,
+        'maior_sequencia': None,
+        'recorde_votos': None
+    }
+    for registro in historico:
+        somar_ao_historico(estatisticas, registro)
+    return estatisticas
+
+def somar_ao_historico(estatisticas, registro):
+    """Atualiza os agregados do histórico com um novo vencedor, sem reler o histórico"""
+    estatisticas['eleicoes'] += 1
+    if registro.get('automatico'):
+        estatisticas['automaticas'] += 1
+    
+    votos = registro.get('votos')
+    if isinstance(votos, int):
+        estatisticas['votos_total'] += votos
+        estatisticas['com_votos'] += 1
+        recorde = estatisticas['recorde_votos']
+        if recorde is None or votos > recorde['votos']:
+            estatisticas['recorde_votos'] = {
+                'user_id': str(registro.get('user_id')),
+                'apelido': registro.get('apelido'),
+                'votos': votos,
+                'data': registro.get('data')
+            }
+    
+    user_id = str(registro.get('user_id'))
+    estatisticas['vitorias'][user_id] = estatisticas['vitorias'].get(user_id, 0) + 1
+    
+    # Vitórias seguidas da mesma pessoa (só acontece depois de um reset do rodízio)
+    sequencia = estatisticas['sequencia']
+    if sequencia and sequencia['user_id'] == user_id:
+        sequencia['tamanho'] += 1
+    else:
+        sequencia = estatisticas['sequencia'] = {'user_id': user_id, 'tamanho': 1}
+    maior = estatisticas['maior_sequencia']
+    if maior is None or sequencia['tamanho'] > maior['tamanho']:
+        estatisticas['maior_sequencia'] = dict(sequencia)
+
+def estatisticas_do_historico(data):
+    """Agregados do histórico do servidor, calculados uma única vez para dados antigos"""
+    if 'estatisticas' not in data:
+        data['estatisticas'] = calcular_estatisticas(data['historico'])
+    return data['estatisticas']
+
+def juntar_anos_arquivados(data, evento):
+    """Tira do estado as eleições que foram para o arquivo e anota onde ficou cada ano.
+    
+    `anos` guarda, por ano, a faixa [inicio, fim) das posições arquivadas;
+    `total` é quantas eleições estão fora da memória (o número da mais antiga
+    que ainda está em `historico`).
+    """
+    arquivado = data.setdefault('historico_arquivado', {'total': 0, 'anos': {}})
+    if arquivado['total'] != evento['inicio']:
+        return
+    estatisticas_do_historico(data)
+    data['historico'] = data['historico'][evento['quantidade']:]
+    arquivado['total'] += evento['quantidade']
+    for ano, (inicio, fim) in evento['anos'].items():
+        faixa = arquivado['anos'].get(ano)
+        arquivado['anos'][ano] = [faixa[0], fim] if faixa else [inicio, fim]
+
+def votos_da_enquete(data, message_id):
+    """Contador ao vivo de uma enquete do servidor: a votação principal ou um grupo do chaveamento"""
+    if data.get('poll_message_id') == message_id:
+        return data.setdefault('poll_votos', {})
+    grupo = (data.get('chaveamento') or {}).get('grupos', {}).get(str(message_id))
+    return grupo['votos'] if grupo else None
+
+def estrutura_vazia():
+    """Retorna o documento vazio com os dados de todos os servidores"""
+    return {'_seq': 0, 'guilds': {}}
+
+def migrar_para_guilds(data):
+    """Converte o formato antigo (um único servidor) para dados por guild"""
+    if 'guilds' in data:
+        return data
+    seq = data.pop('_seq', 0)
+    legado = dados_padrao()
+    legado.update(data)
+    return {'_seq': seq, 'guilds': {GUILD_LEGADO: legado}}
+
+def caminho_backup(arquivo, n):
+    """Caminho da n-ésima cópia de segurança (1 = mais recente)"""
+    return f"{arquivo}.bak{n}"
+
+def gravar_atomico(arquivo, conteudo):
+    """Grava em arquivo temporário, faz fsync e troca pelo original de forma atômica.
+    
+    A versão anterior vira a cópia de segurança mais recente, então sempre existe
+    um arquivo válido no disco mesmo que o processo morra no meio da gravação.
+    """
+    pasta = os.path.dirname(os.path.abspath(arquivo))
+    temporario = f"{arquivo}.tmp"
+    
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    if os.path.exists(arquivo):
+        for n in range(BACKUPS_MANTIDOS, 1, -1):
+            if os.path.exists(caminho_backup(arquivo, n - 1)):
+                os.replace(caminho_backup(arquivo, n - 1), caminho_backup(arquivo, n))
+        os.replace(arquivo, caminho_backup(arquivo, 1))
+    
+    os.replace(temporario, arquivo)
+    
+    # Garante que as renomeações também cheguem ao disco
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(pasta, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def ler_com_backup(arquivo):
+    """Lê o JSON; se estiver corrompido ou ausente, tenta as cópias de segurança.
+    
+    Retorna (dados, caminho_lido); dados é None quando não existe nenhum
+    arquivo (primeira execução).
+    """
+    candidatos = [arquivo] + [caminho_backup(arquivo, n) for n in range(1, BACKUPS_MANTIDOS + 1)]
+    encontrou_algum = False
+    
+    for caminho in candidatos:
+        if not os.path.exists(caminho):
+            continue
+        encontrou_algum = True
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Arquivo de dados inválido ({caminho}): {e}")
+            continue
+        if caminho != arquivo:
+            log.info(f"♻️ Dados recuperados da cópia de segurança {caminho}")
+        return data, caminho
+    
+    if encontrou_algum:
+        raise RuntimeError(f"Nenhuma cópia válida de {arquivo} foi encontrada!")
+    return None, None
+
+def anexar_linhas(arquivo, linhas):
+    """Acrescenta linhas ao final do arquivo e faz fsync"""
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        f.write(''.join(linha + '\n' for linha in linhas))
+        f.flush()
+        os.fsync(f.fileno())
+
+def ler_eventos(arquivo):
+    """Lê os eventos de um diário, ignorando uma última linha incompleta"""
+    eventos = []
+    if not os.path.exists(arquivo):
+        return eventos
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        for linha in f:
+            if not linha.endswith('\n'):
+                # Processo morreu no meio da escrita desta linha
+                break
+            try:
+                eventos.append(json.loads(linha))
+            except ValueError:
+                break
+    return eventos
+
+def compactar_em_disco(arquivo, conteudo, diario, auditoria):
+    """Grava o snapshot e move o diário já incluído nele para a auditoria"""
+    gravar_atomico(arquivo, conteudo)
+    if os.path.exists(diario):
+        with open(diario, 'r', encoding='utf-8') as f:
+            trecho = f.read()
+        if trecho:
+            with open(auditoria, 'a', encoding='utf-8') as f:
+                f.write(trecho)
+                f.flush()
+                os.fsync(f.fileno())
+        with open(diario, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+def limpar_votacao(data):
+    """Tira a votação encerrada dos dados, deixando-os como o SQLite os carrega sem votação"""
+    data['poll_message_id'] = None
+    data['poll_channel_id'] = None
+    data['poll_votos'] = {}
+    for chave in ('poll_candidatos', 'poll_inicio', 'poll_fim_programado', 'poll_automatico'):
+        data.pop(chave, None)
+
+def aplicar_evento(raiz, evento):
+    """Aplica um evento do diário sobre os dados (usado ao registrar e ao reaplicar)"""
+    tipo = evento['tipo']
+    
+    if tipo == 'guild_legada_atribuida':
+        legado = raiz['guilds'].pop(GUILD_LEGADO, None)
+        if legado is not None:
+            raiz['guilds'][evento['guild_id']] = legado
+        return
+    
+    # Eventos antigos (de antes do suporte a vários servidores) não têm guild_id
+    guild_id = evento.get('guild_id') or GUILD_LEGADO
+    data = raiz['guilds'].setdefault(guild_id, dados_padrao())
+    
+    if tipo == 'participante_adicionado':
+        data['participantes'][evento['user_id']] = evento['info']
+    
+    elif tipo == 'participante_removido':
+        data['participantes'].pop(evento['user_id'], None)
+        data.get('ofertas', {}).pop(evento['user_id'], None)
+        data['ja_escolhidos'].discard(evento['user_id'])
+    
+    elif tipo == 'escolhidos_resetados':
+        data['ja_escolhidos'] = set()
+        if evento.get('limpar_atual'):
+            data['atual_escolhido'] = None
+    
+    elif tipo == 'votacao_iniciada':
+        data['poll_message_id'] = evento['message_id']
+        data['poll_channel_id'] = evento['channel_id']
+        data['poll_candidatos'] = evento['candidatos']
+        data['poll_inicio'] = evento['inicio']
+        data['poll_fim_programado'] = evento['fim_programado']
+        data['poll_votos'] = {}
+        # Só a final do chaveamento traz o `automatico` (herdado do chaveamento)
+        if 'automatico' in evento:
+            data['poll_automatico'] = evento['automatico']
+        else:
+            data.pop('poll_automatico', None)
+        marcar_ofertas(data, evento['candidatos'], evento['seq'])
+    
+    elif tipo == 'voto_contado':
+        votos = votos_da_enquete(data, evento['message_id'])
+        if votos is not None:
+            opcao = str(evento['answer_id'])
+            votos[opcao] = max(0, votos.get(opcao, 0) + evento['delta'])
+    
+    elif tipo == 'votos_reconciliados':
+        votos = votos_da_enquete(data, evento['message_id'])
+        if votos is not None:
+            votos.clear()
+            votos.update(evento['votos'])
+    
+    elif tipo == 'rodada_iniciada':
+        data['chaveamento'] = nova_rodada(evento)
+        for _, candidatos in evento['grupos']:
+            marcar_ofertas(data, candidatos, evento['seq'])
+    
+    elif tipo == 'grupo_encerrado':
+        chaveamento = data.get('chaveamento')
+        if chaveamento and chaveamento['grupos'].pop(str(evento['message_id']), None) is not None:
+            chaveamento['classificados'].extend(evento['classificados'])
+    
+    elif tipo == 'chaveamento_concluido':
+        data.pop('chaveamento', None)
+    
+    elif tipo == 'votacao_cancelada':
+        limpar_votacao(data)
+    
+    elif tipo == 'vencedor_registrado':
+        data['ja_escolhidos'].add(evento['user_id'])
+        data['atual_escolhido'] = evento['user_id']
+        somar_ao_historico(estatisticas_do_historico(data), evento['registro'])
+        data['historico'].append(evento['registro'])
+        limpar_votacao(data)
+    
+    elif tipo == 'historico_arquivado':
+        juntar_anos_arquivados(data, evento)
+    
+    elif tipo == 'guild_configurada':
+        data['config'] = evento['config']
+    
+    elif tipo == 'agenda_executada':
+        data.setdefault('agenda', {})[evento['tarefa']] = evento['horario']
+    
+    elif tipo == 'rollout_iniciado':
+        data['rollout'] = evento['rollout']
+    
+    elif tipo == 'rollout_mensagem':
+        data['rollout']['mensagem_id'] = evento['mensagem_id']
+    
+    elif tipo == 'rollout_progresso':
+        data['rollout'].update(
+            watermark=evento['watermark'],
+            sucessos=evento['sucessos'],
+            falhas=evento['falhas'],
+            ignorados=evento.get('ignorados', 0),
+            sem_permissao=evento.get('sem_permissao', 0)
+        )
+    
+    elif tipo == 'rollout_concluido':
+        data.pop('rollout', None)
+    
+    elif tipo == 'sistema_resetado':
+        config = data.get('config', config_padrao())
+        data.clear()
+        data.update(dados_padrao())
+        data['config'] = config
+    
+    # Outros tipos só ficam registrados na auditoria
+
+class PersistenciaJSON:
+    """Snapshot em multiverso_data.json + diário de eventos em texto.
+    
+    Todos os métodos rodam na thread de disco, nunca no event loop.
+    """
+    
+    def __init__(self, arquivo, diario, auditoria):
+        self.arquivo = arquivo
+        self.diario = diario
+        self.auditoria = auditoria
+        self.eventos_no_diario = 0
+    
+    def ler(self):
+        """Carrega o snapshot e reaplica o diário por cima dele"""
+        data, caminho = ler_com_backup(self.arquivo)
+        data = migrar_para_guilds(data) if data is not None else estrutura_vazia()
+        ajustar_tipos(data)
+        eventos = ler_eventos(self.diario)
+        
+        # Snapshot veio de um backup mais antigo: o trecho que falta está na auditoria
+        lacuna = eventos and eventos[0]['seq'] > data.get('_seq', 0) + 1
+        if lacuna or (caminho is not None and caminho != self.arquivo):
+            eventos = ler_eventos(self.auditoria) + eventos
+        
+        for evento in eventos:
+            if evento['seq'] > data.get('_seq', 0):
+                aplicar_evento(data, evento)
+                data['_seq'] = evento['seq']
+                self.eventos_no_diario += 1
+        
+        if self.eventos_no_diario:
+            log.info(f"📒 {self.eventos_no_diario} eventos reaplicados do diário")
+        return data
+    
+    def anotar(self, linhas):
+        """Acrescenta os eventos ao diário"""
+        anexar_linhas(self.diario, linhas)
+        self.eventos_no_diario += len(linhas)
+    
+    def compactar(self, conteudo):
+        """Grava um snapshot completo e esvazia o diário"""
+        compactar_em_disco(self.arquivo, conteudo, self.diario, self.auditoria)
+        self.eventos_no_diario = 0
+    
+    @property
+    def compactacao_devida(self):
+        return self.eventos_no_diario >= LIMITE_COMPACTACAO
+    
+    @property
+    def compactacao_pendente(self):
+        return self.eventos_no_diario > 0
+    
+    def fechar(self):
+        pass
+
+# Chaves de dados da guild que têm tabela própria no SQLite; o resto vai para a tabela `estado`
+CHAVES_TABELADAS = (
+    'participantes', 'ja_escolhidos', 'historico',
+    'poll_message_id', 'poll_channel_id', 'poll_candidatos', 'poll_inicio', 'poll_fim_programado'
+)
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+CREATE TABLE IF NOT EXISTS participantes (
+    guild_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    apelido TEXT NOT NULL,
+    info TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_participantes_ordem ON participantes (guild_id, ordem);
+CREATE TABLE IF NOT EXISTS ja_escolhidos (
+    guild_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS historico (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    data TEXT,
+    registro TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_historico_guild ON historico (guild_id, id);
+CREATE INDEX IF NOT EXISTS idx_historico_usuario ON historico (guild_id, user_id);
+CREATE TABLE IF NOT EXISTS votacoes (
+    message_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER,
+    candidatos TEXT NOT NULL,
+    inicio TEXT,
+    fim_programado TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_votacoes_guild ON votacoes (guild_id);
+CREATE TABLE IF NOT EXISTS estado (
+    guild_id INTEGER NOT NULL,
+    chave TEXT NOT NULL,
+    valor TEXT,
+    PRIMARY KEY (guild_id, chave)
+);
+CREATE TABLE IF NOT EXISTS auditoria (
+    seq INTEGER PRIMARY KEY,
+    ts TEXT,
+    tipo TEXT NOT NULL,
+    autor INTEGER,
+    evento TEXT NOT NULL
+);
+"""
+
+class PersistenciaSQLite:
+    """Banco SQLite (modo WAL) com tabelas indexadas por guild e usuário.
+    
+    Cada evento vira um UPDATE/INSERT/DELETE pontual. Na primeira execução
+    os dados do multiverso_data.json (e do diário) são migrados para o banco.
+    Todos os métodos rodam na thread de disco, nunca no event loop.
+    """
+    
+    def __init__(self, caminho, arquivo_json, diario, auditoria):
+        self.caminho = caminho
+        self.arquivo_json = arquivo_json
+        self.diario = diario
+        self.auditoria = auditoria
+        self.conexao = None
+        self._ressincronizar = False
+    
+    def _conectar(self):
+        if self.conexao is None:
+            # Só a thread de disco usa a conexão depois da carga inicial
+            self.conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            self.conexao.execute('PRAGMA journal_mode=WAL')
+            self.conexao.execute('PRAGMA synchronous=NORMAL')
+            self.conexao.executescript(ESQUEMA_SQLITE)
+        return self.conexao
+    
+    @staticmethod
+    def _id_sql(guild_id):
+        """Chave da guild em memória -> guild_id da tabela (0 = dados legados)"""
+        return 0 if guild_id == GUILD_LEGADO else int(guild_id)
+    
+    @staticmethod
+    def _id_memoria(guild_id):
+        return GUILD_LEGADO if guild_id == 0 else str(guild_id)
+    
+    def ler(self):
+        """Carrega os dados do banco, migrando do JSON se o banco for novo"""
+        con = self._conectar()
+        versao = con.execute("SELECT valor FROM meta WHERE chave = 'versao'").fetchone()
+        
+        if versao is None:
+            legado = PersistenciaJSON(self.arquivo_json, self.diario, self.auditoria)
+            data = legado.ler()
+            with con:
+                self._gravar_tudo(con, data)
+                con.execute("INSERT OR REPLACE INTO meta VALUES ('versao', '1')")
+                if os.path.exists(self.arquivo_json):
+                    con.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('migrado_de_json', ?)",
+                        (datetime.utcnow().isoformat(),)
+                    )
+            if os.path.exists(self.arquivo_json):
+                log.info(f"🗄️ Dados migrados de {self.arquivo_json} para {self.caminho}")
+            return data
+        
+        seq = con.execute("SELECT valor FROM meta WHERE chave = '_seq'").fetchone()
+        data = {'_seq': int(seq[0]) if seq else 0, 'guilds': {}}
+        for (guild_id,) in con.execute(
+            "SELECT guild_id FROM estado UNION SELECT guild_id FROM participantes "
+            "UNION SELECT guild_id FROM historico UNION SELECT guild_id FROM votacoes"
+        ).fetchall():
+            data['guilds'][self._id_memoria(guild_id)] = self._ler_guild(con, guild_id)
+        return data
+    
+    def _ler_guild(self, con, guild_id):
+        data = dados_padrao()
+        
+        for user_id, info in con.execute(
+            "SELECT user_id, info FROM participantes WHERE guild_id = ? ORDER BY ordem", (guild_id,)
+        ):
+            data['participantes'][user_id] = json.loads(info)
+        
+        data['ja_escolhidos'] = {
+            user_id for (user_id,) in con.execute(
+                "SELECT user_id FROM ja_escolhidos WHERE guild_id = ?", (guild_id,)
+            )
+        }
+        
+        data['historico'] = [
+            json.loads(registro) for (registro,) in con.execute(
+                "SELECT registro FROM historico WHERE guild_id = ? ORDER BY id", (guild_id,)
+            )
+        ]
+        
+        votacao = con.execute(
+            "SELECT message_id, channel_id, candidatos, inicio, fim_programado "
+            "FROM votacoes WHERE guild_id = ? ORDER BY message_id DESC LIMIT 1", (guild_id,)
+        ).fetchone()
+        if votacao:
+            message_id, channel_id, candidatos, inicio, fim_programado = votacao
+            data['poll_message_id'] = message_id
+            data['poll_channel_id'] = channel_id
+            data['poll_candidatos'] = json.loads(candidatos)
+            data['poll_inicio'] = inicio
+            data['poll_fim_programado'] = fim_programado
+        
+        for chave, valor in con.execute("SELECT chave, valor FROM estado WHERE guild_id = ?", (guild_id,)):
+            data[chave] = json.loads(valor)
+        
+        return data
+    
+    def _gravar_tudo(self, con, raiz):
+        """Reescreve o banco inteiro a partir do dicionário (migração/ressincronização)"""
+        for tabela in ('participantes', 'ja_escolhidos', 'historico', 'votacoes', 'estado'):
+            con.execute(f"DELETE FROM {tabela}")
+        for guild_id, data in raiz['guilds'].items():
+            self._gravar_guild(con, self._id_sql(guild_id), data)
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('_seq', ?)", (str(raiz.get('_seq', 0)),))
+    
+    def _gravar_guild(self, con, guild_id, data):
+        con.executemany(
+            "INSERT INTO participantes VALUES (?, ?, ?, ?, ?)",
+            [
+                (guild_id, user_id, info['apelido'], json.dumps(info, ensure_ascii=False), ordem)
+                for ordem, (user_id, info) in enumerate(data['participantes'].items())
+            ]
+        )
+        con.executemany(
+            "INSERT OR IGNORE INTO ja_escolhidos VALUES (?, ?, ?)",
+            [(guild_id, user_id, ordem) for ordem, user_id in enumerate(data['ja_escolhidos'])]
+        )
+        con.executemany(
+            "INSERT INTO historico (guild_id, user_id, data, registro) VALUES (?, ?, ?, ?)",
+            [
+                (guild_id, str(registro.get('user_id')), registro.get('data'), json.dumps(registro, ensure_ascii=False))
+                for registro in data['historico']
+            ]
+        )
+        if data.get('poll_message_id'):
+            con.execute(
+                "INSERT OR REPLACE INTO votacoes VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    data['poll_message_id'], guild_id, data.get('poll_channel_id'),
+                    json.dumps(data.get('poll_candidatos', []), ensure_ascii=False),
+                    data.get('poll_inicio'), data.get('poll_fim_programado')
+                )
+            )
+        con.executemany(
+            "INSERT INTO estado VALUES (?, ?, ?)",
+            [
+                (guild_id, chave, json.dumps(valor, ensure_ascii=False))
+                for chave, valor in data.items() if chave not in CHAVES_TABELADAS
+            ]
+        )
+    
+    def _definir(self, con, guild_id, chave, valor):
+        con.execute(
+            "INSERT OR REPLACE INTO estado VALUES (?, ?, ?)",
+            (guild_id, chave, json.dumps(valor, ensure_ascii=False))
+        )
+    
+    def _estatisticas(self, con, guild_id):
+        linha = con.execute(
+            "SELECT valor FROM estado WHERE guild_id = ? AND chave = 'estatisticas'", (guild_id,)
+        ).fetchone()
+        if linha:
+            return json.loads(linha[0])
+        return calcular_estatisticas(
+            json.loads(anterior) for (anterior,) in con.execute(
+                "SELECT registro FROM historico WHERE guild_id = ? ORDER BY id", (guild_id,)
+            )
+        )
+    
+    def _somar_estatisticas(self, con, guild_id, registro):
+        estatisticas = self._estatisticas(con, guild_id)
+        somar_ao_historico(estatisticas, registro)
+        self._definir(con, guild_id, 'estatisticas', estatisticas)
+    
+    def _marcar_ofertas(self, con, guild_id, candidatos, seq):
+        con.executemany(
+            "INSERT INTO estado VALUES (?, 'ofertas', json_object(?, ?)) "
+            "ON CONFLICT (guild_id, chave) DO UPDATE SET valor = json_set(valor, ?, ?)",
+            [(guild_id, user_id, seq, f'$."{user_id}"', seq) for user_id, _ in candidatos]
+        )
+    
+    def _aplicar_sql(self, con, evento):
+        """Traduz um evento do diário em comandos SQL pontuais"""
+        tipo = evento['tipo']
+        guild_id = self._id_sql(evento.get('guild_id') or GUILD_LEGADO)
+        
+        if tipo == 'guild_legada_atribuida':
+            for tabela in ('participantes', 'ja_escolhidos', 'historico', 'votacoes', 'estado'):
+                con.execute(f"UPDATE {tabela} SET guild_id = ? WHERE guild_id = 0", (guild_id,))
+        
+        elif tipo == 'participante_adicionado':
+            info = evento['info']
+            con.execute(
+                "INSERT INTO participantes VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET apelido = excluded.apelido, info = excluded.info",
+                (guild_id, evento['user_id'], info['apelido'], json.dumps(info, ensure_ascii=False), evento['seq'])
+            )
+        
+        elif tipo == 'participante_removido':
+            con.execute("DELETE FROM participantes WHERE guild_id = ? AND user_id = ?", (guild_id, evento['user_id']))
+            con.execute("DELETE FROM ja_escolhidos WHERE guild_id = ? AND user_id = ?", (guild_id, evento['user_id']))
+            con.execute(
+                "UPDATE estado SET valor = json_remove(valor, ?) WHERE guild_id = ? AND chave = 'ofertas'",
+                (f'$."{evento["user_id"]}"', guild_id)
+            )
+        
+        elif tipo == 'escolhidos_resetados':
+            con.execute("DELETE FROM ja_escolhidos WHERE guild_id = ?", (guild_id,))
+            if evento.get('limpar_atual'):
+                self._definir(con, guild_id, 'atual_escolhido', None)
+        
+        elif tipo == 'votacao_iniciada':
+            con.execute("DELETE FROM votacoes WHERE guild_id = ?", (guild_id,))
+            con.execute(
+                "INSERT INTO votacoes VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    evento['message_id'], guild_id, evento['channel_id'],
+                    json.dumps(evento['candidatos'], ensure_ascii=False),
+                    evento['inicio'], evento['fim_programado']
+                )
+            )
+            self._definir(con, guild_id, 'poll_votos', {})
+            if 'automatico' in evento:
+                self._definir(con, guild_id, 'poll_automatico', evento['automatico'])
+            else:
+                con.execute("DELETE FROM estado WHERE guild_id = ? AND chave = 'poll_automatico'", (guild_id,))
+            self._marcar_ofertas(con, guild_id, evento['candidatos'], evento['seq'])
+        
+        elif tipo == 'voto_contado':
+            caminho = f'$."{evento["answer_id"]}"'
+            con.execute(
+                "INSERT INTO estado (guild_id, chave, valor) "
+                "SELECT ?, 'poll_votos', json_object(?, max(0, ?)) "
+                "WHERE EXISTS (SELECT 1 FROM votacoes WHERE guild_id = ? AND message_id = ?) "
+                "ON CONFLICT (guild_id, chave) DO UPDATE SET "
+                "valor = json_set(valor, ?, max(0, coalesce(json_extract(valor, ?), 0) + ?))",
+                (
+                    guild_id, str(evento['answer_id']), evento['delta'], guild_id, evento['message_id'],
+                    caminho, caminho, evento['delta']
+                )
+            )
+            # Voto em um grupo do chaveamento
+            grupo = f'$.grupos."{evento["message_id"]}"'
+            voto = f'{grupo}.votos."{evento["answer_id"]}"'
+            con.execute(
+                "UPDATE estado SET valor = json_set(valor, ?, max(0, coalesce(json_extract(valor, ?), 0) + ?)) "
+                "WHERE guild_id = ? AND chave = 'chaveamento' AND json_extract(valor, ?) IS NOT NULL",
+                (voto, voto, evento['delta'], guild_id, grupo)
+            )
+        
+        elif tipo == 'votos_reconciliados':
+            con.execute(
+                "INSERT OR REPLACE INTO estado (guild_id, chave, valor) SELECT ?, 'poll_votos', ? "
+                "WHERE EXISTS (SELECT 1 FROM votacoes WHERE guild_id = ? AND message_id = ?)",
+                (guild_id, json.dumps(evento['votos']), guild_id, evento['message_id'])
+            )
+            grupo = f'$.grupos."{evento["message_id"]}"'
+            con.execute(
+                "UPDATE estado SET valor = json_set(valor, ?, json(?)) "
+                "WHERE guild_id = ? AND chave = 'chaveamento' AND json_extract(valor, ?) IS NOT NULL",
+                (f'{grupo}.votos', json.dumps(evento['votos']), guild_id, grupo)
+            )
+        
+        elif tipo == 'rodada_iniciada':
+            self._definir(con, guild_id, 'chaveamento', nova_rodada(evento))
+            for _, candidatos in evento['grupos']:
+                self._marcar_ofertas(con, guild_id, candidatos, evento['seq'])
+        
+        elif tipo == 'grupo_encerrado':
+            grupo = f'$.grupos."{evento["message_id"]}"'
+            filtro = "WHERE guild_id = ? AND chave = 'chaveamento' AND json_extract(valor, ?) IS NOT NULL"
+            for classificado in evento['classificados']:
+                con.execute(
+                    f"UPDATE estado SET valor = json_insert(valor, '$.classificados[#]', json(?)) {filtro}",
+                    (json.dumps(classificado, ensure_ascii=False), guild_id, grupo)
+                )
+            con.execute(f"UPDATE estado SET valor = json_remove(valor, ?) {filtro}", (grupo, guild_id, grupo))
+        
+        elif tipo == 'chaveamento_concluido':
+            con.execute("DELETE FROM estado WHERE guild_id = ? AND chave = 'chaveamento'", (guild_id,))
+        
+        elif tipo == 'votacao_cancelada':
+            con.execute("DELETE FROM votacoes WHERE guild_id = ?", (guild_id,))
+            con.execute("DELETE FROM estado WHERE guild_id = ? AND chave = 'poll_automatico'", (guild_id,))
+            self._definir(con, guild_id, 'poll_votos', {})
+        
+        elif tipo == 'vencedor_registrado':
+            registro = evento['registro']
+            con.execute("INSERT OR IGNORE INTO ja_escolhidos VALUES (?, ?, ?)", (guild_id, evento['user_id'], evento['seq']))
+            self._definir(con, guild_id, 'atual_escolhido', evento['user_id'])
+            self._somar_estatisticas(con, guild_id, registro)
+            con.execute(
+                "INSERT INTO historico (guild_id, user_id, data, registro) VALUES (?, ?, ?, ?)",
+                (guild_id, evento['user_id'], registro.get('data'), json.dumps(registro, ensure_ascii=False))
+            )
+            con.execute("DELETE FROM votacoes WHERE guild_id = ?", (guild_id,))
+            con.execute("DELETE FROM estado WHERE guild_id = ? AND chave = 'poll_automatico'", (guild_id,))
+            self._definir(con, guild_id, 'poll_votos', {})
+        
+        elif tipo == 'historico_arquivado':
+            linha = con.execute(
+                "SELECT valor FROM estado WHERE guild_id = ? AND chave = 'historico_arquivado'", (guild_id,)
+            ).fetchone()
+            parcial = {'historico': [], 'estatisticas': self._estatisticas(con, guild_id)}
+            if linha:
+                parcial['historico_arquivado'] = json.loads(linha[0])
+            juntar_anos_arquivados(parcial, evento)
+            if parcial['historico_arquivado']['total'] == evento['inicio'] + evento['quantidade']:
+                con.execute(
+                    "DELETE FROM historico WHERE id IN "
+                    "(SELECT id FROM historico WHERE guild_id = ? ORDER BY id LIMIT ?)",
+                    (guild_id, evento['quantidade'])
+                )
+                self._definir(con, guild_id, 'historico_arquivado', parcial['historico_arquivado'])
+                self._definir(con, guild_id, 'estatisticas', parcial['estatisticas'])
+        
+        elif tipo == 'guild_configurada':
+            self._definir(con, guild_id, 'config', evento['config'])
+        
+        elif tipo == 'agenda_executada':
+            con.execute(
+                "INSERT INTO estado VALUES (?, 'agenda', json_object(?, ?)) "
+                "ON CONFLICT (guild_id, chave) DO UPDATE SET valor = json_set(valor, '$.' || ?, ?)",
+                (guild_id, evento['tarefa'], evento['horario'], evento['tarefa'], evento['horario'])
+            )
+        
+        elif tipo == 'rollout_iniciado':
+            self._definir(con, guild_id, 'rollout', evento['rollout'])
+        
+        elif tipo == 'rollout_mensagem':
+            con.execute(
+                "UPDATE estado SET valor = json_set(valor, '$.mensagem_id', ?) WHERE guild_id = ? AND chave = 'rollout'",
+                (evento['mensagem_id'], guild_id)
+            )
+        
+        elif tipo == 'rollout_progresso':
+            con.execute(
+                "UPDATE estado SET valor = json_set(valor, '$.watermark', ?, '$.sucessos', ?, '$.falhas', ?, "
+                "'$.ignorados', ?, '$.sem_permissao', ?) WHERE guild_id = ? AND chave = 'rollout'",
+                (
+                    evento['watermark'], evento['sucessos'], evento['falhas'],
+                    evento.get('ignorados', 0), evento.get('sem_permissao', 0), guild_id
+                )
+            )
+        
+        elif tipo == 'rollout_concluido':
+            con.execute("DELETE FROM estado WHERE guild_id = ? AND chave = 'rollout'", (guild_id,))
+        
+        elif tipo == 'sistema_resetado':
+            for tabela in ('participantes', 'ja_escolhidos', 'historico', 'votacoes'):
+                con.execute(f"DELETE FROM {tabela} WHERE guild_id = ?", (guild_id,))
+            con.execute("DELETE FROM estado WHERE guild_id = ? AND chave != 'config'", (guild_id,))
+        
+        else:
+            # Evento sem tradução pontual: reescreve tudo no próximo snapshot
+            self._ressincronizar = True
+        
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('_seq', ?)", (str(evento['seq']),))
+    
+    def anotar(self, linhas):
+        """Aplica os eventos no banco em uma única transação.
+        
+        Eventos que o banco já tem (número de sequência até o `_seq` da meta,
+        ex: registrados durante uma compactação) só vão para a auditoria.
+        """
+        con = self._conectar()
+        with con:
+            linha_seq = con.execute("SELECT valor FROM meta WHERE chave = '_seq'").fetchone()
+            seq = int(linha_seq[0]) if linha_seq else 0
+            for linha in linhas:
+                evento = json.loads(linha)
+                if evento['seq'] > seq:
+                    self._aplicar_sql(con, evento)
+                    seq = evento['seq']
+                con.execute(
+                    "INSERT OR REPLACE INTO auditoria VALUES (?, ?, ?, ?, ?)",
+                    (evento['seq'], evento.get('ts'), evento['tipo'], evento.get('autor'), linha)
+                )
+    
+    def compactar(self, conteudo):
+        """Reescreve todas as tabelas a partir de um snapshot completo"""
+        con = self._conectar()
+        with con:
+            self._gravar_tudo(con, json.loads(conteudo))
+        self._ressincronizar = False
+    
+    @property
+    def compactacao_devida(self):
+        return self._ressincronizar
+    
+    @property
+    def compactacao_pendente(self):
+        return self._ressincronizar
+    
+    def fechar(self):
+        if self.conexao is not None:
+            self.conexao.close()
+            self.conexao = None
+
+# Eventos que mudam quem está no rodízio (ou a ordem de espera) de um servidor
+EVENTOS_RODIZIO = {
+    'participante_adicionado', 'participante_removido', 'escolhidos_resetados',
+    'votacao_iniciada', 'rodada_iniciada', 'vencedor_registrado',
+    'sistema_resetado', 'guild_legada_atribuida'
+}
+
+class EstadoMultiverso:
+    """Mantém os dados em memória e persiste as alterações em segundo plano.
+    
+    Cada alteração vira um evento que o backend grava de forma pontual (uma
+    linha no diário ou um comando SQL), com custo proporcional à alteração e
+    não ao tamanho dos dados. Snapshots completos só acontecem na compactação.
+    """
+    
+    def __init__(self, backend, atraso=ATRASO_GRAVACAO):
+        self.backend = backend
+        self.atraso = atraso
+        self.data = None
+        self._pendentes = []
+        self._sujo = False
+        self._sinal = None
+        self._escritor = None
+        self._trava = None
+        self._versoes = {}
+    
+    def carregar(self):
+        """Lê do backend apenas na primeira chamada; depois usa a memória"""
+        if self.data is None:
+            inicio = time.perf_counter()
+            self.data = self.backend.ler()
+            metricas.observar('estado_segundos', 'carregar', time.perf_counter() - inicio)
+        return self.data
+    
+    def guild(self, guild_id):
+        """Dados de um servidor (criados vazios na primeira consulta)"""
+        guilds = self.carregar()['guilds']
+        chave = str(guild_id)
+        if chave not in guilds:
+            guilds[chave] = dados_padrao()
+        return guilds[chave]
+    
+    def guilds(self):
+        """Pares (guild_id, dados) de todos os servidores conhecidos"""
+        return [
+            (int(guild_id), data)
+            for guild_id, data in self.carregar()['guilds'].items()
+            if guild_id != GUILD_LEGADO
+        ]
+    
+    def versao(self, guild_id):
+        """Contador que muda sempre que participantes ou escolhidos do servidor mudam"""
+        return self._versoes.get(str(guild_id), 0)
+    
+    def invalidar(self, guild_id):
+        chave = str(guild_id)
+        self._versoes[chave] = self._versoes.get(chave, 0) + 1
+    
+    def registrar(self, tipo, guild_id, autor=None, **campos):
+        """Aplica uma alteração de um servidor em memória e a anota no diário"""
+        data = self.carregar()
+        evento = {
+            'seq': data.get('_seq', 0) + 1,
+            'ts': datetime.utcnow().isoformat(),
+            'tipo': tipo,
+            'guild_id': str(guild_id) if guild_id is not None else None,
+            'autor': autor,
+            **campos
+        }
+        aplicar_evento(data, evento)
+        data['_seq'] = evento['seq']
+        if tipo in EVENTOS_RODIZIO:
+            self.invalidar(guild_id)
+            atualizar_rodizio(evento, self.versao(guild_id))
+        self._pendentes.append(json.dumps(evento, ensure_ascii=False))
+        self._acordar_escritor()
+    
+    def _acordar_escritor(self):
+        if self._sinal is not None:
+            self._sinal.set()
+    
+    def iniciar(self):
+        """Inicia o escritor em segundo plano (precisa do event loop)"""
+        if self._escritor is None:
+            self._sinal = asyncio.Event()
+            self._trava = asyncio.Lock()
+            if self._sujo or self._pendentes or self.backend.compactacao_devida:
+                self._sinal.set()
+            self._escritor = asyncio.create_task(self._loop_escritor())
+    
+    async def _loop_escritor(self):
+        while True:
+            await self._sinal.wait()
+            await asyncio.sleep(self.atraso)
+            self._sinal.clear()
+            try:
+                await self.gravar()
+            except Exception as e:
+                log.error(f"❌ Erro ao salvar dados: {e}", exc_info=True)
+    
+    async def gravar(self, compactar=False):
+        """Grava agora, fora do event loop, o que estiver pendente.
+        
+        Os eventos novos vão para o backend; o snapshot completo só é refeito
+        quando o backend pede ou quando `compactar` é pedido.
+        """
+        if self._trava is None:
+            self._trava = asyncio.Lock()
+        async with self._trava:
+            if self.data is None:
+                return
+            loop = asyncio.get_running_loop()
+            
+            if self._pendentes:
+                linhas, self._pendentes = self._pendentes, []
+                try:
+                    inicio = time.perf_counter()
+                    await loop.run_in_executor(executor_disco, self.backend.anotar, linhas)
+                    metricas.observar('estado_segundos', 'anotar', time.perf_counter() - inicio)
+                except BaseException:
+                    self._pendentes = linhas + self._pendentes
+                    raise
+            
+            if self.backend.compactacao_devida or (compactar and self.backend.compactacao_pendente):
+                self._sujo = True
+            if not self._sujo:
+                return
+            
+            # Serializa no loop para gravar uma versão consistente dos dados.
+            # Eventos ainda não anotados já estão neste snapshot e serão
+            # ignorados na reaplicação por causa do número de sequência.
+            self._sujo = False
+            inicio = time.perf_counter()
+            conteudo = json.dumps(self.data, indent=4, ensure_ascii=False, default=serializar)
+            metricas.observar('estado_segundos', 'serializar', time.perf_counter() - inicio)
+            try:
+                inicio = time.perf_counter()
+                await loop.run_in_executor(executor_disco, self.backend.compactar, conteudo)
+                metricas.observar('estado_segundos', 'compactar', time.perf_counter() - inicio)
+            except BaseException:
+                self._sujo = True
+                raise
+    
+    async def parar(self):
+        """Encerra o escritor e compacta o que estiver pendente"""
+        if self._escritor is not None:
+            self._escritor.cancel()
+            try:
+                await self._escritor
+            except asyncio.CancelledError:
+                pass
+            self._escritor = None
+        await self.gravar(compactar=True)
+        await asyncio.get_running_loop().run_in_executor(executor_disco, self.backend.fechar)
+
+if BACKEND_DADOS == 'sqlite':
+    estado = EstadoMultiverso(PersistenciaSQLite(DB_FILE, DATA_FILE, JOURNAL_FILE, AUDIT_FILE))
+else:
+    estado = EstadoMultiverso(PersistenciaJSON(DATA_FILE, JOURNAL_FILE, AUDIT_FILE))
+
+def load_data(guild_id):
+    """Retorna os dados do Multiverso de um servidor (mantidos em memória)"""
+    return estado.guild(guild_id)
+
+# ============================================
+# RODÍZIO DE CANDIDATOS
+# ============================================
+
+class Rodizio:
+    """Índice de quem ainda pode ser escolhido em um servidor.
+    
+    Os escolhidos ficam em um conjunto e os restantes em ordem de espera: quem
+    está há mais tempo sem aparecer em uma enquete vem primeiro (pela anotação
+    em `ofertas`; empates seguem a ordem de cadastro). O índice é montado uma
+    vez a partir dos dados e depois acompanha os eventos (`aplicar`), então
+    as consultas custam O(k) e não varrem a lista de participantes.
+    """
+    
+    def __init__(self, data, versao):
+        self.versao = versao
+        self.participantes = data['participantes']
+        self.escolhidos = data['ja_escolhidos']
+        ofertas = data.get('ofertas', {})
+        # Ordem de espera: chaves (oferta, cadastro, user_id) ordenadas
+        self._cadastros = itertools.count()
+        self._chaves = {}
+        for user_id in self.participantes:
+            if user_id not in self.escolhidos:
+                self._chaves[user_id] = (ofertas.get(user_id, 0), next(self._cadastros), user_id)
+        self._ordem = sorted(self._chaves.values())
+    
+    def __len__(self):
+        return len(self._ordem)
+    
+    @property
+    def esgotado(self):
+        """Todos os participantes já foram escolhidos"""
+        return not self._ordem
+    
+    def ja_escolhido(self, user_id):
+        return user_id in self.escolhidos
+    
+    def elegiveis(self):
+        """Todos os candidatos disponíveis, em ordem de espera"""
+        return [(user_id, self.participantes[user_id]) for _, _, user_id in self._ordem]
+    
+    def _tirar(self, user_id):
+        chave = self._chaves.pop(user_id, None)
+        if chave is not None:
+            del self._ordem[bisect.bisect_left(self._ordem, chave)]
+        return chave
+    
+    def aplicar(self, evento):
+        """Acompanha um evento já aplicado aos dados; False se o índice precisa ser refeito"""
+        tipo = evento['tipo']
+        if tipo == 'participante_adicionado':
+            user_id = evento['user_id']
+            if user_id not in self._chaves and user_id not in self.escolhidos:
+                # Sem ofertas ainda: entra no fim de quem nunca apareceu em enquete
+                chave = (0, next(self._cadastros), user_id)
+                self._chaves[user_id] = chave
+                bisect.insort(self._ordem, chave)
+        elif tipo in ('participante_removido', 'vencedor_registrado'):
+            self._tirar(evento['user_id'])
+        elif tipo in ('votacao_iniciada', 'rodada_iniciada'):
+            if tipo == 'votacao_iniciada':
+                candidatos = evento['candidatos']
+            else:
+                candidatos = [candidato for _, grupo in evento['grupos'] for candidato in grupo]
+            # O seq do evento é a oferta mais recente: os candidatos vão para o fim da fila
+            movidos = [chave for chave in map(self._tirar, (user_id for user_id, _ in candidatos)) if chave]
+            for _, cadastro, user_id in sorted(movidos, key=lambda chave: chave[1]):
+                self._chaves[user_id] = (evento['seq'], cadastro, user_id)
+                self._ordem.append(self._chaves[user_id])
+        else:
+            return False
+        return True
+    
+    def sortear(self, k, modo='espera'):
+        """Escolhe `k` candidatos disponíveis.
+        
+        'fila' pega os `k` que esperam há mais tempo; 'espera' sorteia `k` entre
+        os `2k` que esperam há mais tempo; 'uniforme' sorteia entre todos.
+        """
+        if k <= 0 or k >= len(self._ordem):
+            return self.elegiveis()
+        
+        if modo == 'fila':
+            escolhidos = self._ordem[:k]
+        elif modo == 'uniforme':
+            escolhidos = random.sample(self._ordem, k)
+        else:
+            janela = self._ordem[:2 * k]
+            sorteados = set(random.sample(janela, k))
+            escolhidos = [chave for chave in janela if chave in sorteados]
+        
+        return [(user_id, self.participantes[user_id]) for _, _, user_id in escolhidos]
+
+rodizios = {}
+
+def rodizio_da_guild(guild_id):
+    """Rodízio do servidor, montado de novo só quando um evento não pôde ser acompanhado"""
+    versao = estado.versao(guild_id)
+    rodizio = rodizios.get(str(guild_id))
+    if rodizio is None or rodizio.versao != versao:
+        rodizio = rodizios[str(guild_id)] = Rodizio(load_data(guild_id), versao)
+    return rodizio
+
+def atualizar_rodizio(evento, versao):
+    """Leva um evento do rodízio ao índice em cache, se houver, sem remontá-lo"""
+    rodizio = rodizios.get(evento['guild_id'])
+    if rodizio is not None and rodizio.versao == versao - 1 and rodizio.aplicar(evento):
+        rodizio.versao = versao
+
+def candidatos_da_votacao(guild_id):
+    """Candidatos da próxima votação conforme a configuração do servidor.
+    
+    Com `candidatos_por_votacao` em 0 entram todos os disponíveis; senão só os
+    sorteados, e quem ficou de fora sobe na ordem de espera da próxima votação.
+    """
+    config = load_data(guild_id)['config']
+    return rodizio_da_guild(guild_id).sortear(
+        config.get('candidatos_por_votacao', 0), config.get('sorteio', 'espera')
+    )
+
+@bot.event
+async def on_ready():
+    log.info(f'🎭 {bot.user} está online!')
+    log.info(f'ID do Bot: {bot.user.id}')
+    log.info(f'🌌 Sistema Multiverso ativado em {len(bot.guilds)} servidor(es)!')
+    
+    atribuir_dados_legados()
+    await retomar_rollouts()
+    armar_agenda()
+    
+    for rotina in (reconciliar_votacoes_ativas(), arquivar_historicos()):
+        tarefa = asyncio.create_task(rotina)
+        tarefas_em_segundo_plano.add(tarefa)
+        tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+    
+    log.info(f'⏰ Agendador automático ativado! {agendador.pendentes} tarefa(s) na fila')
+    log.info(f'🗳️ Votação inicia: Padrão dia 1 de cada mês às 3:00 AM UTC (configurável com /configurar)')
+
+# Comando de emergência para sincronizar mesmo sem alterações nos comandos
+@bot.command()
+@commands.is_owner()
+async def sync(ctx):
+    """Sincroniza os slash commands manualmente, ignorando o hash salvo"""
+    log.info("🔄 Sincronizando comandos...")
+    synced = await sincronizar_comandos(forcar=True)
+    await ctx.send(f"✅ {len(synced)} comandos sincronizados! Agora digite `/` para ver os comandos.")
+    log.info("✅ Comandos sincronizados com sucesso!")
+
+# ============================================
+# ROLLOUT DE APELIDOS
+# ============================================
+
+def caminho_snapshot(guild_id):
+    """Arquivo novo para a fotografia de apelidos de um rollout"""
+    return os.path.join(PASTA_SNAPSHOTS, f"{guild_id}_{datetime.utcnow():%Y%m%d_%H%M%S}.tsv.gz")
+
+def anexar_snapshot(arquivo, linhas):
+    """Acrescenta linhas "id<TAB>apelido em JSON" à fotografia e faz fsync.
+    
+    Cada chamada vira um membro gzip novo no fim do arquivo; o gzip lê os
+    membros concatenados como um único fluxo, então nada precisa ser reescrito.
+    """
+    os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+    with open(arquivo, 'ab') as bruto:
+        with gzip.GzipFile(fileobj=bruto, mode='wb') as f:
+            f.write(''.join(linhas).encode('utf-8'))
+        bruto.flush()
+        os.fsync(bruto.fileno())
+
+def listar_snapshots(guild_id):
+    """Fotografias de apelidos do servidor, da mais recente para a mais antiga"""
+    if not os.path.isdir(PASTA_SNAPSHOTS):
+        return []
+    prefixo = f"{guild_id}_"
+    nomes = [n for n in os.listdir(PASTA_SNAPSHOTS) if n.startswith(prefixo) and n.endswith('.tsv.gz')]
+    return [os.path.join(PASTA_SNAPSHOTS, n) for n in sorted(nomes, reverse=True)]
+
+def podar_snapshots(guild_id, preservar=()):
+    """Apaga as fotografias mais antigas, mantendo as SNAPSHOTS_MANTIDOS mais recentes
+    e as de `preservar` (ex: a de uma restauração ainda na fila)
+    """
+    for arquivo in listar_snapshots(guild_id)[SNAPSHOTS_MANTIDOS:]:
+        if arquivo in preservar:
+            continue
+        try:
+            os.remove(arquivo)
+        except FileNotFoundError:
+            pass
+
+def descrever_snapshot(arquivo):
+    """Data do rollout de uma fotografia, a partir do nome do arquivo"""
+    carimbo = os.path.basename(arquivo)[:-len('.tsv.gz')].split('_', 1)[1]
+    return datetime.strptime(carimbo, '%Y%m%d_%H%M%S').strftime('%d/%m/%Y %H:%M UTC')
+
+class LeitorSnapshot:
+    """Lê uma fotografia de apelidos aos poucos, em lotes, na thread de disco.
+    
+    Nunca carrega o arquivo inteiro: `entradas` devolve (id, apelido anterior)
+    em ordem crescente de ID, pronto para o merge com os membros do servidor.
+    """
+    
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._f = None
+        self._fim = False
+    
+    def ler_lote(self, tamanho):
+        if self._fim:
+            return []
+        if self._f is None:
+            self._f = gzip.open(self.arquivo, 'rt', encoding='utf-8')
+        
+        lote = []
+        try:
+            while len(lote) < tamanho:
+                linha = self._f.readline()
+                if not linha.endswith('\n'):
+                    # Fim do arquivo (ou linha incompleta de uma gravação interrompida)
+                    self._fim = True
+                    break
+                member_id, apelido = linha.rstrip('\n').split('\t', 1)
+                lote.append((int(member_id), json.loads(apelido)))
+        except (EOFError, OSError, zlib.error, ValueError) as e:
+            log.warning(f"⚠️ Fotografia {self.arquivo} termina em um trecho inválido: {e}")
+            self._fim = True
+        return lote
+    
+    def fechar(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+    
+    async def entradas(self):
+        loop = asyncio.get_running_loop()
+        ultimo = 0
+        try:
+            while True:
+                lote = await loop.run_in_executor(executor_disco, self.ler_lote, LOTE_SNAPSHOT * 5)
+                if not lote:
+                    return
+                for member_id, apelido in lote:
+                    # Ao retomar um rollout, membros pendentes são fotografados de novo;
+                    # vale a primeira linha, que é a de antes de qualquer edição
+                    if member_id > ultimo:
+                        ultimo = member_id
+                        yield member_id, apelido
+        finally:
+            await loop.run_in_executor(executor_disco, self.fechar)
+
+class RolloutApelidos:
+    """Aplica um apelido a todos os membros de um servidor com um grupo limitado de trabalhadores.
+    
+    O ritmo vem do LimitadorRota da rota de edição de membros, então o rollout
+    anda tão rápido quanto o Discord permitir em vez de seguir um sleep fixo.
+    Os membros são percorridos em ordem crescente de ID; `watermark` é o maior
+    ID até o qual todos já foram processados, o que permite retomar depois.
+    Só recebem chamadas à API os membros cujo apelido realmente muda e que o
+    bot consegue editar (hierarquia de cargos e dono checados antes).
+    
+    Com `snapshot`, o apelido anterior de cada membro a editar é gravado no
+    arquivo antes da edição, em lotes de LOTE_SNAPSHOT, para permitir o /restaurar.
+    """
+    
+    def __init__(
+        self, guild, apelido, trabalhadores=TRABALHADORES_ROLLOUT, snapshot=None,
+        watermark=0, sucessos=0, falhas=0, ignorados=0, sem_permissao=0
+    ):
+        self.guild = guild
+        self.apelido = apelido
+        self.trabalhadores = trabalhadores
+        self.snapshot = snapshot
+        self.limitador = limitador_para(f"PATCH /guilds/{guild.id}/members/{{id}}")
+        self.me = None
+        self.sucessos = sucessos
+        self.falhas = falhas
+        self.ignorados = ignorados
+        self.sem_permissao = sem_permissao
+        self.bots = 0
+        self._sucessos_iniciais = sucessos
+        self.inicio = None
+        self.fim = None
+        self.interrompido = False
+        self._watermark_inicial = watermark
+        self._ultimo_visto = watermark
+        # IDs enfileirados e ainda não concluídos; dict mantém a ordem crescente
+        self._pendentes = {}
+        self._fila = None
+        self._parando = False
+        self._terminou = asyncio.Event()
+    
+    @property
+    def duracao(self):
+        if self.inicio is None:
+            return 0.0
+        fim = self.fim if self.fim is not None else asyncio.get_running_loop().time()
+        return fim - self.inicio
+    
+    @property
+    def edicoes_por_segundo(self):
+        """Ritmo desta execução (sem contar o que foi feito antes de uma retomada)"""
+        feitos = self.sucessos - self._sucessos_iniciais
+        return feitos / self.duracao if self.duracao > 0 else 0.0
+    
+    @property
+    def processados(self):
+        return self.sucessos + self.falhas + self.ignorados + self.sem_permissao + self.bots
+    
+    @property
+    def eta(self):
+        """Segundos estimados até o fim, ou None enquanto o ritmo ainda não foi medido.
+        
+        Supõe que os membros que faltam precisam de edição na mesma proporção
+        dos que já foram processados.
+        """
+        taxa = self.edicoes_por_segundo
+        total = self.guild.member_count
+        if not taxa or not total or not self.processados:
+            return None
+        restantes = max(0, total - self.processados)
+        proporcao = (self.sucessos + self.falhas) / self.processados
+        return restantes * proporcao / taxa
+    
+    @property
+    def watermark(self):
+        """Maior ID de membro tal que todos os IDs até ele já foram processados"""
+        for member_id in self._pendentes:
+            return member_id - 1
+        return self._ultimo_visto
+    
+    async def membros(self):
+        """Membros ainda não processados, em ordem crescente de ID.
+        
+        No modo de pouca memória vêm da API, uma página por vez, em vez do cache.
+        """
+        if self.me is None:
+            # Sem cache de membros o próprio bot pode não estar disponível
+            self.me = self.guild.me or await self.guild.fetch_member(bot.user.id)
+        
+        if not POUCA_MEMORIA:
+            for member in sorted(self.guild.members, key=lambda m: m.id):
+                if member.id > self._watermark_inicial:
+                    yield member
+            return
+        
+        # Cada página chega da API em ordem decrescente (as páginas em si são crescentes):
+        # guarda a página atual e a devolve invertida quando a próxima começa
+        pagina = []
+        async for member in self.guild.fetch_members(limit=None, after=discord.Object(id=self._watermark_inicial)):
+            if pagina and member.id > pagina[-1].id:
+                for anterior in reversed(pagina):
+                    yield anterior
+                pagina.clear()
+            pagina.append(member)
+        for anterior in reversed(pagina):
+            yield anterior
+    
+    async def alvos(self):
+        """Pares (membro, apelido desejado) em ordem crescente de ID"""
+        async for member in self.membros():
+            yield member, self.apelido
+    
+    def classificar(self, member, apelido):
+        """Plano de um membro sem chamar a API.
+        
+        'bot', 'dono' e 'cargo_acima' (cargo igual ou acima do bot) não podem ser
+        editados; 'sem_permissao' significa que o bot não tem Gerenciar Apelidos;
+        'ja_aplicado' não precisa de edição; só 'editar' gasta uma requisição.
+        """
+        if member.bot:
+            return 'bot'
+        if member.id == self.guild.owner_id:
+            return 'dono'
+        
+        if not self.me.guild_permissions.manage_nicknames:
+            return 'sem_permissao'
+        if member.top_role >= self.me.top_role:
+            return 'cargo_acima'
+        
+        if member.nick == apelido:
+            return 'ja_aplicado'
+        return 'editar'
+    
+    async def planejar(self):
+        """Conta quantos membros caem em cada categoria, sem editar ninguém"""
+        plano = {}
+        async for member, apelido in self.alvos():
+            categoria = self.classificar(member, apelido)
+            plano[categoria] = plano.get(categoria, 0) + 1
+        return plano
+    
+    async def executar(self):
+        """Roda o rollout até o fim (ou até `parar`) e retorna o próprio objeto"""
+        loop = asyncio.get_running_loop()
+        self.inicio = loop.time()
+        fila = self._fila = asyncio.Queue(maxsize=self.trabalhadores * 2)
+        
+        produtor = asyncio.create_task(self._produtor(fila))
+        trabalhadores = [asyncio.create_task(self._trabalhador(fila)) for _ in range(self.trabalhadores)]
+        try:
+            # Sem parar no primeiro erro, um produtor que falha (ex: erro da API ao buscar
+            # membros) nunca enviaria os sentinelas e os trabalhadores esperariam para sempre
+            feitas, _ = await asyncio.wait([produtor, *trabalhadores], return_when=asyncio.FIRST_EXCEPTION)
+            for tarefa in feitas:
+                if not tarefa.cancelled() and tarefa.exception() is not None:
+                    raise tarefa.exception()
+        finally:
+            produtor.cancel()
+            for tarefa in trabalhadores:
+                tarefa.cancel()
+            self.fim = loop.time()
+            self._terminou.set()
+        
+        return self
+    
+    async def parar(self, timeout=15):
+        """Para de pegar membros novos e espera as edições em andamento terminarem"""
+        self._parando = True
+        self.interrompido = True
+        # Acorda trabalhadores parados esperando a fila
+        for _ in range(self.trabalhadores):
+            try:
+                self._fila.put_nowait(None)
+            except (asyncio.QueueFull, AttributeError):
+                break
+        try:
+            await asyncio.wait_for(self._terminou.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _liberar(self, fila, lote):
+        """Grava a fotografia do lote e só então entrega os membros aos trabalhadores"""
+        if self.snapshot and lote:
+            linhas = [f"{member.id}\t{json.dumps(member.nick, ensure_ascii=False)}\n" for member, _ in lote]
+            await asyncio.get_running_loop().run_in_executor(executor_disco, anexar_snapshot, self.snapshot, linhas)
+        for item in lote:
+            if self._parando:
+                return
+            await fila.put(item)
+        lote.clear()
+    
+    async def _produtor(self, fila):
+        # Sem fotografia não há o que agrupar: cada membro vai direto para a fila
+        tamanho_lote = LOTE_SNAPSHOT if self.snapshot else 1
+        lote = []
+        async for member, apelido in self.alvos():
+            if self._parando:
+                return
+            
+            plano = self.classificar(member, apelido)
+            if plano != 'editar':
+                if plano == 'ja_aplicado':
+                    self.ignorados += 1
+                elif plano == 'bot':
+                    self.bots += 1
+                else:
+                    self.sem_permissao += 1
+                self._ultimo_visto = member.id
+                continue
+            
+            self._pendentes[member.id] = True
+            self._ultimo_visto = member.id
+            lote.append((member, apelido))
+            if len(lote) >= tamanho_lote:
+                await self._liberar(fila, lote)
+        
+        await self._liberar(fila, lote)
+        for _ in range(self.trabalhadores):
+            await fila.put(None)
+    
+    async def _trabalhador(self, fila):
+        while True:
+            item = await fila.get()
+            if item is None or self._parando:
+                # Membro não processado continua pendente e será refeito ao retomar
+                return
+            member, apelido = item
+            
+            await self.limitador.aguardar_vez()
+            if self._parando:
+                self.limitador.liberar()
+                return
+            try:
+                await member.edit(nick=apelido)
+                self.sucessos += 1
+            except discord.Forbidden:
+                self.falhas += 1
+            except Exception as e:
+                # Um rollout ruim falha igual para milhares de membros: as repetições são suprimidas
+                log.warning(
+                    f"⚠️ [{self.guild.name}] Erro ao alterar apelido de {member.name}: {e}",
+                    extra={
+                        'guild_id': self.guild.id,
+                        'user_id': member.id,
+                        'chave_repeticao': ('apelido', self.guild.id, type(e).__name__)
+                    }
+                )
+                self.falhas += 1
+            finally:
+                self.limitador.liberar()
+                del self._pendentes[member.id]
+
+class RestauracaoApelidos(RolloutApelidos):
+    """Devolve os apelidos gravados na fotografia de um rollout anterior.
+    
+    Usa o mesmo ritmo e os mesmos checkpoints do rollout; os alvos vêm de um
+    merge entre a fotografia e os membros, ambos em ordem crescente de ID.
+    Membros que entraram depois do rollout (fora da fotografia) não são tocados.
+    """
+    
+    def __init__(self, guild, arquivo, **kwargs):
+        super().__init__(guild, None, **kwargs)
+        self.arquivo = arquivo
+    
+    async def alvos(self):
+        entradas = LeitorSnapshot(self.arquivo).entradas()
+        
+        async def seguinte():
+            try:
+                return await entradas.__anext__()
+            except StopAsyncIteration:
+                return None
+        
+        try:
+            proxima = await seguinte()
+            async for member in self.membros():
+                while proxima is not None and proxima[0] < member.id:
+                    proxima = await seguinte()
+                if proxima is None:
+                    return
+                if proxima[0] == member.id:
+                    yield member, proxima[1]
+        finally:
+            await entradas.aclose()
+
+# Rollouts em execução por servidor (para pausar com segurança ao desligar)
+rollouts_ativos = {}
+
+def registrar_checkpoint(guild_id, rollout):
+    """Anota no diário até onde o rollout chegou"""
+    job = load_data(guild_id).get('rollout')
+    if not job:
+        return
+    progresso = (rollout.watermark, rollout.sucessos, rollout.falhas, rollout.ignorados, rollout.sem_permissao)
+    salvo = (job['watermark'], job['sucessos'], job['falhas'], job.get('ignorados', 0), job.get('sem_permissao', 0))
+    if salvo == progresso:
+        return
+    estado.registrar(
+        'rollout_progresso',
+        guild_id,
+        watermark=rollout.watermark,
+        sucessos=rollout.sucessos,
+        falhas=rollout.falhas,
+        ignorados=rollout.ignorados,
+        sem_permissao=rollout.sem_permissao
+    )
+
+def embed_progresso(job, rollout):
+    """Progresso parcial de um rollout, para a mensagem de status"""
+    total = max(rollout.guild.member_count or 0, rollout.processados)
+    fracao = rollout.processados / total if total else 0.0
+    preenchido = round(fracao * 20)
+    barra = "█" * preenchido + "░" * (20 - preenchido)
+    
+    if job.get('tipo') == 'restauracao':
+        titulo = "♻️ Restaurando apelidos..."
+    else:
+        titulo = f"🔄 Alterando apelidos para `{job['apelido']}`..."
+    eta = rollout.eta
+    
+    return discord.Embed(
+        title=titulo,
+        description=(
+            f"`{barra}` {fracao:.0%}\n"
+            f"👥 Processados: {rollout.processados} de {total}\n\n"
+            f"✅ Alterados: {rollout.sucessos}\n"
+            f"⏭️ Já tinham o apelido: {rollout.ignorados}\n"
+            f"🔒 Sem permissão: {rollout.sem_permissao}\n"
+            f"❌ Falhas: {rollout.falhas}\n\n"
+            f"⚡ Velocidade: {rollout.edicoes_por_segundo:.1f} apelidos/s\n"
+            f"⏳ Tempo restante: {formatar_segundos(eta) if eta is not None else 'calculando...'}"
+        ),
+        color=discord.Color.blue()
+    )
+
+async def publicar_progresso(guild, job, rollout):
+    """Atualiza a mensagem de status do rollout a cada INTERVALO_PROGRESSO segundos.
+    
+    Só edita se o progresso mudou desde a última edição, e nunca há duas edições
+    ao mesmo tempo: o ritmo fica fixo, por mais rápido que o rollout ande.
+    """
+    canal = bot.get_channel(job['canal_id'])
+    if canal is None or job.get('mensagem_id') is None:
+        return
+    mensagem = canal.get_partial_message(job['mensagem_id'])
+    ultimo = None
+    
+    while True:
+        await asyncio.sleep(INTERVALO_PROGRESSO)
+        progresso = (rollout.processados, rollout.falhas)
+        if progresso == ultimo:
+            continue
+        try:
+            await mensagem.edit(content="", embed=embed_progresso(job, rollout))
+        except discord.NotFound:
+            # Apagaram a mensagem de status: o resultado final vai para uma nova
+            return
+        except discord.HTTPException as e:
+            log.warning(f"⚠️ [{guild.name}] Não consegui atualizar o progresso do rollout: {e}", extra={'guild_id': guild.id})
+        ultimo = progresso
+
+async def executar_rollout_persistido(guild):
+    """Executa (ou retoma) o rollout salvo no estado do servidor, com checkpoints periódicos"""
+    job = load_data(guild.id)['rollout']
+    progresso = dict(
+        watermark=job['watermark'],
+        sucessos=job['sucessos'],
+        falhas=job['falhas'],
+        ignorados=job.get('ignorados', 0),
+        sem_permissao=job.get('sem_permissao', 0)
+    )
+    if job.get('tipo') == 'restauracao':
+        rollout = RestauracaoApelidos(guild, job['snapshot'], **progresso)
+    else:
+        rollout = RolloutApelidos(guild, job['apelido'], snapshot=job.get('snapshot'), **progresso)
+    rollouts_ativos[guild.id] = rollout
+    
+    async def checkpoints():
+        while True:
+            await asyncio.sleep(INTERVALO_CHECKPOINT)
+            registrar_checkpoint(guild.id, rollout)
+    
+    tarefa_checkpoint = asyncio.create_task(checkpoints())
+    tarefa_progresso = asyncio.create_task(publicar_progresso(guild, job, rollout))
+    try:
+        await rollout.executar()
+    finally:
+        tarefa_checkpoint.cancel()
+        tarefa_progresso.cancel()
+        rollouts_ativos.pop(guild.id, None)
+        registrar_checkpoint(guild.id, rollout)
+    
+    if not rollout.interrompido:
+        estado.registrar(
+            'rollout_concluido',
+            guild.id,
+            operacao=job.get('tipo', 'rollout'),
+            apelido=job['apelido'],
+            sucessos=rollout.sucessos,
+            falhas=rollout.falhas,
+            ignorados=rollout.ignorados,
+            sem_permissao=rollout.sem_permissao,
+            duracao=round(rollout.duracao, 1)
+        )
+        # O resultado de um rollout longo não pode esperar o escritor em segundo plano
+        await estado.gravar()
+    return rollout
+
+def registrar_rollout(guild, apelido, canal, automatico, tipo='rollout', snapshot=None):
+    """Salva o rollout como job, antes de qualquer chamada à API.
+    
+    Registrado logo depois do vencedor (sem await no meio, então os dois vão
+    juntos para o disco): se o bot cair antes de publicar a mensagem de status,
+    a retomada ainda encontra o rollout. Em um rollout, `snapshot` é o arquivo
+    onde os apelidos anteriores serão gravados (um novo por padrão); em uma
+    restauração, a fotografia a devolver.
+    """
+    if tipo == 'rollout' and snapshot is None:
+        snapshot = caminho_snapshot(guild.id)
+    estado.registrar(
+        'rollout_iniciado',
+        guild.id,
+        rollout={
+            'tipo': tipo,
+            'apelido': apelido,
+            'snapshot': snapshot,
+            'watermark': 0,
+            'sucessos': 0,
+            'falhas': 0,
+            'ignorados': 0,
+            'sem_permissao': 0,
+            'automatico': automatico,
+            'canal_id': canal.id,
+            'mensagem_id': None,
+            'inicio': datetime.utcnow().isoformat()
+        }
+    )
+
+async def iniciar_rollout(guild, canal, texto):
+    """Grava o rollout já registrado, publica a mensagem de status e o executa"""
+    await estado.gravar()
+    try:
+        status_msg = await canal.send(texto)
+    except discord.HTTPException as e:
+        # Sem mensagem de status o rollout segue; o resultado sai em uma mensagem nova
+        log.warning(f"⚠️ [{guild.name}] Não consegui publicar o status do rollout: {e}", extra={'guild_id': guild.id})
+    else:
+        estado.registrar('rollout_mensagem', guild.id, mensagem_id=status_msg.id)
+    return await concluir_rollout(guild)
+
+async def concluir_rollout(guild):
+    """Executa o rollout pendente do servidor e publica o resultado na mensagem de status.
+    
+    Retorna None se o rollout foi interrompido (ex: bot desligando); ele será
+    retomado do último checkpoint na próxima inicialização.
+    """
+    job = dict(load_data(guild.id)['rollout'])
+    rollout = await executar_rollout_persistido(guild)
+    if rollout.interrompido:
+        return None
+    
+    if job.get('tipo') != 'restauracao':
+        # A fotografia nova já está no disco; as que passaram do limite do /restaurar saem
+        preservar = {
+            args[2] for tarefa, _, args in fila_do_servidor(guild.id).pendentes
+            if tarefa.tipo == 'restauracao'
+        }
+        await asyncio.get_running_loop().run_in_executor(executor_disco, podar_snapshots, guild.id, preservar)
+    
+    if job.get('tipo') == 'restauracao':
+        titulo = "♻️ Apelidos Restaurados!"
+        cabecalho = f"Os apelidos de antes do rollout de {descrever_snapshot(job['snapshot'])} foram devolvidos.\n\n"
+        rodape = ""
+    else:
+        if job['automatico']:
+            titulo = "✅ Multiverso Ativado Automaticamente!"
+            rodape = f"\n\n🗓️ Próxima votação: Dia {load_data(guild.id)['config']['dia']} do próximo mês"
+        else:
+            titulo = "✅ Multiverso Ativado!"
+            rodape = ""
+        cabecalho = (
+            f"**{job['apelido']}** agora reina sobre o multiverso!\n\n"
+            f"👑 Todos agora são: `{job['apelido']}`\n\n"
+        )
+    
+    embed_final = discord.Embed(
+        title=titulo,
+        description=(
+            f"{cabecalho}"
+            f"**Estatísticas:**\n"
+            f"✅ Apelidos alterados: {rollout.sucessos}\n"
+            f"⏭️ Já estavam com o apelido certo: {rollout.ignorados}\n"
+            f"🔒 Sem permissão (dono/cargo acima do bot): {rollout.sem_permissao}\n"
+            f"❌ Falhas: {rollout.falhas}\n"
+            f"⚡ Velocidade: {rollout.edicoes_por_segundo:.1f} apelidos/s"
+            f"{rodape}"
+        ),
+        color=discord.Color.purple()
+    )
+    
+    canal = bot.get_channel(job['canal_id'])
+    if canal is not None and job.get('mensagem_id') is None:
+        # A mensagem de status não chegou a ser publicada
+        await canal.send(embed=embed_final)
+    elif canal is not None:
+        try:
+            await canal.get_partial_message(job['mensagem_id']).edit(content="", embed=embed_final)
+        except discord.HTTPException:
+            await canal.send(embed=embed_final)
+    
+    return rollout
+
+async def retomar_rollouts():
+    """Retoma, do último checkpoint, os rollouts interrompidos por um reinício"""
+    for guild_id, data in estado.guilds():
+        if not data.get('rollout') or guild_id in guilds_finalizando:
+            continue
+        guild = bot.get_guild(guild_id)
+        if guild is None:
+            continue
+        
+        job = data['rollout']
+        descricao = "restauração de apelidos" if job.get('tipo') == 'restauracao' else f"rollout de `{job['apelido']}`"
+        log.info(f"♻️ [{guild.name}] Retomando {descricao} após o membro {job['watermark']}", extra={'guild_id': guild.id})
+        enviar_tarefa(guild_id, 'retomada', f"Retomar {descricao}", retomar_rollout, guild)
+
+async def retomar_rollout(guild):
+    return resumir_rollout(await concluir_rollout(guild))
+
+def resumir_rollout(rollout):
+    """Resultado de um rollout para o /status"""
+    if rollout is None:
+        return "⏸️ Interrompido; continua do último checkpoint quando o bot voltar"
+    return (
+        f"{rollout.sucessos} apelidos alterados, {rollout.ignorados} já estavam certos, "
+        f"{rollout.falhas} falhas em {formatar_segundos(rollout.duracao)}"
+    )
+
+async def pausar_rollouts():
+    """Pausa os rollouts em andamento salvando o checkpoint (chamado ao desligar)"""
+    for guild_id, rollout in list(rollouts_ativos.items()):
+        await rollout.parar()
+        registrar_checkpoint(guild_id, rollout)
+
+# ============================================
+# CONTAGEM DE VOTOS AO VIVO
+# ============================================
+
+def contar_voto(payload, delta):
+    """Atualiza o contador da opção votada, se o voto for na votação ativa do servidor"""
+    if payload.guild_id is None:
+        return
+    data = load_data(payload.guild_id)
+    if votos_da_enquete(data, payload.message_id) is None:
+        return
+    estado.registrar(
+        'voto_contado',
+        payload.guild_id,
+        message_id=payload.message_id,
+        answer_id=payload.answer_id,
+        delta=delta
+    )
+
+@bot.event
+async def on_raw_poll_vote_add(payload):
+    contar_voto(payload, 1)
 
-# Sincroniza os slash commands quando o bot inicia
 @bot.event
-async def setup_hook():
-    """Sincroniza os slash commands com o Discord"""
-    print("🔄 Sincronizando slash commands...")
+async def on_raw_poll_vote_remove(payload):
+    contar_voto(payload, -1)
+
+def votos_ao_vivo(data, message_id=None):
+    """Contador de votos de uma enquete (padrão: a votação ativa): {número da opção: votos}"""
+    votos = votos_da_enquete(data, message_id or data.get('poll_message_id')) or {}
+    return {int(opcao): total for opcao, total in votos.items()}
+
+def ranking_votos(votos, total_opcoes):
+    """Opções ordenadas por votos; no empate vence a opção que aparece primeiro na enquete"""
+    return sorted(
+        ((opcao, votos.get(opcao, 0)) for opcao in range(1, total_opcoes + 1)),
+        key=lambda item: (-item[1], item[0])
+    )
+
+def reconciliar_votos(guild_id, message):
+    """Substitui o contador ao vivo pela contagem do Discord, se ela for diferente"""
+    data = load_data(guild_id)
+    oficial = {answer.id: answer.vote_count for answer in message.poll.answers if answer.vote_count}
+    ao_vivo = {opcao: votos for opcao, votos in votos_ao_vivo(data, message.id).items() if votos}
+    if oficial == ao_vivo:
+        return
+    log.info(f"🔁 [{guild_id}] Contagem de votos corrigida: {ao_vivo} -> {oficial}", extra={'guild_id': guild_id})
+    estado.registrar(
+        'votos_reconciliados',
+        guild_id,
+        message_id=message.id,
+        votos={str(opcao): votos for opcao, votos in oficial.items()}
+    )
+
+async def encerrar_enquete(canal, message_id):
+    """Encerra a enquete (se ainda estiver aberta) e devolve a mensagem atualizada"""
     try:
-        synced = await bot.tree.sync()
-        print(f"✅ {len(synced)} slash commands sincronizados!")
-    except Exception as e:
-        print(f"❌ Erro ao sincronizar: {e}")
+        return await canal.get_partial_message(message_id).end_poll()
+    except discord.HTTPException:
+        # Já encerrada (ex: o prazo da própria enquete passou): busca o resultado final
+        return await canal.fetch_message(message_id)
 
-# Arquivo para salvar dados
-DATA_FILE = 'multiverso_data.json'
+def apurar(guild_id, message):
+    """Ranking final de uma enquete encerrada (votação principal ou grupo do chaveamento).
+    
+    Vale o contador ao vivo, que acompanha cada voto pelo gateway, conferido uma
+    vez com a contagem da mensagem devolvida no encerramento. Essa contagem já
+    inclui todos os votos, mesmo que o Discord ainda não tenha marcado a enquete
+    como finalizada, então não há espera nem nova busca.
+    """
+    reconciliar_votos(guild_id, message)
+    return ranking_votos(votos_ao_vivo(load_data(guild_id), message.id), len(message.poll.answers))
 
-# Estrutura de dados
-def load_data():
-    """Carrega dados do arquivo JSON"""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        'participantes': {},
-        'ja_escolhidos': [],
-        'atual_escolhido': None,
-        'historico': [],
-        'poll_message_id': None,
-        'poll_channel_id': None
-    }
+async def reconciliar_votacoes_ativas():
+    """Confere com o Discord os votos das votações ativas (podem ter chegado votos com o bot desligado)"""
+    for guild_id, data in estado.guilds():
+        enquetes = []
+        if data.get('poll_message_id'):
+            enquetes.append((data['poll_channel_id'], data['poll_message_id']))
+        if data.get('chaveamento'):
+            enquetes += [(data['chaveamento']['channel_id'], int(mid)) for mid in data['chaveamento']['grupos']]
+        
+        for channel_id, message_id in enquetes:
+            canal = bot.get_channel(channel_id)
+            if canal is None:
+                continue
+            try:
+                message = await canal.fetch_message(message_id)
+            except discord.HTTPException as e:
+                log.warning(f"⚠️ [{guild_id}] Não consegui conferir os votos da enquete {message_id}: {e}", extra={'guild_id': guild_id})
+                continue
+            if message.poll:
+                reconciliar_votos(guild_id, message)
 
-def save_data(data):
-    """Salva dados no arquivo JSON"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+# ============================================
+# FILA DE TAREFAS POR SERVIDOR
+# ============================================
 
-@bot.event
-async def on_ready():
-    print(f'🎭 {bot.user} está online!')
-    print(f'ID do Bot: {bot.user.id}')
-    print(f'🌌 Sistema Multiverso ativado!')
+# Quantas tarefas terminadas o /status mostra por servidor
+TAREFAS_RECENTES = 10
+
+# Números das tarefas; recomeçam quando o bot reinicia (um rollout interrompido
+# é retomado como uma tarefa nova)
+numeros_tarefas = itertools.count(1)
+
+class FalhaTarefa(Exception):
+    """Falha esperada de uma tarefa (ex: enquete apagada): vai para o /status sem traceback"""
+
+class Tarefa:
+    """Uma operação longa de um servidor: encerrar votação/rodada, rollout, restauração..."""
     
-    # Inicia as tarefas agendadas
-    if not verificar_votacao.is_running():
-        verificar_votacao.start()
+    ESTADOS = {
+        'na_fila': "⏳ Na fila",
+        'executando': "🔄 Executando",
+        'concluida': "✅ Concluída",
+        'falhou': "❌ Falhou",
+        'interrompida': "⏸️ Interrompida"
+    }
+    
+    def __init__(self, guild_id, tipo, descricao, autor=None):
+        self.id = next(numeros_tarefas)
+        self.guild_id = guild_id
+        self.tipo = tipo
+        self.descricao = descricao
+        self.autor = autor
+        self.estado = 'na_fila'
+        self.criada = datetime.utcnow()
+        self.inicio = None
+        self.fim = None
+        self.resultado = None
     
-    if not iniciar_votacao_automatica.is_running():
-        iniciar_votacao_automatica.start()
+    @property
+    def duracao(self):
+        if self.inicio is None:
+            return 0.0
+        return ((self.fim or datetime.utcnow()) - self.inicio).total_seconds()
     
-    print(f'⏰ Agendador automático ativado!')
-    print(f'📅 Verificação diária: Todo dia às 3:00 AM UTC')
-    print(f'🗳️ Votação inicia: Apenas no dia 1 de cada mês')
+    def linha(self):
+        """Descrição da tarefa em uma linha (mais o resultado, se houver) para o /status"""
+        texto = f"**#{self.id}** {self.descricao} · {self.ESTADOS[self.estado]}"
+        if self.inicio is not None:
+            texto += f" · {formatar_segundos(self.duracao)}"
+        if self.autor:
+            texto += f" · <@{self.autor}>"
+        if self.resultado:
+            texto += f"\n└ {self.resultado}"
+        return texto
 
-# Comando de emergência para sincronizar (usar apenas uma vez)
-@bot.command()
-@commands.is_owner()
-async def sync(ctx):
-    """Sincroniza os slash commands manualmente"""
-    print("🔄 Sincronizando comandos...")
-    await bot.tree.sync()
-    await ctx.send("✅ Comandos sincronizados! Agora digite `/` para ver os comandos.")
-    print("✅ Comandos sincronizados com sucesso!")
+class FilaTarefas:
+    """Executa as tarefas de um servidor uma de cada vez, na ordem em que chegaram.
+    
+    Quem pede a tarefa recebe o número na hora; o trabalho em si não depende da
+    interação (cujo token expira em 15 minutos) e publica no canal. Enquanto
+    houver tarefa executando ou na fila, o servidor fica em guilds_finalizando.
+    """
+    
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.pendentes = collections.deque()
+        self.atual = None
+        self.recentes = collections.deque(maxlen=TAREFAS_RECENTES)
+        self._trabalhador = None
+    
+    def enviar(self, tarefa, funcao, *args):
+        self.pendentes.append((tarefa, funcao, args))
+        guilds_finalizando.add(self.guild_id)
+        if self._trabalhador is None:
+            self._trabalhador = asyncio.create_task(self._executar())
+            tarefas_em_segundo_plano.add(self._trabalhador)
+            self._trabalhador.add_done_callback(tarefas_em_segundo_plano.discard)
+        return tarefa
+    
+    def procurar(self, tipo):
+        """Tarefa do tipo que ainda não terminou (executando ou na fila), se houver"""
+        if self.atual is not None and self.atual.tipo == tipo:
+            return self.atual
+        for tarefa, _, _ in self.pendentes:
+            if tarefa.tipo == tipo:
+                return tarefa
+        return None
+    
+    def na_fila(self):
+        return [tarefa for tarefa, _, _ in self.pendentes]
+    
+    def buscar(self, tarefa_id):
+        for tarefa in [self.atual, *self.na_fila(), *self.recentes]:
+            if tarefa is not None and tarefa.id == tarefa_id:
+                return tarefa
+        return None
+    
+    async def _executar(self):
+        try:
+            while self.pendentes:
+                tarefa, funcao, args = self.pendentes.popleft()
+                self.atual = tarefa
+                tarefa.estado = 'executando'
+                tarefa.inicio = datetime.utcnow()
+                try:
+                    tarefa.resultado = await funcao(*args)
+                    tarefa.estado = 'interrompida' if rollout_interrompido(self.guild_id) else 'concluida'
+                except FalhaTarefa as e:
+                    tarefa.estado = 'falhou'
+                    tarefa.resultado = str(e)
+                except Exception as e:
+                    tarefa.estado = 'falhou'
+                    tarefa.resultado = f"Erro inesperado: {e}"
+                    log.error(
+                        f"❌ [{self.guild_id}] Erro na tarefa #{tarefa.id} ({tarefa.descricao}): {e}",
+                        extra={'guild_id': self.guild_id, 'tarefa': tarefa.id},
+                        exc_info=True
+                    )
+                finally:
+                    if tarefa.estado == 'executando':
+                        # Cancelada (bot desligando)
+                        tarefa.estado = 'interrompida'
+                    tarefa.fim = datetime.utcnow()
+                    metricas.observar('tarefa_segundos', tarefa.tipo, tarefa.duracao)
+                    self.atual = None
+                    self.recentes.appendleft(tarefa)
+        finally:
+            self._trabalhador = None
+            guilds_finalizando.discard(self.guild_id)
+
+# Fila de tarefas de cada servidor
+filas_tarefas = {}
+
+def fila_do_servidor(guild_id):
+    if guild_id not in filas_tarefas:
+        filas_tarefas[guild_id] = FilaTarefas(guild_id)
+    return filas_tarefas[guild_id]
+
+def enviar_tarefa(guild_id, tipo, descricao, funcao, *args, autor=None):
+    """Coloca `funcao(*args)` na fila do servidor e devolve a Tarefa (com o número)"""
+    return fila_do_servidor(guild_id).enviar(Tarefa(guild_id, tipo, descricao, autor), funcao, *args)
+
+def rollout_interrompido(guild_id):
+    """Se o servidor ainda tem um rollout salvo, a tarefa parou antes de terminá-lo"""
+    return bool(load_data(guild_id).get('rollout'))
+
+def descrever_posicao(fila, tarefa):
+    """Texto curto com a situação da tarefa recém-enviada"""
+    if fila.atual is tarefa:
+        return "em execução"
+    atras = fila.na_fila().index(tarefa) + (fila.atual is not None)
+    if not atras:
+        return "começando agora"
+    return f"na fila atrás de {atras} tarefa(s)"
 
 # ============================================
 # SLASH COMMANDS
 # ============================================
 
 @bot.tree.command(name="adicionar", description="Adiciona um participante ao Multiverso")
+@app_commands.guild_only()
 @app_commands.describe(
     membro="O membro que você quer adicionar",
     apelido="O apelido que será usado quando ele ganhar"
@@ -91,15 +2620,17 @@ async def sync(ctx):
 @app_commands.checks.has_permissions(administrator=True)
 async def adicionar(interaction: discord.Interaction, membro: discord.Member, apelido: str):
     """Adiciona um participante ao Multiverso"""
-    data = load_data()
-    
-    data['participantes'][str(membro.id)] = {
-        'nome': membro.display_name,
-        'apelido': apelido,
-        'user_id': membro.id
-    }
-    
-    save_data(data)
+    estado.registrar(
+        'participante_adicionado',
+        interaction.guild_id,
+        autor=interaction.user.id,
+        user_id=str(membro.id),
+        info={
+            'nome': membro.display_name,
+            'apelido': apelido,
+            'user_id': membro.id
+        }
+    )
     
     embed = discord.Embed(
         title="✅ Participante Adicionado ao Multiverso!",
@@ -110,11 +2641,12 @@ async def adicionar(interaction: discord.Interaction, membro: discord.Member, ap
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="remover", description="Remove um participante do Multiverso")
+@app_commands.guild_only()
 @app_commands.describe(membro="O membro que você quer remover")
 @app_commands.checks.has_permissions(administrator=True)
 async def remover(interaction: discord.Interaction, membro: discord.Member):
     """Remove um participante do Multiverso"""
-    data = load_data()
+    data = load_data(interaction.guild_id)
     
     user_id = str(membro.id)
     
@@ -123,12 +2655,7 @@ async def remover(interaction: discord.Interaction, membro: discord.Member):
         return
     
     apelido = data['participantes'][user_id]['apelido']
-    del data['participantes'][user_id]
-    
-    if user_id in data['ja_escolhidos']:
-        data['ja_escolhidos'].remove(user_id)
-    
-    save_data(data)
+    estado.registrar('participante_removido', interaction.guild_id, autor=interaction.user.id, user_id=user_id)
     
     embed = discord.Embed(
         title="🗑️ Participante Removido",
@@ -138,77 +2665,167 @@ async def remover(interaction: discord.Interaction, membro: discord.Member):
     
     await interaction.response.send_message(embed=embed)
 
-@bot.tree.command(name="lista", description="Mostra todos os participantes do Multiverso")
-async def lista(interaction: discord.Interaction):
-    """Mostra todos os participantes do Multiverso"""
-    data = load_data()
+# Participantes por página do /lista (um embed aceita no máximo 25 campos)
+PARTICIPANTES_POR_PAGINA = 20
+
+paginas_lista = {}
+
+def paginas_da_lista(guild_id):
+    """Embeds das páginas do /lista, renderizados uma vez por versão dos participantes"""
+    versao = estado.versao(guild_id)
+    cache = paginas_lista.get(guild_id)
+    if cache is not None and cache[0] == versao:
+        return cache[1]
     
-    if not data['participantes']:
-        await interaction.response.send_message("📝 A lista do Multiverso está vazia!", ephemeral=True)
-        return
+    data = load_data(guild_id)
+    rodizio = rodizio_da_guild(guild_id)
+    participantes = list(data['participantes'].items())
     
-    embed = discord.Embed(
-        title="🌌 Lista do Multiverso",
-        description="Participantes cadastrados:",
-        color=0x9B59B6
-    )
+    total = len(participantes)
+    escolhidos = len(rodizio.escolhidos)
+    restantes = len(rodizio)
+    total_paginas = max(1, -(-total // PARTICIPANTES_POR_PAGINA))
     
-    for user_id, info in data['participantes'].items():
-        ja_escolhido = "✅" if user_id in data['ja_escolhidos'] else "⏳"
-        atual = "👑" if user_id == data['atual_escolhido'] else ""
+    paginas = []
+    for pagina in range(total_paginas):
+        embed = discord.Embed(
+            title="🌌 Lista do Multiverso",
+            description="Participantes cadastrados:",
+            color=0x9B59B6
+        )
+        
+        inicio = pagina * PARTICIPANTES_POR_PAGINA
+        for user_id, info in participantes[inicio:inicio + PARTICIPANTES_POR_PAGINA]:
+            ja_escolhido = "✅" if rodizio.ja_escolhido(user_id) else "⏳"
+            atual = "👑" if user_id == data['atual_escolhido'] else ""
+            
+            embed.add_field(
+                name=f"",
+                value=f"{ja_escolhido} Apelido: `{info['apelido']}` {atual}",
+                inline=False
+            )
         
         embed.add_field(
-            name=f"",
-            value=f"{ja_escolhido} Apelido: `{info['apelido']}` {atual}",
+            name="",
+            value="✅ = Já foi escolhido | ⏳ = Aguardando | 👑 = Atual campeão",
             inline=False
         )
+        
+        rodape = f"Total: {total} | Escolhidos: {escolhidos} | Restantes: {restantes}"
+        if total_paginas > 1:
+            rodape += f" | Página {pagina + 1}/{total_paginas}"
+        embed.set_footer(text=rodape)
+        paginas.append(embed)
     
-    embed.add_field(
-        name="",
-        value="✅ = Já foi escolhido | ⏳ = Aguardando | 👑 = Atual campeão",
-        inline=False
-    )
+    paginas_lista[guild_id] = (versao, paginas)
+    return paginas
+
+class Paginacao(discord.ui.View):
+    """Botões de anterior/próxima para comandos com resultado em páginas.
     
-    total = len(data['participantes'])
-    escolhidos = len(data['ja_escolhidos'])
-    restantes = total - escolhidos
+    `contar()` diz quantas páginas existem agora e `renderizar(pagina)` devolve
+    o embed de uma delas (podem ser funções async); ambos são chamados a cada
+    clique, então a resposta acompanha as alterações sem montar as outras páginas.
+    """
     
-    embed.set_footer(text=f"Total: {total} | Escolhidos: {escolhidos} | Restantes: {restantes}")
+    def __init__(self, interaction, contar, renderizar):
+        super().__init__(timeout=180)
+        self.interaction = interaction
+        self.contar = contar
+        self.renderizar = renderizar
+        self.pagina = 0
+        self.anterior.disabled = True
     
-    await interaction.response.send_message(embed=embed)
+    def _atualizar_botoes(self, total_paginas):
+        self.anterior.disabled = self.pagina == 0
+        self.proxima.disabled = self.pagina >= total_paginas - 1
+    
+    async def _mostrar(self, interaction, passo):
+        total_paginas = await discord.utils.maybe_coroutine(self.contar)
+        self.pagina = min(max(self.pagina + passo, 0), total_paginas - 1)
+        self._atualizar_botoes(total_paginas)
+        embed = await discord.utils.maybe_coroutine(self.renderizar, self.pagina)
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(label="◀️ Anterior", style=discord.ButtonStyle.secondary)
+    async def anterior(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._mostrar(interaction, -1)
+    
+    @discord.ui.button(label="Próxima ▶️", style=discord.ButtonStyle.secondary)
+    async def proxima(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._mostrar(interaction, 1)
+    
+    async def on_timeout(self):
+        try:
+            await self.interaction.edit_original_response(view=None)
+        except discord.HTTPException:
+            pass
+
+@bot.tree.command(name="lista", description="Mostra todos os participantes do Multiverso")
+@app_commands.guild_only()
+async def lista(interaction: discord.Interaction):
+    """Mostra todos os participantes do Multiverso, em páginas"""
+    data = load_data(interaction.guild_id)
+    
+    if not data['participantes']:
+        await interaction.response.send_message("📝 A lista do Multiverso está vazia!", ephemeral=True)
+        return
+    
+    paginas = paginas_da_lista(interaction.guild_id)
+    
+    if len(paginas) == 1:
+        await interaction.response.send_message(embed=paginas[0])
+        return
+    
+    guild_id = interaction.guild_id
+    view = Paginacao(
+        interaction,
+        lambda: len(paginas_da_lista(guild_id)),
+        lambda pagina: paginas_da_lista(guild_id)[pagina]
+    )
+    await interaction.response.send_message(embed=paginas[0], view=view)
 
 @bot.tree.command(name="multiverso", description="Inicia a votação do Multiverso")
+@app_commands.guild_only()
 @app_commands.checks.has_permissions(administrator=True)
 async def multiverso(interaction: discord.Interaction):
     """Inicia a votação do Multiverso"""
-    data = load_data()
+    data = load_data(interaction.guild_id)
+    
+    if votacao_em_andamento(data):
+        await interaction.response.send_message("❌ Já existe uma votação ativa! Use `/finalizar` para encerrá-la.", ephemeral=True)
+        return
     
     if not data['participantes']:
         await interaction.response.send_message("❌ Não há participantes cadastrados! Use `/adicionar` primeiro.", ephemeral=True)
         return
     
-    if len(data['ja_escolhidos']) >= len(data['participantes']):
+    if rodizio_da_guild(interaction.guild_id).esgotado:
         await interaction.response.send_message("🔄 Todos já foram escolhidos! Resetando a lista...")
-        data['ja_escolhidos'] = []
-        save_data(data)
+        estado.registrar('escolhidos_resetados', interaction.guild_id, autor=interaction.user.id)
     
-    candidatos = {
-        user_id: info 
-        for user_id, info in data['participantes'].items() 
-        if user_id not in data['ja_escolhidos']
-    }
+    candidatos_lista = candidatos_da_votacao(interaction.guild_id)
     
-    if not candidatos:
+    if not candidatos_lista:
         await interaction.response.send_message("❌ Nenhum candidato disponível!", ephemeral=True)
         return
     
-    candidatos_lista = list(candidatos.items())[:10]
+    duracao_horas = data['config']['duracao_horas']
+    
+    if len(candidatos_lista) > MAX_OPCOES_ENQUETE:
+        await interaction.response.send_message(
+            f"🏟️ São {len(candidatos_lista)} candidatos: a votação será em chaveamento (grupos + final)!"
+        )
+        await iniciar_chaveamento(
+            interaction.guild, interaction.channel, candidatos_lista, duracao_horas, automatico=False
+        )
+        return
     
     pergunta = "🌌 VOTAÇÃO DO MULTIVERSO - Quem será o próximo escolhido?"
     
     poll = discord.Poll(
         question=discord.PollMedia(text=pergunta),
-        duration=timedelta(hours=24)
+        duration=timedelta(hours=duracao_horas)
     )
     
     for user_id, info in candidatos_lista:
@@ -219,7 +2836,7 @@ async def multiverso(interaction: discord.Interaction):
         title="🎉 Votação Mensal Iniciada!",
         description=(
             "O vencedor terá seu apelido aplicado a **TODOS** do servidor!\n\n"
-            "⏰ **Duração:** 24 horas\n"
+            f"⏰ **Duração:** {duracao_horas} horas\n"
             "🗳️ **Vote na enquete abaixo!**\n"
         ),
         color=0xFF00FF
@@ -229,125 +2846,177 @@ async def multiverso(interaction: discord.Interaction):
     
     message = await interaction.followup.send(poll=poll)
     
-    data['poll_message_id'] = message.id
-    data['poll_channel_id'] = interaction.channel_id
-    data['poll_candidatos'] = candidatos_lista
-    data['poll_inicio'] = datetime.utcnow().isoformat()
-    data['poll_fim_programado'] = (datetime.utcnow() + timedelta(hours=24)).isoformat()
+    estado.registrar(
+        'votacao_iniciada',
+        interaction.guild_id,
+        autor=interaction.user.id,
+        message_id=message.id,
+        channel_id=interaction.channel_id,
+        candidatos=candidatos_lista,
+        inicio=datetime.utcnow().isoformat(),
+        fim_programado=(datetime.utcnow() + timedelta(hours=duracao_horas)).isoformat()
+    )
+    agendar_encerramento(interaction.guild_id)
+    
+    await interaction.followup.send(f"✅ Votação iniciada! Termina em {duracao_horas} horas. Use `/finalizar` para encerrar antes se necessário.", ephemeral=True)
+
+async def enviar_simulacao(interaction, data):
+    """Mostra o plano do rollout para quem está na frente agora, sem alterar nada"""
+    id_lider, votos_lider = ranking_votos(votos_ao_vivo(data), len(data['poll_candidatos']))[0]
+    _, info_lider = data['poll_candidatos'][id_lider - 1]
+    
+    rollout = RolloutApelidos(interaction.guild, info_lider['apelido'])
+    plano = await rollout.planejar()
+    editar = plano.get('editar', 0)
     
-    save_data(data)
+    embed = discord.Embed(
+        title="🧪 Simulação do Rollout",
+        description=(
+            f"🏆 **Na frente agora:** `{info_lider['apelido']}` ({votos_lider} votos)\n\n"
+            f"✏️ **Serão alterados:** {editar}\n"
+            f"⏭️ **Já têm o apelido:** {plano.get('ja_aplicado', 0)}\n"
+            f"👑 **Dono do servidor:** {plano.get('dono', 0)}\n"
+            f"🔒 **Cargo igual/acima do bot:** {plano.get('cargo_acima', 0)}\n"
+            f"🚫 **Sem permissão Gerenciar Apelidos:** {plano.get('sem_permissao', 0)}\n"
+            f"🤖 **Bots:** {plano.get('bot', 0)}\n\n"
+            f"Somente os {editar} membros alteráveis vão gastar requisições à API."
+        ),
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text="Nada foi alterado • A votação continua aberta")
     
-    await interaction.followup.send(f"✅ Votação iniciada! Termina em 24 horas. Use `/finalizar` para encerrar antes se necessário.", ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="finalizar", description="Finaliza a votação do Multiverso e aplica o resultado")
+@app_commands.guild_only()
+@app_commands.describe(simulacao="Apenas mostra o plano do rollout, sem encerrar a votação nem alterar apelidos")
 @app_commands.checks.has_permissions(administrator=True)
-async def finalizar(interaction: discord.Interaction):
+async def finalizar(interaction: discord.Interaction, simulacao: bool = False):
     """Finaliza a votação do Multiverso e aplica o apelido vencedor"""
-    data = load_data()
+    data = load_data(interaction.guild_id)
+    
+    if data.get('chaveamento'):
+        await finalizar_rodada(interaction, data, simulacao)
+        return
     
     if not data.get('poll_message_id'):
         await interaction.response.send_message("❌ Não há votação ativa!", ephemeral=True)
         return
     
-    await interaction.response.defer()
-    
-    channel = bot.get_channel(data['poll_channel_id'])
-    try:
-        message = await channel.fetch_message(data['poll_message_id'])
-    except:
-        await interaction.followup.send("❌ Não consegui encontrar a mensagem da votação!")
+    if simulacao:
+        await interaction.response.defer(ephemeral=True)
+        await enviar_simulacao(interaction, data)
         return
     
-    if not message.poll:
-        await interaction.followup.send("❌ Esta mensagem não tem uma enquete!")
+    fila = fila_do_servidor(interaction.guild_id)
+    tarefa = fila.procurar('finalizacao')
+    if tarefa is not None:
+        await interaction.response.send_message(
+            f"⏳ A votação já está sendo encerrada (tarefa **#{tarefa.id}**, {descrever_posicao(fila, tarefa)}). "
+            f"Acompanhe com `/status`.",
+            ephemeral=True
+        )
         return
     
-    poll = message.poll
-    
-    if not poll.is_finalised():
-        await message.poll.end()
-        await asyncio.sleep(2)
-        message = await channel.fetch_message(data['poll_message_id'])
-        poll = message.poll
+    # O rollout pode levar horas: roda como tarefa do servidor e publica no canal da votação
+    tarefa = enviar_tarefa(
+        interaction.guild_id,
+        'finalizacao',
+        "Encerrar a votação e aplicar o vencedor",
+        encerrar_votacao_guild,
+        interaction.guild_id,
+        data['poll_message_id'],
+        interaction.user.id,
+        autor=interaction.user.id
+    )
+    await interaction.response.send_message(
+        f"📋 Encerramento da votação enviado como tarefa **#{tarefa.id}** ({descrever_posicao(fila, tarefa)}).\n"
+        f"O resultado e o progresso dos apelidos serão publicados em <#{data['poll_channel_id']}>. "
+        f"Acompanhe com `/status`."
+    )
+
+@bot.tree.command(name="restaurar", description="Devolve os apelidos que os membros tinham antes de um rollout")
+@app_commands.guild_only()
+@app_commands.describe(rollout="Qual rollout desfazer: 1 = o mais recente, 2 = o anterior, e assim por diante")
+@app_commands.checks.has_permissions(administrator=True)
+async def restaurar(interaction: discord.Interaction, rollout: app_commands.Range[int, 1, SNAPSHOTS_MANTIDOS] = 1):
+    """Restaura os apelidos gravados na fotografia de um rollout anterior"""
+    fila = fila_do_servidor(interaction.guild_id)
+    if fila.procurar('restauracao') is not None:
+        await interaction.response.send_message("⏳ Já existe uma restauração de apelidos na fila! Veja com `/status`.", ephemeral=True)
+        return
     
-    votos_por_opcao = {}
-    for answer in poll.answers:
-        votos_por_opcao[answer.id] = answer.vote_count
+    await interaction.response.defer()
     
-    if not votos_por_opcao or all(v == 0 for v in votos_por_opcao.values()):
-        await interaction.followup.send("❌ Nenhum voto foi registrado!")
+    loop = asyncio.get_running_loop()
+    snapshots = await loop.run_in_executor(executor_disco, listar_snapshots, interaction.guild_id)
+    if not snapshots:
+        await interaction.followup.send("❌ Nenhuma fotografia de apelidos encontrada! Elas são gravadas a cada rollout.")
+        return
+    if rollout > len(snapshots):
+        await interaction.followup.send(f"❌ Só existem {len(snapshots)} fotografias de apelidos neste servidor!")
         return
     
-    id_vencedor = max(votos_por_opcao, key=votos_por_opcao.get)
-    total_votos = votos_por_opcao[id_vencedor]
-    
-    candidatos_lista = data['poll_candidatos']
-    user_id_vencedor, info_vencedor = candidatos_lista[id_vencedor - 1]
+    # Checa de novo: outra restauração pode ter sido pedida enquanto listávamos as fotografias
+    if fila.procurar('restauracao') is not None:
+        await interaction.followup.send("⏳ Já existe uma restauração de apelidos na fila! Veja com `/status`.")
+        return
     
-    embed = discord.Embed(
-        title="🎉 TEMOS UM VENCEDOR! 🎉",
-        description=(
-            f"\n"
-            f"🏆 **Apelido vencedor:** `{info_vencedor['apelido']}`\n"
-            f"📊 **Votos recebidos:** {total_votos}\n\n"
-            f"Alterando apelidos de todos do servidor..."
-        ),
-        color=discord.Color.gold()
+    arquivo = snapshots[rollout - 1]
+    tarefa = enviar_tarefa(
+        interaction.guild_id,
+        'restauracao',
+        f"Restaurar os apelidos de antes do rollout de {descrever_snapshot(arquivo)}",
+        restaurar_apelidos,
+        interaction.guild,
+        interaction.channel,
+        arquivo,
+        autor=interaction.user.id
     )
+    await interaction.followup.send(
+        f"📋 Restauração enviada como tarefa **#{tarefa.id}** ({descrever_posicao(fila, tarefa)}). "
+        f"Acompanhe com `/status`."
+    )
+
+async def restaurar_apelidos(guild, canal, arquivo):
+    """Tarefa do /restaurar: publica a mensagem de status no canal e devolve os apelidos"""
+    registrar_rollout(guild, None, canal, automatico=False, tipo='restauracao', snapshot=arquivo)
+    rollout = await iniciar_rollout(
+        guild, canal, f"♻️ Restaurando os apelidos de antes do rollout de {descrever_snapshot(arquivo)}..."
+    )
+    return resumir_rollout(rollout)
+
+async def finalizar_rodada(interaction, data, simulacao):
+    """/finalizar durante os grupos do chaveamento: encerra a rodada atual antes do prazo"""
+    if simulacao:
+        await interaction.response.send_message("🧪 A simulação fica disponível na final do chaveamento.", ephemeral=True)
+        return
     
-    await interaction.followup.send(embed=embed)
-    
-    guild = interaction.guild
-    sucessos = 0
-    falhas = 0
-    
-    status_msg = await interaction.followup.send("🔄 Alterando apelidos...")
-    
-    for member in guild.members:
-        if member.bot:
-            continue
-        
-        try:
-            await member.edit(nick=info_vencedor['apelido'])
-            sucessos += 1
-            await asyncio.sleep(0.5)
-        except discord.Forbidden:
-            falhas += 1
-        except Exception as e:
-            print(f"Erro ao alterar apelido de {member.name}: {e}")
-            falhas += 1
-    
-    data['ja_escolhidos'].append(user_id_vencedor)
-    data['atual_escolhido'] = user_id_vencedor
-    data['historico'].append({
-        'user_id': user_id_vencedor,
-        'nome': info_vencedor['nome'],
-        'apelido': info_vencedor['apelido'],
-        'data': datetime.utcnow().isoformat(),
-        'votos': total_votos
-    })
-    
-    data['poll_message_id'] = None
-    data['poll_channel_id'] = None
-    data['poll_candidatos'] = []
-    
-    save_data(data)
+    fila = fila_do_servidor(interaction.guild_id)
+    tarefa = fila.procurar('rodada')
+    if tarefa is not None:
+        await interaction.response.send_message(
+            f"⏳ A rodada já está sendo encerrada (tarefa **#{tarefa.id}**)!", ephemeral=True
+        )
+        return
     
-    embed_final = discord.Embed(
-        title="✅ Multiverso Ativado!",
-        description=(
-            f"**{info_vencedor['apelido']}** agora reina sobre o multiverso!\n\n"
-            f"👑 Todos agora são: `{info_vencedor['apelido']}`\n\n"
-            f"**Estatísticas:**\n"
-            f"✅ Apelidos alterados: {sucessos}\n"
-            f"❌ Falhas: {falhas}"
-        ),
-        color=discord.Color.purple()
+    rodada = data['chaveamento']['rodada']
+    tarefa = enviar_tarefa(
+        interaction.guild_id,
+        'rodada',
+        f"Encerrar a rodada {rodada} do chaveamento",
+        encerrar_rodada_guild,
+        interaction.guild_id,
+        rodada,
+        autor=interaction.user.id
+    )
+    await interaction.response.send_message(
+        f"⏩ Encerrando a rodada {rodada} do chaveamento agora (tarefa **#{tarefa.id}**, "
+        f"{descrever_posicao(fila, tarefa)})..."
     )
-    
-    await status_msg.edit(content="", embed=embed_final)
 
 @bot.tree.command(name="resetar", description="⚠️ Reseta todo o sistema do Multiverso")
+@app_commands.guild_only()
 @app_commands.checks.has_permissions(administrator=True)
 async def resetar(interaction: discord.Interaction):
     """Reseta todo o sistema do Multiverso"""
@@ -372,15 +3041,10 @@ async def resetar(interaction: discord.Interaction):
             await button_interaction.response.send_message("❌ Apenas quem iniciou pode confirmar!", ephemeral=True)
             return
         
-        data = {
-            'participantes': {},
-            'ja_escolhidos': [],
-            'atual_escolhido': None,
-            'historico': [],
-            'poll_message_id': None,
-            'poll_channel_id': None
-        }
-        save_data(data)
+        estado.registrar('sistema_resetado', interaction.guild_id, autor=button_interaction.user.id)
+        cancelar_encerramento(interaction.guild_id)
+        await descartar_arquivo_historico(interaction.guild_id)
+        agendador.cancelar(('encerrar_rodada', interaction.guild_id))
         
         await button_interaction.response.edit_message(content="✅ Sistema resetado com sucesso!", embed=None, view=None)
     
@@ -391,48 +3055,415 @@ async def resetar(interaction: discord.Interaction):
         
         await button_interaction.response.edit_message(content="❌ Reset cancelado.", embed=None, view=None)
     
-    confirm_button = discord.ui.Button(label="✅ Confirmar", style=discord.ButtonStyle.danger)
-    confirm_button.callback = confirm_callback
+    confirm_button = discord.ui.Button(label="✅ Confirmar", style=discord.ButtonStyle.danger)
+    confirm_button.callback = confirm_callback
+    
+    cancel_button = discord.ui.Button(label="❌ Cancelar", style=discord.ButtonStyle.secondary)
+    cancel_button.callback = cancel_callback
+    
+    view.add_item(confirm_button)
+    view.add_item(cancel_button)
+    
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+@bot.tree.command(name="resetar_escolhidos", description="Reseta apenas a lista de já escolhidos")
+@app_commands.guild_only()
+@app_commands.checks.has_permissions(administrator=True)
+async def resetar_escolhidos(interaction: discord.Interaction):
+    """Reseta apenas a lista de já escolhidos"""
+    estado.registrar('escolhidos_resetados', interaction.guild_id, autor=interaction.user.id, limpar_atual=True)
+    
+    await interaction.response.send_message("✅ Lista de escolhidos resetada! Todos podem participar novamente.")
+
+MODOS_SORTEIO = {
+    'espera': 'favorecendo quem espera há mais tempo',
+    'fila': 'por ordem de espera',
+    'uniforme': 'ao acaso'
+}
+
+def descrever_sorteio(config):
+    """Texto do limite de candidatos para o embed de configuração"""
+    limite = config.get('candidatos_por_votacao', 0)
+    if not limite:
+        return "todos os disponíveis"
+    return f"{limite} por votação, {MODOS_SORTEIO[config.get('sorteio', 'espera')]}"
+
+@bot.tree.command(name="configurar", description="Configura a votação automática deste servidor")
+@app_commands.guild_only()
+@app_commands.describe(
+    canal="Canal onde a votação mensal será postada",
+    dia="Dia do mês em que a votação começa (1 a 28)",
+    hora="Hora (UTC) em que a votação começa (0 a 23)",
+    duracao_horas="Quantas horas a votação fica aberta (1 a 168)",
+    candidatos="Quantos candidatos sortear por votação (0 = todos os disponíveis)",
+    sorteio="Como sortear os candidatos quando há limite"
+)
+@app_commands.choices(sorteio=[
+    app_commands.Choice(name="Favorece quem espera há mais tempo", value='espera'),
+    app_commands.Choice(name="Fila (sempre quem espera há mais tempo)", value='fila'),
+    app_commands.Choice(name="Aleatório entre todos", value='uniforme')
+])
+@app_commands.checks.has_permissions(administrator=True)
+async def configurar(
+    interaction: discord.Interaction,
+    canal: discord.TextChannel = None,
+    dia: app_commands.Range[int, 1, 28] = None,
+    hora: app_commands.Range[int, 0, 23] = None,
+    duracao_horas: app_commands.Range[int, 1, 168] = None,
+    candidatos: app_commands.Range[int, 0, 100] = None,
+    sorteio: app_commands.Choice[str] = None
+):
+    """Configura canal, dia, hora, duração e sorteio de candidatos da votação automática do servidor"""
+    data = load_data(interaction.guild_id)
+    config = dict(data['config'])
+    
+    if canal is not None:
+        config['canal_votacao_id'] = canal.id
+    if dia is not None:
+        config['dia'] = dia
+    if hora is not None:
+        config['hora'] = hora
+    if duracao_horas is not None:
+        config['duracao_horas'] = duracao_horas
+    if candidatos is not None:
+        config['candidatos_por_votacao'] = candidatos
+    if sorteio is not None:
+        config['sorteio'] = sorteio.value
+    
+    if config != data['config']:
+        estado.registrar('guild_configurada', interaction.guild_id, autor=interaction.user.id, config=config)
+        if (config['dia'], config['hora']) != (data['config']['dia'], data['config']['hora']):
+            # O novo horário vale a partir de agora: não "recupera" um horário que já passou
+            marcar_agenda(interaction.guild_id, horario_anterior(config, datetime.utcnow()))
+            agendar_abertura(interaction.guild_id)
+    
+    canal_id = canal_votacao_id(interaction.guild)
+    proxima = agendador.proximo(('abrir_votacao', interaction.guild_id))
+    embed = discord.Embed(
+        title="⚙️ Configuração do Multiverso",
+        description=(
+            f"📢 **Canal:** {f'<#{canal_id}>' if canal_id else 'não configurado'}\n"
+            f"📅 **Dia:** {config['dia']} de cada mês\n"
+            f"⏰ **Hora:** {config['hora']:02d}:00 UTC\n"
+            f"⌛ **Duração:** {config['duracao_horas']} horas\n"
+            f"🎲 **Candidatos:** {descrever_sorteio(config)}\n"
+            f"🗓️ **Próxima votação:** "
+            f"{discord.utils.format_dt(proxima.replace(tzinfo=timezone.utc), 'F') if proxima else 'não agendada'}"
+        ),
+        color=0x9B59B6
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="parcial", description="Mostra o resultado parcial da votação ativa")
+@app_commands.guild_only()
+async def parcial(interaction: discord.Interaction):
+    """Mostra a contagem ao vivo da votação ativa, sem consultar a API"""
+    data = load_data(interaction.guild_id)
+    
+    if data.get('chaveamento'):
+        await parcial_chaveamento(interaction, data['chaveamento'])
+        return
+    
+    if not data.get('poll_message_id'):
+        await interaction.response.send_message("❌ Não há votação ativa!", ephemeral=True)
+        return
+    
+    ranking = ranking_votos(votos_ao_vivo(data), len(data['poll_candidatos']))
+    total = sum(votos for _, votos in ranking)
+    medalhas = ['🥇', '🥈', '🥉']
+    
+    linhas = []
+    for posicao, (opcao, votos) in enumerate(ranking):
+        _, info = data['poll_candidatos'][opcao - 1]
+        icone = medalhas[posicao] if posicao < len(medalhas) and votos else '▫️'
+        porcentagem = f" ({votos / total:.0%})" if total else ""
+        linhas.append(f"{icone} `{info['apelido']}` — {votos} voto(s){porcentagem}")
+    
+    embed = discord.Embed(
+        title="📊 Resultado Parcial",
+        description="\n".join(linhas),
+        color=0x3498DB
+    )
+    embed.set_footer(text=f"Total de votos: {total} • Empate: vence quem aparece primeiro na enquete")
+    if data.get('poll_fim_programado'):
+        fim = datetime.fromisoformat(data['poll_fim_programado']).replace(tzinfo=timezone.utc)
+        embed.add_field(name="⏰ Encerramento", value=discord.utils.format_dt(fim, 'R'), inline=False)
+    
+    await interaction.response.send_message(embed=embed)
+
+async def parcial_chaveamento(interaction, chaveamento):
+    """Resultado parcial de cada grupo da rodada atual do chaveamento"""
+    vagas = chaveamento['vagas']
+    embed = discord.Embed(
+        title=f"📊 Parcial - Rodada {chaveamento['rodada']} de {chaveamento['total_rodadas']}",
+        description=f"⬆️ Avançam os {vagas} mais votados de cada grupo",
+        color=0x3498DB
+    )
+    
+    # Um embed comporta no máximo 25 campos
+    for numero, (message_id, grupo) in enumerate(list(chaveamento['grupos'].items())[:25], 1):
+        votos = {int(opcao): total for opcao, total in grupo['votos'].items()}
+        ranking = ranking_votos(votos, len(grupo['candidatos']))
+        linhas = [
+            f"{'⬆️' if posicao < vagas and total else '▫️'} `{grupo['candidatos'][opcao - 1][1]['apelido']}` — {total}"
+            for posicao, (opcao, total) in enumerate(ranking)
+        ]
+        embed.add_field(name=f"Grupo {numero}", value="\n".join(linhas)[:1024], inline=True)
+    
+    fim = datetime.fromisoformat(chaveamento['fim_programado']).replace(tzinfo=timezone.utc)
+    embed.add_field(name="⏰ Fim da rodada", value=discord.utils.format_dt(fim, 'R'), inline=False)
+    await interaction.response.send_message(embed=embed)
+
+def linha_rollout_ativo(guild_id):
+    """Progresso do rollout em andamento no servidor, se houver"""
+    rollout = rollouts_ativos.get(guild_id)
+    if rollout is None:
+        return ""
+    eta = rollout.eta
+    return (
+        f"\n└ 👥 {rollout.processados} processados · ✅ {rollout.sucessos} · ❌ {rollout.falhas} · "
+        f"⚡ {rollout.edicoes_por_segundo:.1f}/s · ⏳ {formatar_segundos(eta) if eta is not None else 'calculando...'}"
+    )
+
+@bot.tree.command(name="status", description="Mostra as tarefas em andamento e recentes deste servidor")
+@app_commands.guild_only()
+@app_commands.describe(tarefa="Número de uma tarefa específica")
+async def status(interaction: discord.Interaction, tarefa: app_commands.Range[int, 1] = None):
+    """Situação da fila de tarefas do servidor (encerramentos, rollouts, restaurações)"""
+    fila = fila_do_servidor(interaction.guild_id)
+    
+    if tarefa is not None:
+        encontrada = fila.buscar(tarefa)
+        if encontrada is None:
+            await interaction.response.send_message(f"❌ Tarefa #{tarefa} não encontrada neste servidor!", ephemeral=True)
+            return
+        descricao = encontrada.linha()
+        if encontrada is fila.atual:
+            descricao += linha_rollout_ativo(interaction.guild_id)
+        embed = discord.Embed(title=f"📋 Tarefa #{encontrada.id}", description=descricao, color=0x3498DB)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="📋 Tarefas do Servidor", color=0x3498DB)
+    if fila.atual is not None:
+        embed.add_field(
+            name="🔄 Em andamento",
+            value=(fila.atual.linha() + linha_rollout_ativo(interaction.guild_id))[:1024],
+            inline=False
+        )
+    if fila.pendentes:
+        embed.add_field(
+            name=f"⏳ Na fila ({len(fila.pendentes)})",
+            value="\n".join(pendente.linha() for pendente in fila.na_fila())[:1024],
+            inline=False
+        )
+    if fila.recentes:
+        embed.add_field(
+            name="📜 Recentes",
+            value="\n".join(recente.linha() for recente in fila.recentes)[:1024],
+            inline=False
+        )
+    if not embed.fields:
+        embed.description = "Nenhuma tarefa desde que o bot iniciou."
+    embed.set_footer(text="As tarefas rodam uma de cada vez, na ordem em que foram pedidas")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Eleições por página do /historico
+REGISTROS_POR_PAGINA = 10
+
+class IndiceHistorico:
+    """Posições do histórico de um servidor agrupadas por vencedor e por ano.
+    
+    O histórico só cresce, então cada consulta indexa apenas os registros
+    novos desde a anterior; um histórico menor (reset) é indexado de novo.
+    """
+    
+    def __init__(self):
+        self.historico = None
+        self.tamanho = 0
+        self.por_usuario = {}
+        self.por_ano = {}
+    
+    def atualizar(self, historico):
+        if historico is not self.historico or len(historico) < self.tamanho:
+            self.historico = historico
+            self.tamanho = 0
+            self.por_usuario = {}
+            self.por_ano = {}
+        
+        for posicao in range(self.tamanho, len(historico)):
+            registro = historico[posicao]
+            self.por_usuario.setdefault(str(registro.get('user_id')), []).append(posicao)
+            self.por_ano.setdefault(registro['data'][:4], []).append(posicao)
+        self.tamanho = len(historico)
+    
+    def posicoes(self, user_id=None, ano=None):
+        """Posições (em ordem cronológica) dos registros que passam nos filtros"""
+        if user_id is None and ano is None:
+            return range(self.tamanho)
+        if ano is None:
+            return self.por_usuario.get(str(user_id), [])
+        if user_id is None:
+            return self.por_ano.get(str(ano), [])
+        
+        # Percorre a menor das duas listas e confere o outro filtro no próprio registro
+        do_usuario = self.por_usuario.get(str(user_id), [])
+        do_ano = self.por_ano.get(str(ano), [])
+        if len(do_usuario) <= len(do_ano):
+            return [posicao for posicao in do_usuario if self.historico[posicao]['data'][:4] == str(ano)]
+        return [posicao for posicao in do_ano if str(self.historico[posicao].get('user_id')) == str(user_id)]
+
+indices_historico = {}
+
+def indice_historico(guild_id):
+    """Índice das eleições em memória do servidor, em dia com os registros mais recentes"""
+    indice = indices_historico.setdefault(guild_id, IndiceHistorico())
+    indice.atualizar(load_data(guild_id)['historico'])
+    return indice
+
+def caminho_arquivo_historico(guild_id, ano):
+    return os.path.join(PASTA_HISTORICO, str(guild_id), f"{ano}.jsonl.gz")
+
+def anexar_arquivo_historico(guild_id, grupos):
+    """Acrescenta as eleições de cada ano ao arquivo daquele ano (roda na thread de disco)"""
+    for ano, linhas in grupos.items():
+        anexar_snapshot(caminho_arquivo_historico(guild_id, ano), linhas)
+
+def ler_arquivo_historico(guild_id, ano, inicio, fim):
+    """Eleições arquivadas de um ano, por posição (roda na thread de disco).
+    
+    Só valem as posições dentro da faixa registrada no estado; se uma posição
+    foi gravada duas vezes (queda antes do evento ser anotado), fica a última.
+    """
+    registros = {}
+    try:
+        with gzip.open(caminho_arquivo_historico(guild_id, ano), 'rt', encoding='utf-8') as f:
+            for linha in f:
+                item = json.loads(linha)
+                if inicio <= item['n'] < fim:
+                    registros[item['n']] = item['registro']
+    except FileNotFoundError:
+        log.warning(f"⚠️ [{guild_id}] Arquivo do histórico de {ano} não encontrado", extra={'guild_id': guild_id})
+    return registros
+
+def apagar_arquivo_historico(guild_id):
+    """Remove o arquivo do histórico do servidor (roda na thread de disco)"""
+    pasta = os.path.join(PASTA_HISTORICO, str(guild_id))
+    if not os.path.isdir(pasta):
+        return
+    for nome in os.listdir(pasta):
+        os.remove(os.path.join(pasta, nome))
+    os.rmdir(pasta)
+
+# Anos do arquivo já lidos, para quem volta a paginar o mesmo período
+anos_carregados = {}
+MAX_ANOS_CARREGADOS = 8
+
+async def descartar_arquivo_historico(guild_id):
+    """Apaga o arquivo do histórico depois de um reset do sistema"""
+    for chave in [chave for chave in anos_carregados if chave[0] == guild_id]:
+        del anos_carregados[chave]
+    try:
+        await asyncio.get_running_loop().run_in_executor(executor_disco, apagar_arquivo_historico, guild_id)
+    except OSError as e:
+        log.error(f"❌ [{guild_id}] Erro ao apagar o arquivo do histórico: {e}", extra={'guild_id': guild_id})
+
+async def carregar_ano_arquivado(guild_id, arquivado, ano):
+    inicio, fim = arquivado['anos'][ano]
+    chave = (guild_id, ano, inicio, fim)
+    if chave not in anos_carregados:
+        loop = asyncio.get_running_loop()
+        registros = await loop.run_in_executor(executor_disco, ler_arquivo_historico, guild_id, ano, inicio, fim)
+        if len(anos_carregados) >= MAX_ANOS_CARREGADOS:
+            anos_carregados.pop(next(iter(anos_carregados)))
+        anos_carregados[chave] = registros
+    return anos_carregados[chave]
+
+def historico_arquivado(data):
+    return data.get('historico_arquivado') or {'total': 0, 'anos': {}}
+
+async def consultar_historico(guild_id, user_id=None, ano=None, minimo=0):
+    """Posições (globais, em ordem cronológica) das eleições que passam nos filtros e quantas são.
+    
+    As posições abaixo de `historico_arquivado.total` estão no arquivo. Filtrar
+    por ano usa só as faixas anotadas no estado; filtrar por membro abre os
+    anos do arquivo, do mais recente para o mais antigo, apenas enquanto as
+    eleições já encontradas não chegam às `minimo` mais recentes pedidas.
+    """
+    data = load_data(guild_id)
+    arquivado = historico_arquivado(data)
+    deslocamento = arquivado['total']
     
-    cancel_button = discord.ui.Button(label="❌ Cancelar", style=discord.ButtonStyle.secondary)
-    cancel_button.callback = cancel_callback
+    if user_id is None and ano is None:
+        total = deslocamento + len(data['historico'])
+        return range(total), total
     
-    view.add_item(confirm_button)
-    view.add_item(cancel_button)
+    recentes = [deslocamento + posicao for posicao in indice_historico(guild_id).posicoes(user_id, ano)]
+    antigas = []
+    completo = True
+    anos = [str(ano)] if ano is not None else sorted(arquivado['anos'], reverse=True)
     
-    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-
-@bot.tree.command(name="resetar_escolhidos", description="Reseta apenas a lista de já escolhidos")
-@app_commands.checks.has_permissions(administrator=True)
-async def resetar_escolhidos(interaction: discord.Interaction):
-    """Reseta apenas a lista de já escolhidos"""
-    data = load_data()
-    data['ja_escolhidos'] = []
-    data['atual_escolhido'] = None
-    save_data(data)
+    for ano_arquivado in anos:
+        if ano_arquivado not in arquivado['anos']:
+            continue
+        if user_id is None:
+            antigas = list(range(*arquivado['anos'][ano_arquivado]))
+            continue
+        if ano is None and len(antigas) + len(recentes) >= minimo:
+            completo = False
+            break
+        registros = await carregar_ano_arquivado(guild_id, arquivado, ano_arquivado)
+        antigas = [
+            posicao for posicao in sorted(registros)
+            if str(registros[posicao].get('user_id')) == user_id
+        ] + antigas
     
-    await interaction.response.send_message("✅ Lista de escolhidos resetada! Todos podem participar novamente.")
+    posicoes = antigas + recentes
+    total = len(posicoes)
+    if not completo:
+        # O total de vitórias de um membro já está nos agregados
+        total = max(total, estatisticas_do_historico(data)['vitorias'].get(user_id, 0))
+    return posicoes, total
 
-@bot.tree.command(name="historico", description="Mostra o histórico de vencedores do Multiverso")
-async def historico(interaction: discord.Interaction):
-    """Mostra o histórico de vencedores do Multiverso"""
-    data = load_data()
+async def registros_do_historico(guild_id, posicoes):
+    """Pares (posição, registro), abrindo o arquivo só para as posições fora da memória"""
+    data = load_data(guild_id)
+    arquivado = historico_arquivado(data)
+    deslocamento = arquivado['total']
     
-    if not data['historico']:
-        await interaction.response.send_message("📜 Ainda não há histórico de vencedores!", ephemeral=True)
-        return
+    registros = []
+    for posicao in posicoes:
+        if posicao >= deslocamento:
+            registros.append((posicao, data['historico'][posicao - deslocamento]))
+            continue
+        for ano, (inicio, fim) in arquivado['anos'].items():
+            if inicio <= posicao < fim:
+                registro = (await carregar_ano_arquivado(guild_id, arquivado, ano)).get(posicao)
+                if registro is not None:
+                    registros.append((posicao, registro))
+                break
+    return registros
+
+async def pagina_historico(guild_id, user_id, ano, pagina, filtro):
+    """Embed de uma página do /historico (mais recentes primeiro)"""
+    posicoes, total = await consultar_historico(guild_id, user_id, ano, minimo=(pagina + 1) * REGISTROS_POR_PAGINA)
+    total_paginas = max(1, -(-total // REGISTROS_POR_PAGINA))
+    fim = len(posicoes) - pagina * REGISTROS_POR_PAGINA
     
     embed = discord.Embed(
         title="📜 Histórico do Multiverso",
-        description="Vencedores anteriores:",
+        description=f"Vencedores anteriores{filtro}:",
         color=0xE67E22
     )
     
-    for i, registro in enumerate(reversed(data['historico'][-10:]), 1):
+    pagina_atual = posicoes[max(0, fim - REGISTROS_POR_PAGINA):max(0, fim)]
+    for posicao, registro in reversed(await registros_do_historico(guild_id, pagina_atual)):
         data_formatada = datetime.fromisoformat(registro['data']).strftime('%d/%m/%Y')
         
         embed.add_field(
-            name=f"#{len(data['historico']) - i + 1} - {registro['apelido']}",
+            name=f"#{posicao + 1} - {registro['apelido']}",
             value=(
                 f"Apelido: `{registro['apelido']}`\n"
                 f"Data: {data_formatada}\n"
@@ -441,10 +3472,279 @@ async def historico(interaction: discord.Interaction):
             inline=False
         )
     
-    embed.set_footer(text=f"Total de eleições: {len(data['historico'])}")
+    data = load_data(guild_id)
+    rodape = f"Total de eleições: {historico_arquivado(data)['total'] + len(data['historico'])}"
+    if filtro:
+        rodape += f" | Encontradas: {total}"
+    if total_paginas > 1:
+        rodape += f" | Página {pagina + 1}/{total_paginas}"
+    embed.set_footer(text=rodape)
+    return embed
+
+guilds_arquivando = set()
+
+async def arquivar_historico(guild_id):
+    """Leva as eleições além das HISTORICO_QUENTE mais recentes para o arquivo anual.
+    
+    O arquivo é gravado antes do evento: se o bot cair no meio, as eleições
+    continuam no estado e são arquivadas de novo na próxima vez.
+    """
+    data = load_data(guild_id)
+    excesso = len(data['historico']) - HISTORICO_QUENTE
+    if excesso <= 0 or guild_id in guilds_arquivando:
+        return
+    
+    guilds_arquivando.add(guild_id)
+    try:
+        inicio = historico_arquivado(data)['total']
+        grupos = {}
+        anos = {}
+        for posicao, registro in enumerate(data['historico'][:excesso], inicio):
+            ano = registro['data'][:4]
+            grupos.setdefault(ano, []).append(json.dumps({'n': posicao, 'registro': registro}, ensure_ascii=False) + '\n')
+            anos.setdefault(ano, [posicao, posicao + 1])[1] = posicao + 1
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor_disco, anexar_arquivo_historico, guild_id, grupos)
+        estado.registrar('historico_arquivado', guild_id, inicio=inicio, quantidade=excesso, anos=anos)
+        log.info(f"🗄️ [{guild_id}] {excesso} eleição(ões) antiga(s) movida(s) para o arquivo", extra={'guild_id': guild_id})
+    except OSError as e:
+        log.error(f"❌ [{guild_id}] Erro ao arquivar o histórico: {e}", extra={'guild_id': guild_id})
+    finally:
+        guilds_arquivando.discard(guild_id)
+
+def arquivar_historico_em_segundo_plano(guild_id):
+    tarefa = asyncio.create_task(arquivar_historico(guild_id))
+    tarefas_em_segundo_plano.add(tarefa)
+    tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+
+async def arquivar_historicos():
+    """Arquiva o histórico antigo de todos os servidores (na inicialização)"""
+    for guild_id, _ in estado.guilds():
+        await arquivar_historico(guild_id)
+
+@bot.tree.command(name="historico", description="Mostra o histórico de vencedores do Multiverso")
+@app_commands.guild_only()
+@app_commands.describe(
+    usuario="Mostra apenas as vitórias deste membro",
+    ano="Mostra apenas as eleições deste ano"
+)
+async def historico(
+    interaction: discord.Interaction,
+    usuario: discord.Member = None,
+    ano: app_commands.Range[int, 2000, 2100] = None
+):
+    """Mostra o histórico de vencedores do Multiverso, em páginas e com filtros"""
+    guild_id = interaction.guild_id
+    
+    if not (await consultar_historico(guild_id))[1]:
+        await interaction.response.send_message("📜 Ainda não há histórico de vencedores!", ephemeral=True)
+        return
+    
+    user_id = str(usuario.id) if usuario else None
+    _, total = await consultar_historico(guild_id, user_id, ano, minimo=REGISTROS_POR_PAGINA)
+    
+    if not total:
+        await interaction.response.send_message("📜 Nenhuma eleição encontrada com esses filtros!", ephemeral=True)
+        return
+    
+    filtro = ""
+    if usuario:
+        filtro += f" de {usuario.display_name}"
+    if ano:
+        filtro += f" em {ano}"
+    
+    embed = await pagina_historico(guild_id, user_id, ano, 0, filtro)
+    
+    if total <= REGISTROS_POR_PAGINA:
+        await interaction.response.send_message(embed=embed)
+        return
+    
+    # A cada clique a consulta é refeita: o índice está em memória e os anos
+    # do arquivo só são abertos quando a página pedida chega neles
+    async def contar():
+        _, total = await consultar_historico(guild_id, user_id, ano)
+        return max(1, -(-total // REGISTROS_POR_PAGINA))
+    
+    view = Paginacao(
+        interaction,
+        contar,
+        lambda pagina: pagina_historico(guild_id, user_id, ano, pagina, filtro)
+    )
+    await interaction.response.send_message(embed=embed, view=view)
+
+@bot.tree.command(name="estatisticas", description="Mostra as estatísticas das eleições do Multiverso")
+@app_commands.guild_only()
+async def estatisticas(interaction: discord.Interaction):
+    """Mostra os agregados do histórico, mantidos a cada nova eleição"""
+    data = load_data(interaction.guild_id)
+    totais = estatisticas_do_historico(data)
+    
+    if not totais['eleicoes']:
+        await interaction.response.send_message("📊 Ainda não há eleições para mostrar estatísticas!", ephemeral=True)
+        return
+    
+    media = totais['votos_total'] / totais['com_votos'] if totais['com_votos'] else 0
+    manuais = totais['eleicoes'] - totais['automaticas']
+    
+    embed = discord.Embed(
+        title="📊 Estatísticas do Multiverso",
+        description=(
+            f"🗳️ **Eleições:** {totais['eleicoes']} ({totais['automaticas']} automáticas, {manuais} manuais)\n"
+            f"✅ **Votos nos vencedores:** {totais['votos_total']} (média de {media:.1f} por eleição)"
+        ),
+        color=0xE67E22
+    )
+    
+    ranking = sorted(totais['vitorias'].items(), key=lambda item: -item[1])[:5]
+    embed.add_field(
+        name="🏆 Mais vitórias",
+        value="\n".join(f"{i}. <@{user_id}> - {vitorias}" for i, (user_id, vitorias) in enumerate(ranking, 1)),
+        inline=False
+    )
+    
+    recorde = totais['recorde_votos']
+    if recorde:
+        data_recorde = datetime.fromisoformat(recorde['data']).strftime('%d/%m/%Y')
+        embed.add_field(
+            name="🔥 Recorde de votos",
+            value=f"`{recorde['apelido']}` (<@{recorde['user_id']}>) com {recorde['votos']} votos em {data_recorde}",
+            inline=False
+        )
+    
+    maior = totais['maior_sequencia']
+    if maior and maior['tamanho'] > 1:
+        embed.add_field(
+            name="📈 Maior sequência de vitórias",
+            value=f"<@{maior['user_id']}> - {maior['tamanho']} seguidas",
+            inline=False
+        )
     
     await interaction.response.send_message(embed=embed)
 
+def medidores_rollout():
+    """Ritmo, progresso e ETA dos rollouts em andamento, para a exportação"""
+    medidores = []
+    for guild_id, rollout in rollouts_ativos.items():
+        rotulos = {'guild': guild_id}
+        medidores.append(('rollout_edicoes_por_segundo', rotulos, round(rollout.edicoes_por_segundo, 3)))
+        medidores.append(('rollout_processados', rotulos, rollout.processados))
+        if rollout.eta is not None:
+            medidores.append(('rollout_eta_segundos', rotulos, round(rollout.eta)))
+    return medidores
+
+def formatar_segundos(segundos):
+    if segundos < 1:
+        return f"{segundos * 1000:.0f}ms"
+    if segundos < 120:
+        return f"{segundos:.1f}s"
+    return str(timedelta(seconds=round(segundos)))
+
+def linha_histograma(rotulo, histograma):
+    return (
+        f"`{rotulo}` {histograma.contagem}x · p50 ≤ {formatar_segundos(histograma.quantil(0.5))} · "
+        f"p95 ≤ {formatar_segundos(histograma.quantil(0.95))} · máx {formatar_segundos(histograma.maximo)}"
+    )
+
+@bot.tree.command(name="metricas", description="Mostra as métricas de desempenho do bot (apenas o dono)")
+async def metricas_slash(interaction: discord.Interaction):
+    """Latência dos comandos, tempo de disco, chamadas à API e ritmo dos rollouts"""
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("❌ Apenas o dono do bot pode ver as métricas!", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="📈 Métricas do Multiverso", color=discord.Color.blue())
+    
+    comandos = sorted(metricas.por_rotulo('comando_segundos', metricas.histogramas), key=lambda item: -item[1].contagem)
+    erros = sum(valor for _, valor in metricas.por_rotulo('comando_erros', metricas.contadores))
+    embed.add_field(
+        name=f"⌨️ Comandos (erros: {erros})",
+        value="\n".join(linha_histograma(*item) for item in comandos[:10]) or "Nenhum comando executado",
+        inline=False
+    )
+    
+    disco = sorted(metricas.por_rotulo('estado_segundos', metricas.histogramas))
+    embed.add_field(
+        name="💾 Dados",
+        value="\n".join(linha_histograma(*item) for item in disco) or "Nenhuma leitura/gravação",
+        inline=False
+    )
+    
+    chamadas = dict(metricas.por_rotulo('rest_requisicoes', metricas.contadores))
+    limites = dict(metricas.por_rotulo('rest_429', metricas.contadores))
+    rotas = sorted(chamadas, key=lambda rota: -chamadas[rota])[:8]
+    embed.add_field(
+        name=f"🌐 API ({sum(chamadas.values())} chamadas, {sum(limites.values())} × 429)",
+        value="\n".join(f"`{rota}` {chamadas[rota]}" + (f" · ⚠️ {limites[rota]} × 429" if rota in limites else "") for rota in rotas)
+        or "Nenhuma chamada",
+        inline=False
+    )
+    
+    tarefas = sorted(metricas.por_rotulo('tarefa_segundos', metricas.histogramas))
+    if tarefas:
+        embed.add_field(
+            name="📋 Tarefas em segundo plano",
+            value="\n".join(linha_histograma(*item) for item in tarefas),
+            inline=False
+        )
+    
+    for guild_id, rollout in rollouts_ativos.items():
+        eta = rollout.eta
+        embed.add_field(
+            name=f"🔄 Rollout em {rollout.guild.name}",
+            value=(
+                f"{rollout.processados}/{rollout.guild.member_count or '?'} membros · "
+                f"{rollout.edicoes_por_segundo:.1f} apelidos/s · falhas: {rollout.falhas} · "
+                f"ETA: {formatar_segundos(eta) if eta is not None else 'calculando...'}"
+            ),
+            inline=False
+        )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def gravar_metricas(conteudo):
+    temporario = ARQUIVO_METRICAS + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+    os.replace(temporario, ARQUIVO_METRICAS)
+
+async def exportar_metricas_em_arquivo():
+    """Reescreve o arquivo de métricas a cada INTERVALO_METRICAS segundos"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INTERVALO_METRICAS)
+        try:
+            await loop.run_in_executor(executor_disco, gravar_metricas, metricas.texto_prometheus(medidores_rollout()))
+        except OSError as e:
+            log.error(f"❌ Erro ao exportar métricas: {e}")
+
+servidor_metricas = None
+
+async def servir_metricas():
+    """Servidor HTTP local com as métricas em /metrics (para o Prometheus coletar)"""
+    global servidor_metricas
+    from aiohttp import web
+    
+    async def responder(request):
+        return web.Response(text=metricas.texto_prometheus(medidores_rollout()), content_type='text/plain')
+    
+    app = web.Application()
+    app.router.add_get('/metrics', responder)
+    servidor_metricas = web.AppRunner(app)
+    await servidor_metricas.setup()
+    await web.TCPSite(servidor_metricas, '127.0.0.1', int(PORTA_METRICAS)).start()
+    log.info(f"📈 Métricas em http://127.0.0.1:{PORTA_METRICAS}/metrics")
+
+def iniciar_exportacao_metricas():
+    if ARQUIVO_METRICAS:
+        tarefa = asyncio.create_task(exportar_metricas_em_arquivo())
+        tarefas_em_segundo_plano.add(tarefa)
+        tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+    if PORTA_METRICAS:
+        tarefa = asyncio.create_task(servir_metricas())
+        tarefas_em_segundo_plano.add(tarefa)
+        tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+
 @bot.tree.command(name="help", description="Mostra o guia completo do Multiverso Bot")
 async def help_slash(interaction: discord.Interaction):
     """Menu de ajuda completo do Multiverso Bot"""
@@ -478,7 +3778,8 @@ async def help_slash(interaction: discord.Interaction):
         name="🗳️ VOTAÇÃO (Apenas Admin)",
         value=(
             "`/multiverso` - Inicia votação manual\n"
-            "`/finalizar` - Encerra e aplica resultado\n"
+            "`/finalizar` - Encerra e aplica resultado (em segundo plano)\n"
+            "`/finalizar simulacao:True` - Mostra o plano sem alterar nada\n"
         ),
         inline=False
     )
@@ -486,8 +3787,12 @@ async def help_slash(interaction: discord.Interaction):
     embed.add_field(
         name="📊 CONSULTA (Todos podem usar)",
         value=(
-            "`/historico` - Vencedores anteriores\n"
+            "`/parcial` - Resultado parcial da votação ativa\n"
+            "`/historico` - Vencedores anteriores (filtre por membro ou ano)\n"
+            "`/estatisticas` - Vitórias, votos e recordes\n"
+            "`/status` - Tarefas em andamento e recentes\n"
             "`/help` - Este menu de ajuda\n"
+            "`/metricas` - Desempenho do bot (apenas o dono)\n"
         ),
         inline=False
     )
@@ -497,6 +3802,8 @@ async def help_slash(interaction: discord.Interaction):
         value=(
             "`/resetar` - ⚠️ Reseta TODO o sistema\n"
             "`/resetar_escolhidos` - Reseta lista de escolhidos\n"
+            "`/configurar` - Canal, dia, hora e duração da votação automática\n"
+            "`/restaurar` - Devolve os apelidos de antes de um rollout\n"
         ),
         inline=False
     )
@@ -504,8 +3811,8 @@ async def help_slash(interaction: discord.Interaction):
     embed.add_field(
         name="⏰ SISTEMA AUTOMÁTICO",
         value=(
-            "✅ Votação inicia todo dia 1 às 00:00 UTC\n"
-            "✅ Duração: 24 horas\n"
+            "✅ Votação inicia todo mês (padrão: dia 1 às 03:00 UTC)\n"
+            "✅ Duração: 24 horas (ajustável com `/configurar`)\n"
             "✅ Encerramento automático\n"
             "✅ Rodízio inteligente (todos participam!)\n"
         ),
@@ -517,8 +3824,8 @@ async def help_slash(interaction: discord.Interaction):
         value=(
             "• Cargo do bot deve estar **acima** dos outros\n"
             "• Bot precisa de permissão **Gerenciar Apelidos**\n"
-            "• Máximo de 10 candidatos por votação\n"
-            "• Configure `CANAL_VOTACAO_ID` no .env para automação\n"
+            "• Mais de 10 candidatos: votação em grupos + final\n"
+            "• Use `/configurar` para escolher o canal da votação automática\n"
         ),
         inline=False
     )
@@ -532,64 +3839,264 @@ async def help_slash(interaction: discord.Interaction):
 # SISTEMA DE AGENDAMENTO AUTOMÁTICO
 # ============================================
 
-@tasks.loop(time=time(hour=3, minute=0))  # Roda 1x por dia às 3:00 AM UTC
-async def iniciar_votacao_automatica():
-    """Verifica diariamente às 3 AM se é dia 1 do mês para iniciar votação"""
-    now = datetime.utcnow()
+def canal_votacao_id(guild):
+    """Canal da votação automática: o configurado no servidor ou o CANAL_VOTACAO_ID do .env"""
+    config = load_data(guild.id)['config']
+    if config.get('canal_votacao_id'):
+        return config['canal_votacao_id']
+    
+    canal_env = os.getenv('CANAL_VOTACAO_ID')
+    if canal_env and guild.get_channel(int(canal_env)):
+        return int(canal_env)
+    return None
+
+def atribuir_dados_legados():
+    """Descobre a qual servidor pertencem os dados de antes do suporte a vários servidores"""
+    legado = estado.carregar()['guilds'].get(GUILD_LEGADO)
+    if legado is None:
+        return
+    
+    guild = None
+    for canal_id in (legado.get('poll_channel_id'), os.getenv('CANAL_VOTACAO_ID')):
+        canal = bot.get_channel(int(canal_id)) if canal_id else None
+        if canal is not None:
+            guild = canal.guild
+            break
+    
+    if guild is None and len(bot.guilds) == 1:
+        guild = bot.guilds[0]
     
-    # Verifica se é dia 1 do mês
-    if now.day != 1:
-        print(f"⏰ Verificação diária às 3 AM - Hoje é dia {now.day}, aguardando dia 1...")
+    if guild is None:
+        log.warning(f"⚠️ Não foi possível descobrir o servidor dos dados antigos. Configure CANAL_VOTACAO_ID no .env")
         return
     
-    print(f"📅 Dia 1 detectado! Iniciando votação automática...")
+    existente = estado.carregar()['guilds'].get(str(guild.id))
+    if existente and (existente['participantes'] or existente['historico']):
+        log.warning(f"⚠️ {guild.name} já tem dados próprios; dados antigos mantidos à parte")
+        return
+    
+    estado.registrar('guild_legada_atribuida', guild.id)
+    log.info(f"📦 Dados antigos atribuídos ao servidor {guild.name}")
+
+# O temporizador do agendador acorda pelo menos uma vez por hora para conferir o relógio do sistema
+ESPERA_MAXIMA_AGENDADOR = 3600
+
+# Segundos até a nova tentativa de um encerramento automático que falhou (dobra a cada
+# falha seguida, até ESPERA_MAXIMA_AGENDADOR)
+ESPERA_RETENTATIVA = 60
+
+# Janela (em segundos) para espalhar as aberturas de votação de servidores com o mesmo dia/hora
+JANELA_ESCALONAMENTO = int(os.getenv('MULTIVERSO_ESCALONAMENTO', '300'))
+
+class Agendador:
+    """Fila de prioridade (heap) com o próximo horário de cada tarefa agendada.
+    
+    Só existe um temporizador no event loop, armado para a tarefa mais próxima.
+    Reagendar uma tarefa apenas empilha a nova entrada e marca a antiga como
+    cancelada; entradas canceladas são descartadas quando chegam ao topo.
+    Os horários são datetimes UTC do relógio do sistema, então o temporizador
+    nunca dorme mais que ESPERA_MAXIMA_AGENDADOR sem conferir o relógio.
+    """
+    
+    def __init__(self):
+        self._heap = []
+        # chave -> entrada [quando, ordem, chave, funcao, args]; funcao None = cancelada
+        self._tarefas = {}
+        self._ordem = itertools.count()
+        self._temporizador = None
+    
+    @property
+    def pendentes(self):
+        return len(self._tarefas)
+    
+    def proximo(self, chave):
+        """Horário agendado da tarefa, ou None"""
+        entrada = self._tarefas.get(chave)
+        return entrada[0] if entrada else None
+    
+    def agendar(self, chave, quando, funcao, *args):
+        """Agenda `funcao(*args)` para `quando`, substituindo a tarefa de mesma chave"""
+        self.cancelar(chave)
+        entrada = [quando, next(self._ordem), chave, funcao, args]
+        self._tarefas[chave] = entrada
+        heapq.heappush(self._heap, entrada)
+        if self._heap[0] is entrada:
+            self._armar()
+    
+    def cancelar(self, chave):
+        entrada = self._tarefas.pop(chave, None)
+        if entrada is not None:
+            entrada[3] = None
+    
+    def _armar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        
+        while self._heap and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+        
+        espera = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+        espera = min(max(espera, 0.0), ESPERA_MAXIMA_AGENDADOR)
+        self._temporizador = asyncio.get_running_loop().call_later(espera, self._disparar)
+    
+    def _disparar(self):
+        self._temporizador = None
+        agora = datetime.utcnow()
+        while self._heap and self._heap[0][0] <= agora:
+            quando, _, chave, funcao, args = heapq.heappop(self._heap)
+            if funcao is None:
+                continue
+            del self._tarefas[chave]
+            try:
+                funcao(*args)
+            except Exception as e:
+                log.error(f"❌ Erro na tarefa agendada {chave}: {e}", exc_info=True)
+        self._armar()
+
+agendador = Agendador()
+
+def proximo_horario(config, depois):
+    """Primeiro dia/hora configurado (UTC) estritamente depois de `depois`"""
+    horario = depois.replace(day=config['dia'], hour=config['hora'], minute=0, second=0, microsecond=0)
+    if horario <= depois:
+        ano, mes = (depois.year + 1, 1) if depois.month == 12 else (depois.year, depois.month + 1)
+        horario = horario.replace(year=ano, month=mes)
+    return horario
+
+def horario_anterior(config, ate):
+    """Último dia/hora configurado (UTC) até `ate`, inclusive"""
+    horario = ate.replace(day=config['dia'], hour=config['hora'], minute=0, second=0, microsecond=0)
+    if horario > ate:
+        ano, mes = (ate.year - 1, 12) if ate.month == 1 else (ate.year, ate.month - 1)
+        horario = horario.replace(year=ano, month=mes)
+    return horario
+
+def escalonamento(guild_id):
+    """Atraso fixo de cada servidor dentro da janela, para não abrirem todos no mesmo instante"""
+    if JANELA_ESCALONAMENTO <= 0:
+        return timedelta(0)
+    return timedelta(seconds=zlib.crc32(str(guild_id).encode()) % JANELA_ESCALONAMENTO)
+
+def marcar_agenda(guild_id, horario):
+    """Anota que o horário de abertura `horario` (e todos os anteriores) já foi tratado"""
+    estado.registrar('agenda_executada', guild_id, tarefa='abrir_votacao', horario=horario.isoformat())
+
+def agendar_abertura(guild_id, recuperar=False):
+    """Agenda a próxima abertura automática de votação do servidor.
+    
+    Com `recuperar`, um horário que passou enquanto o bot estava desligado
+    é executado agora (só o mais recente, mesmo que vários meses tenham passado).
+    """
+    config = load_data(guild_id)['config']
+    agora = datetime.utcnow()
+    chave = ('abrir_votacao', guild_id)
+    ultimo = load_data(guild_id).get('agenda', {}).get('abrir_votacao')
+    
+    if ultimo is None:
+        # Servidor novo: nada a recuperar, começa a contar a partir de agora
+        marcar_agenda(guild_id, horario_anterior(config, agora))
+    elif recuperar:
+        perdido = horario_anterior(config, agora)
+        if datetime.fromisoformat(ultimo) < perdido:
+            log.info(f"⏪ [{guild_id}] Votação de {perdido} não foi aberta (bot desligado). Abrindo agora...", extra={'guild_id': guild_id})
+            agendador.agendar(chave, agora + escalonamento(guild_id), disparar_abertura, guild_id, perdido)
+            return
+    
+    horario = proximo_horario(config, agora)
+    agendador.agendar(chave, horario + escalonamento(guild_id), disparar_abertura, guild_id, horario)
+
+def armar_agenda():
+    """Monta a fila do agendador a partir dos dados salvos (ao iniciar o bot)"""
+    for guild in bot.guilds:
+        agendar_abertura(guild.id, recuperar=True)
+    for guild_id, data in estado.guilds():
+        if data.get('poll_message_id'):
+            agendar_encerramento(guild_id)
+        if data.get('chaveamento'):
+            agendar_fim_rodada(guild_id)
+
+def disparar_abertura(guild_id, horario):
+    """Tarefa agendada: abre a votação mensal do servidor e agenda a do próximo mês"""
+    marcar_agenda(guild_id, horario)
+    agendar_abertura(guild_id)
+    
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return
     
-    data = load_data()
+    log.info(f"📅 [{guild.name}] Iniciando votação automática...", extra={'guild_id': guild.id})
+    tarefa = asyncio.create_task(abrir_votacao_em_segundo_plano(guild))
+    tarefas_em_segundo_plano.add(tarefa)
+    tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+
+async def abrir_votacao_em_segundo_plano(guild):
+    try:
+        await iniciar_votacao_guild(guild)
+    except Exception as e:
+        log.error(f"❌ [{guild.name}] Erro ao iniciar votação automática: {e}", extra={'guild_id': guild.id}, exc_info=True)
+
+@bot.event
+async def on_guild_join(guild):
+    agendar_abertura(guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    agendador.cancelar(('abrir_votacao', guild.id))
+    agendador.cancelar(('encerrar_votacao', guild.id))
+    agendador.cancelar(('encerrar_rodada', guild.id))
+
+async def iniciar_votacao_guild(guild):
+    """Inicia a votação mensal automática de um servidor"""
+    data = load_data(guild.id)
+    config = data['config']
     
-    if data.get('poll_message_id'):
-        print(f"⚠️ Já existe uma votação ativa. Pulando...")
+    if votacao_em_andamento(data):
+        log.warning(f"⚠️ [{guild.name}] Já existe uma votação ativa. Pulando...", extra={'guild_id': guild.id})
         return
     
-    canal_id = os.getenv('CANAL_VOTACAO_ID')
+    canal_id = canal_votacao_id(guild)
     
     if not canal_id:
-        print(f"❌ CANAL_VOTACAO_ID não configurado no .env!")
+        log.error(f"❌ [{guild.name}] Canal de votação não configurado! Use /configurar", extra={'guild_id': guild.id})
         return
     
-    canal = bot.get_channel(int(canal_id))
+    canal = bot.get_channel(canal_id)
     
     if not canal:
-        print(f"❌ Canal de votação não encontrado!")
+        log.error(f"❌ [{guild.name}] Canal de votação não encontrado!", extra={'guild_id': guild.id})
         return
     
     if not data['participantes']:
-        print(f"⚠️ Sem participantes cadastrados. Votação cancelada.")
+        log.warning(f"⚠️ [{guild.name}] Sem participantes cadastrados. Votação cancelada.", extra={'guild_id': guild.id})
         return
     
-    if len(data['ja_escolhidos']) >= len(data['participantes']):
-        print(f"🔄 Todos já foram escolhidos! Resetando lista...")
-    if len(data['ja_escolhidos']) >= len(data['participantes']):
-        print(f"🔄 Todos já foram escolhidos! Resetando lista...")
-        data['ja_escolhidos'] = []
-        save_data(data)
+    if rodizio_da_guild(guild.id).esgotado:
+        log.info(f"🔄 [{guild.name}] Todos já foram escolhidos! Resetando lista...", extra={'guild_id': guild.id})
+        estado.registrar('escolhidos_resetados', guild.id)
     
-    candidatos = {
-        user_id: info 
-        for user_id, info in data['participantes'].items() 
-        if user_id not in data['ja_escolhidos']
-    }
+    candidatos_lista = candidatos_da_votacao(guild.id)
     
-    if not candidatos:
-        print(f"❌ Nenhum candidato disponível!")
+    if not candidatos_lista:
+        log.error(f"❌ [{guild.name}] Nenhum candidato disponível!", extra={'guild_id': guild.id})
         return
     
-    candidatos_lista = list(candidatos.items())[:10]
+    duracao_horas = config['duracao_horas']
+    
+    if len(candidatos_lista) > MAX_OPCOES_ENQUETE:
+        try:
+            await iniciar_chaveamento(guild, canal, candidatos_lista, duracao_horas, automatico=True)
+        except Exception as e:
+            log.error(f"❌ [{guild.name}] Erro ao iniciar chaveamento automático: {e}", extra={'guild_id': guild.id})
+        return
     
     pergunta = "🌌 VOTAÇÃO MENSAL DO MULTIVERSO - Quem será o próximo escolhido?"
     
     poll = discord.Poll(
         question=discord.PollMedia(text=pergunta),
-        duration=timedelta(hours=24)
+        duration=timedelta(hours=duracao_horas)
     )
     
     for user_id, info in candidatos_lista:
@@ -599,9 +4106,9 @@ async def iniciar_votacao_automatica():
     embed = discord.Embed(
         title="🎉 VOTAÇÃO MENSAL AUTOMÁTICA INICIADA!",
         description=(
-            "**🗓️ É DIA 1! Hora da votação mensal!**\n\n"
+            f"**🗓️ É DIA {config['dia']}! Hora da votação mensal!**\n\n"
             "O vencedor terá seu apelido aplicado a **TODOS** do servidor!\n\n"
-            "⏰ **Duração:** 24 horas (encerramento automático)\n"
+            f"⏰ **Duração:** {duracao_horas} horas (encerramento automático)\n"
             "🗳️ **Vote na enquete abaixo!**\n"
         ),
         color=0xFF00FF
@@ -614,100 +4121,149 @@ async def iniciar_votacao_automatica():
             inline=False
         )
     
-    fim_votacao = datetime.utcnow() + timedelta(hours=24)
-    embed.set_footer(text=f"Sistema automático • Encerra em 24h")
+    fim_votacao = datetime.utcnow() + timedelta(hours=duracao_horas)
+    embed.set_footer(text=f"Sistema automático • Encerra em {duracao_horas}h")
     embed.timestamp = fim_votacao
     
     try:
         await canal.send(embed=embed)
         message = await canal.send(poll=poll)
         
-        data['poll_message_id'] = message.id
-        data['poll_channel_id'] = canal.id
-        data['poll_candidatos'] = candidatos_lista
-        data['poll_inicio'] = datetime.utcnow().isoformat()
-        data['poll_fim_programado'] = fim_votacao.isoformat()
-        
-        save_data(data)
+        estado.registrar(
+            'votacao_iniciada',
+            guild.id,
+            message_id=message.id,
+            channel_id=canal.id,
+            candidatos=candidatos_lista,
+            inicio=datetime.utcnow().isoformat(),
+            fim_programado=fim_votacao.isoformat()
+        )
+        agendar_encerramento(guild.id)
         
-        print(f"✅ Votação automática iniciada com sucesso!")
-        print(f"📊 Candidatos: {len(candidatos_lista)}")
-        print(f"⏰ Encerramento programado: {fim_votacao}")
+        log.info(f"✅ [{guild.name}] Votação automática iniciada com sucesso!", extra={'guild_id': guild.id})
+        log.info(f"📊 [{guild.name}] Candidatos: {len(candidatos_lista)}", extra={'guild_id': guild.id})
+        log.info(f"⏰ [{guild.name}] Encerramento programado: {fim_votacao}", extra={'guild_id': guild.id})
         
     except Exception as e:
-        print(f"❌ Erro ao iniciar votação automática: {e}")
+        log.error(f"❌ [{guild.name}] Erro ao iniciar votação automática: {e}", extra={'guild_id': guild.id}, exc_info=True)
+
+# Servidores com tarefas executando ou na fila (o rollout pode levar horas)
+guilds_finalizando = set()
 
-@tasks.loop(minutes=5)
-async def verificar_votacao():
-    """Verifica a cada 5 minutos se há votação que precisa ser encerrada"""
-    data = load_data()
+# Referências das tarefas em segundo plano, para não serem coletadas antes de terminar
+tarefas_em_segundo_plano = set()
+
+def espera_retentativa(tentativa):
+    """Quanto esperar antes de tentar de novo um encerramento que falhou `tentativa` vezes"""
+    return timedelta(seconds=min(ESPERA_RETENTATIVA * 2 ** tentativa, ESPERA_MAXIMA_AGENDADOR))
+
+def agendar_encerramento(guild_id, quando=None, tentativa=0):
+    """Agenda o encerramento da votação do servidor para o horário exato do fim.
     
-    if not data.get('poll_message_id'):
+    Substitui o agendamento anterior, então pode ser chamado de novo sem problema.
+    Sem votação ativa, apenas cancela o que houver. `tentativa` conta as falhas
+    seguidas do encerramento automático, para a espera da próxima crescer.
+    """
+    cancelar_encerramento(guild_id)
+    data = load_data(guild_id)
+    if not data.get('poll_message_id') or not data.get('poll_fim_programado'):
         return
     
-    if not data.get('poll_fim_programado'):
+    if quando is None:
+        quando = datetime.fromisoformat(data['poll_fim_programado'])
+    agendador.agendar(
+        ('encerrar_votacao', guild_id), quando, disparar_encerramento, guild_id, data['poll_message_id'], tentativa
+    )
+
+def cancelar_encerramento(guild_id):
+    agendador.cancelar(('encerrar_votacao', guild_id))
+
+def disparar_encerramento(guild_id, message_id, tentativa):
+    """Tarefa agendada: encerra a votação no horário programado"""
+    data = load_data(guild_id)
+    if data.get('poll_message_id') != message_id:
+        # A votação já foi encerrada (ex: /finalizar) ou substituída
         return
     
-    fim_programado = datetime.fromisoformat(data['poll_fim_programado'])
-    agora = datetime.utcnow()
-    
-    if agora < fim_programado:
+    # Uma /finalizar já na fila encerra esta mesma votação; se ela falhar, o
+    # agendador confere de novo mais tarde
+    if fila_do_servidor(guild_id).procurar('finalizacao') is not None:
+        agendar_encerramento(guild_id, quando=datetime.utcnow() + espera_retentativa(tentativa), tentativa=tentativa)
         return
     
-    print(f"⏰ Horário de encerramento atingido! Finalizando votação...")
+    # Cada servidor tem sua própria fila, então um não espera o outro
+    enviar_tarefa(
+        guild_id, 'finalizacao', "Encerramento automático da votação",
+        encerrar_votacao_automatica, guild_id, message_id, tentativa
+    )
+
+async def encerrar_votacao_automatica(guild_id, message_id, tentativa):
+    """Encerramento pelo agendador: se falhar com a votação ainda ativa, agenda outra tentativa"""
+    try:
+        return await encerrar_votacao_guild(guild_id, message_id)
+    except Exception as e:
+        if load_data(guild_id).get('poll_message_id') == message_id:
+            espera = espera_retentativa(tentativa)
+            log.warning(
+                f"🔁 [{guild_id}] Encerramento automático falhou ({e}); "
+                f"nova tentativa em {formatar_segundos(espera.total_seconds())}",
+                extra={'guild_id': guild_id}
+            )
+            agendar_encerramento(guild_id, quando=datetime.utcnow() + espera, tentativa=tentativa + 1)
+        raise
+
+async def encerrar_votacao_guild(guild_id, message_id, autor=None):
+    """Encerra a votação de um servidor e aplica o apelido vencedor.
+    
+    `autor` é quem usou /finalizar; sem ele, é o encerramento automático.
+    Devolve o resumo mostrado no /status.
+    """
+    data = load_data(guild_id)
+    if data.get('poll_message_id') != message_id:
+        # Outra tarefa da fila já encerrou esta votação
+        return "A votação já tinha sido encerrada"
+    automatico = autor is None
+    
+    if automatico:
+        log.info(f"⏰ [{guild_id}] Horário de encerramento atingido! Finalizando votação...", extra={'guild_id': guild_id})
     
     canal = bot.get_channel(data['poll_channel_id'])
     
     if not canal:
-        print(f"❌ Canal não encontrado!")
-        return
+        log.error(f"❌ [{guild_id}] Canal não encontrado!", extra={'guild_id': guild_id})
+        raise FalhaTarefa("Canal da votação não encontrado")
     
     try:
-        message = await canal.fetch_message(data['poll_message_id'])
-    except:
-        print(f"❌ Mensagem não encontrada!")
-        data['poll_message_id'] = None
-        save_data(data)
-        return
+        message = await encerrar_enquete(canal, message_id)
+    except (discord.NotFound, discord.Forbidden):
+        log.error(f"❌ [{guild_id}] Mensagem não encontrada!", extra={'guild_id': guild_id})
+        estado.registrar('votacao_cancelada', guild_id, motivo='mensagem_nao_encontrada')
+        raise FalhaTarefa("Mensagem da votação não encontrada; votação cancelada")
+    except discord.HTTPException as e:
+        log.error(f"❌ [{guild_id}] Erro ao finalizar enquete: {e}", extra={'guild_id': guild_id})
+        raise FalhaTarefa(f"Erro ao encerrar a enquete: {e}")
     
     if not message.poll:
-        print(f"❌ Mensagem não tem enquete!")
-        data['poll_message_id'] = None
-        save_data(data)
-        return
-    
-    poll = message.poll
-    
-    if not poll.is_finalised():
-        try:
-            await message.poll.end()
-            await asyncio.sleep(2)
-            message = await canal.fetch_message(data['poll_message_id'])
-            poll = message.poll
-        except Exception as e:
-            print(f"❌ Erro ao finalizar enquete: {e}")
-            return
+        log.error(f"❌ [{guild_id}] Mensagem não tem enquete!", extra={'guild_id': guild_id})
+        estado.registrar('votacao_cancelada', guild_id, motivo='sem_enquete')
+        raise FalhaTarefa("A mensagem da votação não tem enquete; votação cancelada")
     
-    votos_por_opcao = {}
-    for answer in poll.answers:
-        votos_por_opcao[answer.id] = answer.vote_count
+    id_vencedor, total_votos = apurar(guild_id, message)[0]
     
-    if not votos_por_opcao or all(v == 0 for v in votos_por_opcao.values()):
-        print(f"❌ Nenhum voto registrado!")
+    if total_votos == 0:
+        log.error(f"❌ [{guild_id}] Nenhum voto registrado!", extra={'guild_id': guild_id})
+        if not automatico:
+            await canal.send("❌ Nenhum voto foi registrado!")
+            raise FalhaTarefa("Nenhum voto foi registrado")
         await canal.send("😢 A votação automática não teve nenhum voto. Cancelando...")
-        data['poll_message_id'] = None
-        data['poll_fim_programado'] = None
-        save_data(data)
-        return
-    
-    id_vencedor = max(votos_por_opcao, key=votos_por_opcao.get)
-    total_votos = votos_por_opcao[id_vencedor]
+        estado.registrar('votacao_cancelada', guild_id, motivo='sem_votos')
+        raise FalhaTarefa("Nenhum voto; votação cancelada")
     
     candidatos_lista = data['poll_candidatos']
     user_id_vencedor, info_vencedor = candidatos_lista[id_vencedor - 1]
     
     embed = discord.Embed(
-        title="🎉 VOTAÇÃO ENCERRADA AUTOMATICAMENTE! 🎉",
+        title="🎉 VOTAÇÃO ENCERRADA AUTOMATICAMENTE! 🎉" if automatico else "🎉 TEMOS UM VENCEDOR! 🎉",
         description=(
             f"\n"
             f"🏆 **Apelido vencedor:** `{info_vencedor['apelido']}`\n"
@@ -720,61 +4276,271 @@ async def verificar_votacao():
     await canal.send(embed=embed)
     
     guild = canal.guild
-    sucessos = 0
-    falhas = 0
-    
-    status_msg = await canal.send("🔄 Alterando apelidos...")
-    
-    for member in guild.members:
-        if member.bot:
-            continue
-        
-        try:
-            await member.edit(nick=info_vencedor['apelido'])
-            sucessos += 1
-            await asyncio.sleep(0.5)
-        except discord.Forbidden:
-            falhas += 1
-        except Exception as e:
-            print(f"Erro ao alterar apelido de {member.name}: {e}")
-            falhas += 1
     
-    data['ja_escolhidos'].append(user_id_vencedor)
-    data['atual_escolhido'] = user_id_vencedor
-    data['historico'].append({
+    registro = {
         'user_id': user_id_vencedor,
         'nome': info_vencedor['nome'],
         'apelido': info_vencedor['apelido'],
         'data': datetime.utcnow().isoformat(),
-        'votos': total_votos,
-        'automatico': True
-    })
+        'votos': total_votos
+    }
+    # Na final de um chaveamento manual, a eleição não é automática mesmo encerrando sozinha
+    eleicao_automatica = automatico and data.get('poll_automatico', True)
+    if eleicao_automatica:
+        registro['automatico'] = True
+    estado.registrar('vencedor_registrado', guild_id, autor=autor, user_id=user_id_vencedor, registro=registro)
+    registrar_rollout(guild, info_vencedor['apelido'], canal, automatico=eleicao_automatica)
+    cancelar_encerramento(guild_id)
+    arquivar_historico_em_segundo_plano(guild_id)
     
-    data['poll_message_id'] = None
-    data['poll_channel_id'] = None
-    data['poll_candidatos'] = []
-    data['poll_fim_programado'] = None
+    rollout = await iniciar_rollout(guild, canal, "🔄 Alterando apelidos...")
+    if rollout is None:
+        return resumir_rollout(rollout)
+    
+    log.info(
+        f"✅ [{guild.name}] Votação encerrada {'automaticamente' if automatico else 'com /finalizar'}!",
+        extra={'guild_id': guild.id}
+    )
+    log.info(f"👑 [{guild.name}] Vencedor: {info_vencedor['apelido']}", extra={'guild_id': guild.id})
+    log.info(
+        f"📊 [{guild.name}] Sucessos: {rollout.sucessos} | Ignorados: {rollout.ignorados} | "
+        f"Falhas: {rollout.falhas} | {rollout.edicoes_por_segundo:.1f} apelidos/s",
+        extra={
+            'guild_id': guild.id,
+            'sucessos': rollout.sucessos,
+            'ignorados': rollout.ignorados,
+            'falhas': rollout.falhas,
+            'apelidos_por_segundo': round(rollout.edicoes_por_segundo, 1)
+        }
+    )
+    return f"`{info_vencedor['apelido']}` venceu com {total_votos} votos · {resumir_rollout(rollout)}"
+
+# ============================================
+# CHAVEAMENTO (MAIS DE 10 CANDIDATOS)
+# ============================================
+
+# Limite de opções de uma enquete do Discord
+MAX_OPCOES_ENQUETE = 10
+
+def dividir_em_grupos(candidatos):
+    """Divide os candidatos em grupos equilibrados de até MAX_OPCOES_ENQUETE (um por enquete)"""
+    total_grupos = -(-len(candidatos) // MAX_OPCOES_ENQUETE)
+    return [candidatos[i::total_grupos] for i in range(total_grupos)]
+
+def vagas_por_grupo(total_grupos):
+    """Quantos de cada grupo avançam, de forma que a rodada seguinte caiba em poucas enquetes"""
+    return max(1, MAX_OPCOES_ENQUETE // total_grupos)
+
+def contar_rodadas(total_candidatos):
+    """Número de rodadas (grupos + final) necessárias para um total de candidatos"""
+    rodadas = 1
+    while total_candidatos > MAX_OPCOES_ENQUETE:
+        total_grupos = -(-total_candidatos // MAX_OPCOES_ENQUETE)
+        total_candidatos = total_grupos * vagas_por_grupo(total_grupos)
+        rodadas += 1
+    return rodadas
+
+def votacao_em_andamento(data):
+    return bool(data.get('poll_message_id') or data.get('chaveamento'))
+
+async def iniciar_chaveamento(guild, canal, candidatos, duracao_horas, automatico):
+    """Começa uma eleição em rodadas quando há mais candidatos do que cabem em uma enquete.
     
-    save_data(data)
+    A duração configurada é dividida entre as rodadas (mínimo de 1 hora cada).
+    """
+    total_rodadas = contar_rodadas(len(candidatos))
+    horas_por_rodada = max(1, duracao_horas // total_rodadas)
+    await iniciar_rodada(guild, canal, candidatos, 1, total_rodadas, horas_por_rodada, automatico)
+
+async def iniciar_rodada(guild, canal, candidatos, rodada, total_rodadas, duracao_horas, automatico):
+    """Publica uma enquete por grupo e agenda o fim da rodada"""
+    grupos = dividir_em_grupos(candidatos)
+    vagas = vagas_por_grupo(len(grupos))
+    fim_rodada = datetime.utcnow() + timedelta(hours=duracao_horas)
     
-    embed_final = discord.Embed(
-        title="✅ Multiverso Ativado Automaticamente!",
+    embed = discord.Embed(
+        title=f"🏟️ Chaveamento do Multiverso - Rodada {rodada} de {total_rodadas}",
         description=(
-            f"**{info_vencedor['apelido']}** agora reina sobre o multiverso!\n\n"
-            f"👑 Todos agora são: `{info_vencedor['apelido']}`\n\n"
-            f"**Estatísticas:**\n"
-            f"✅ Apelidos alterados: {sucessos}\n"
-            f"❌ Falhas: {falhas}\n\n"
-            f"🗓️ Próxima votação: Dia 1 do próximo mês"
+            f"São **{len(candidatos)}** candidatos, então a votação acontece em grupos!\n\n"
+            f"👥 **Grupos:** {len(grupos)} (uma enquete cada)\n"
+            f"⬆️ **Avançam:** os {vagas} mais votados de cada grupo\n"
+            f"⏰ **Duração:** {duracao_horas} horas\n"
+            "🗳️ **Vote em todos os grupos abaixo!**"
         ),
-        color=discord.Color.purple()
+        color=0xFF00FF
+    )
+    embed.timestamp = fim_rodada
+    await canal.send(embed=embed)
+    
+    enviados = []
+    for numero, grupo in enumerate(grupos, 1):
+        poll = discord.Poll(
+            question=discord.PollMedia(text=f"🌌 Grupo {numero} (rodada {rodada}) - Quem avança?"),
+            duration=timedelta(hours=duracao_horas)
+        )
+        for _, info in grupo:
+            poll.add_answer(text=info['apelido'][:55])
+        message = await canal.send(poll=poll)
+        enviados.append([message.id, grupo])
+    
+    estado.registrar(
+        'rodada_iniciada',
+        guild.id,
+        rodada=rodada,
+        total_rodadas=total_rodadas,
+        duracao_horas=duracao_horas,
+        vagas=vagas,
+        automatico=automatico,
+        channel_id=canal.id,
+        inicio=datetime.utcnow().isoformat(),
+        fim_programado=fim_rodada.isoformat(),
+        grupos=enviados
+    )
+    agendar_fim_rodada(guild.id)
+    log.info(f"🏟️ [{guild.name}] Rodada {rodada}/{total_rodadas}: {len(candidatos)} candidatos em {len(grupos)} grupos", extra={'guild_id': guild.id})
+
+async def iniciar_final(guild, canal, finalistas, duracao_horas, automatico):
+    """Publica a enquete final; daqui em diante segue o fluxo normal de votação.
+    
+    `automatico` vem do chaveamento: a eleição de um chaveamento iniciado com
+    /multiverso não conta como automática, mesmo que a final encerre sozinha.
+    """
+    fim_votacao = datetime.utcnow() + timedelta(hours=duracao_horas)
+    poll = discord.Poll(
+        question=discord.PollMedia(text="🏆 FINAL DO MULTIVERSO - Quem será o próximo escolhido?"),
+        duration=timedelta(hours=duracao_horas)
+    )
+    for _, info in finalistas:
+        poll.add_answer(text=info['apelido'][:55])
+    
+    embed = discord.Embed(
+        title="🏆 Final do Multiverso!",
+        description=(
+            f"**{len(finalistas)}** finalistas vieram dos grupos!\n\n"
+            "O vencedor terá seu apelido aplicado a **TODOS** do servidor!\n\n"
+            f"⏰ **Duração:** {duracao_horas} horas (encerramento automático)\n"
+            "🗳️ **Vote na enquete abaixo!**"
+        ),
+        color=0xFF00FF
+    )
+    embed.timestamp = fim_votacao
+    await canal.send(embed=embed)
+    message = await canal.send(poll=poll)
+    
+    estado.registrar(
+        'votacao_iniciada',
+        guild.id,
+        message_id=message.id,
+        channel_id=canal.id,
+        candidatos=finalistas,
+        inicio=datetime.utcnow().isoformat(),
+        fim_programado=fim_votacao.isoformat(),
+        automatico=automatico
+    )
+    estado.registrar('chaveamento_concluido', guild.id, motivo='final')
+    agendar_encerramento(guild.id)
+    log.info(f"🏆 [{guild.name}] Final iniciada com {len(finalistas)} finalistas", extra={'guild_id': guild.id})
+
+def agendar_fim_rodada(guild_id, quando=None, tentativa=0):
+    """Agenda o encerramento da rodada atual do chaveamento do servidor"""
+    chaveamento = load_data(guild_id).get('chaveamento')
+    if not chaveamento:
+        return
+    agendador.agendar(
+        ('encerrar_rodada', guild_id),
+        quando or datetime.fromisoformat(chaveamento['fim_programado']),
+        disparar_fim_rodada,
+        guild_id,
+        chaveamento['rodada'],
+        tentativa
+    )
+
+def disparar_fim_rodada(guild_id, rodada, tentativa):
+    """Tarefa agendada: encerra os grupos da rodada e abre a próxima (ou a final)"""
+    chaveamento = load_data(guild_id).get('chaveamento')
+    if not chaveamento or chaveamento['rodada'] != rodada:
+        return
+    
+    # Um /finalizar da rodada já na fila; se ele falhar, o agendador confere de novo mais tarde
+    if fila_do_servidor(guild_id).procurar('rodada') is not None:
+        agendar_fim_rodada(guild_id, quando=datetime.utcnow() + espera_retentativa(tentativa), tentativa=tentativa)
+        return
+    
+    enviar_tarefa(
+        guild_id, 'rodada', f"Encerramento automático da rodada {rodada} do chaveamento",
+        encerrar_rodada_automatica, guild_id, rodada, tentativa
     )
+
+async def encerrar_rodada_automatica(guild_id, rodada, tentativa):
+    """Encerramento da rodada pelo agendador: se falhar no meio da rodada, agenda outra tentativa"""
+    try:
+        return await encerrar_rodada_guild(guild_id, rodada)
+    except Exception as e:
+        chaveamento = load_data(guild_id).get('chaveamento')
+        if chaveamento and chaveamento['rodada'] == rodada:
+            espera = espera_retentativa(tentativa)
+            log.warning(
+                f"🔁 [{guild_id}] Encerramento da rodada {rodada} falhou ({e}); "
+                f"nova tentativa em {formatar_segundos(espera.total_seconds())}",
+                extra={'guild_id': guild_id}
+            )
+            agendar_fim_rodada(guild_id, quando=datetime.utcnow() + espera, tentativa=tentativa + 1)
+        raise
+
+async def encerrar_rodada_guild(guild_id, rodada):
+    """Encerra cada grupo da rodada, guarda os classificados e abre a rodada seguinte.
+    
+    Cada grupo encerrado é anotado na hora ('grupo_encerrado'), então se o bot
+    cair no meio, a próxima tentativa só encerra os grupos que faltaram.
+    Devolve o resumo mostrado no /status.
+    """
+    chaveamento = load_data(guild_id).get('chaveamento')
+    if not chaveamento or chaveamento['rodada'] != rodada:
+        # Outra tarefa da fila já encerrou esta rodada
+        return "A rodada já tinha sido encerrada"
+    # O temporizador da rodada só sai depois do encerramento: se algo falhar
+    # no meio, ele continua armado e a rodada é encerrada mais tarde
+    canal = bot.get_channel(chaveamento['channel_id'])
+    
+    if canal is None:
+        log.error(f"❌ [{guild_id}] Canal do chaveamento não encontrado! Cancelando...", extra={'guild_id': guild_id})
+        estado.registrar('chaveamento_concluido', guild_id, motivo='canal_nao_encontrado')
+        raise FalhaTarefa("Canal do chaveamento não encontrado; chaveamento cancelado")
+    
+    for message_id, grupo in list(chaveamento['grupos'].items()):
+        try:
+            message = await encerrar_enquete(canal, int(message_id))
+        except (discord.NotFound, discord.Forbidden):
+            log.warning(f"⚠️ [{guild_id}] Enquete do grupo {message_id} não encontrada; ninguém avança dela", extra={'guild_id': guild_id})
+            classificados = []
+        else:
+            ranking = apurar(guild_id, message)
+            classificados = [
+                grupo['candidatos'][opcao - 1]
+                for opcao, votos in ranking[:chaveamento['vagas']]
+                if votos > 0
+            ]
+        estado.registrar('grupo_encerrado', guild_id, message_id=int(message_id), classificados=classificados)
+    
+    classificados = chaveamento['classificados']
+    if not classificados:
+        log.error(f"❌ [{guild_id}] Nenhum voto na rodada {chaveamento['rodada']}!", extra={'guild_id': guild_id})
+        await canal.send("😢 Nenhum grupo do chaveamento recebeu votos. Cancelando...")
+        estado.registrar('chaveamento_concluido', guild_id, motivo='sem_votos')
+        raise FalhaTarefa("Nenhum voto na rodada; chaveamento cancelado")
     
-    await status_msg.edit(content="", embed=embed_final)
+    if len(classificados) <= MAX_OPCOES_ENQUETE:
+        await iniciar_final(canal.guild, canal, classificados, chaveamento['duracao_horas'], chaveamento['automatico'])
+        agendador.cancelar(('encerrar_rodada', guild_id))
+        return f"{len(classificados)} classificados; final iniciada"
     
-    print(f"✅ Votação encerrada automaticamente!")
-    print(f"👑 Vencedor: {info_vencedor['apelido']}")
-    print(f"📊 Sucessos: {sucessos} | Falhas: {falhas}")
+    proxima = chaveamento['rodada'] + 1
+    await iniciar_rodada(
+        canal.guild, canal, classificados,
+        proxima, chaveamento['total_rodadas'],
+        chaveamento['duracao_horas'], chaveamento['automatico']
+    )
+    return f"{len(classificados)} classificados; rodada {proxima} iniciada"
 
 # Inicia o bot
 if __name__ == '__main__':
@@ -785,4 +4551,9 @@ if __name__ == '__main__':
         print("💡 Configure DISCORD_TOKEN no arquivo .env")
         exit(1)
     
-    bot.run(TOKEN)
\ No newline at end of file
+    configurar_logs()
+    try:
+        # Os logs do discord.py também passam pela fila (sem o handler padrão dele)
+        bot.run(TOKEN, log_handler=None)
+    finally:
+        parar_logs()
\ No newline at end of file